@@ -1,7 +1,10 @@
 import os
+import click
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 
+from . import db_config
+
 db = SQLAlchemy()
 
 def create_app():
@@ -27,9 +30,14 @@ def create_app():
         db_url = "sqlite:///" + os.path.join(app.instance_path, "solvix.db")
 
     app.config["SQLALCHEMY_DATABASE_URI"] = db_url
+    # pool, pre-ping, recycle etc. (ver app/db_config.py)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = db_config.engine_options(db_url)
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.config["JSON_SORT_KEYS"] = False
 
+    # onde ficam os usuários de login: 'json' (app/users.json) ou 'db'
+    app.config["SOLVIX_USER_STORE"] = os.getenv("SOLVIX_USER_STORE", "json")
+
     # chave de sessão (login)
     app.config["SECRET_KEY"] = os.environ.get(
         "SECRET_KEY",
@@ -38,6 +46,9 @@ def create_app():
 
     db.init_app(app)
 
+    from .cache import cache
+    cache.init_app(app)
+
     # registra blueprints
     from .routes import routes as routes_blueprint
     from .api import api as api_blueprint
@@ -45,9 +56,83 @@ def create_app():
     app.register_blueprint(routes_blueprint)
     app.register_blueprint(api_blueprint, url_prefix="/api")
 
-    # cria tabelas uma vez no start
+    # aplica migrações pendentes no start (cria tudo se o banco estiver vazio)
+    from . import migrations
+
     with app.app_context():
-        db.create_all()
+        db_config.install_connection_hooks(db.engine)
+        migrations.upgrade()
+
+        # métricas por requisição / SQL + GET /metrics (SOLVIX_INSTRUMENTATION=1)
+        from .instrumentation import instrumentation
+        instrumentation.init_app(app, db.engine)
+
+    @app.cli.command("db-upgrade")
+    def db_upgrade_command():
+        """Aplica as migrações pendentes: flask --app run db-upgrade"""
+        applied = migrations.upgrade()
+        print(f"schema na versão {migrations.current_version()} (aplicadas: {applied or 'nenhuma'})")
+
+    @app.cli.command("reconcile-balances")
+    def reconcile_balances_command():
+        """Recalcula o saldo das caixinhas a partir dos movimentos."""
+        from .models import SavingBox
+
+        updated = SavingBox.reconcile_balances()
+        db.session.commit()
+        print(f"{updated} caixinha(s) recalculada(s)")
+
+    @app.cli.command("rebuild-rollup")
+    @click.option("--user-id", type=int, default=None, help="só este usuário")
+    def rebuild_rollup_command(user_id):
+        """Recalcula o resumo mensal (monthly_rollup) a partir das transações."""
+        from . import rollup
+
+        rows = rollup.rebuild(user_id)
+        db.session.commit()
+        print(f"{rows} linha(s) no resumo mensal")
+
+    @app.cli.command("generate-subscriptions")
+    @click.option("--date", "on_date", default=None, help="AAAA-MM-DD (padrão: hoje)")
+    @click.option("--enqueue", is_flag=True, help="só enfileira para o worker.py")
+    def generate_subscriptions_command(on_date, enqueue):
+        """Gera as cobranças de assinatura vencidas (rodar via cron, 1x ao dia)."""
+        from datetime import date, datetime
+        from . import jobs, subscriptions
+
+        today = datetime.strptime(on_date, "%Y-%m-%d").date() if on_date else None
+
+        if enqueue:
+            # uma vez por dia, mesmo que o cron dispare mais de uma vez
+            day = (today or date.today()).isoformat()
+            job, created = jobs.enqueue(
+                "subscriptions.generate",
+                {"date": on_date},
+                idempotency_key=f"subscriptions.generate:{day}",
+            )
+            db.session.commit()
+            print(f"job {job.id} {'enfileirado' if created else 'já existia'} ({job.status})")
+            return
+
+        created = subscriptions.generate_due(today)
+        print(f"{created} cobrança(s) de assinatura gerada(s)")
+
+    @app.cli.command("import-users")
+    def import_users_command():
+        """Copia os usuários do users.json para a tabela users (upsert por id)."""
+        from .auth_utils import JsonUserStore
+        from .models import User
+
+        count = 0
+        for data in JsonUserStore().all():
+            user = db.session.get(User, data["id"]) or User(id=data["id"])
+            user.name = data.get("name")
+            user.username = data["username"]
+            user.password_hash = data["password_hash"]
+            db.session.add(user)
+            count += 1
+        db.session.commit()
+        print(f"{count} usuário(s) importado(s)")
 
     # CSP pra imagens externas
     @app.after_request
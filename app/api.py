@@ -1,14 +1,39 @@
-from flask import Blueprint, request, jsonify, session
-from datetime import datetime, date
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    current_app,
+    jsonify,
+    request,
+    session,
+    stream_with_context,
+)
+from datetime import datetime, date, timedelta
 from calendar import monthrange
-
-from . import db
+from functools import wraps
+import base64
+import csv
+import hashlib
+import io
+import json
+
+from sqlalchemy import and_, not_, or_, func, insert, literal, select, union_all, update
+
+from . import db, forecast, idempotency, importers, insights, jobs, rollup, subscriptions
+from .cache import cache
+from .db_config import pool_stats
+from .money import from_cents, price_installment_cents, split_cents, to_cents
+from .versioning import bump_all_data_versions, bump_data_version, get_data_version
 from .models import (
     Transaction,
     InstallmentPlan,
     InstallmentCharge,
+    Job,
     SavingBox,
     SavingMovement,
+    SAVING_DEPOSIT_CATEGORY,
+    SAVING_WITHDRAW_CATEGORY,
+    Subscription,
 )
 
 # Blueprint (registrado em __init__.py com url_prefix="/api")
@@ -33,17 +58,12 @@ def month_bounds(year: int, month: int):
     return first, last
 
 
-def compute_monthly_bill(year: int, month: int, user_id=None):
+def bill_one_shot_filters(first: date, last: date, user_id=None):
     """
-    Calcula a fatura do cartão para um mês, PARA UM USUÁRIO:
-
-    - Compras à vista no crédito (não parceladas), não quitadas.
-    - Parcelas (InstallmentCharge) com due_date dentro do mês, não pagas.
+    Predicado das compras à vista no crédito, não quitadas, dentro do período.
+    Compartilhado entre o cálculo da fatura e a quitação em lote.
     """
-    first, last = month_bounds(year, month)
-
-    # 1) Compras à vista no crédito, ainda não quitadas (do usuário)
-    one_shot_filter = [
+    filters = [
         Transaction.tipo == "expense",
         Transaction.meio_pagamento == "credit",
         Transaction.is_installment.is_(False),
@@ -53,42 +73,160 @@ def compute_monthly_bill(year: int, month: int, user_id=None):
         Transaction.data <= last,
     ]
     if user_id is not None:
-        one_shot_filter.append(Transaction.user_id == user_id)
+        filters.append(Transaction.user_id == user_id)
+    return filters
 
-    one_shot_q = Transaction.query.filter(*one_shot_filter).all()
 
-    one_shot_total = sum(t.valor for t in one_shot_q)
-    one_shot_ids = [t.id for t in one_shot_q]
+def bill_installment_filters(first: date, last: date, user_id=None):
+    """
+    Predicado das parcelas não pagas que vencem dentro do período.
 
-    # 2) Parcelas que vencem neste mês, ainda não pagas (do usuário)
-    installment_query = (
-        InstallmentCharge.query
-        .join(InstallmentPlan)
-        .join(Transaction, InstallmentPlan.transaction_id == Transaction.id)
-        .filter(
-            InstallmentCharge.paid.is_(False),
-            InstallmentCharge.due_date >= first,
-            InstallmentCharge.due_date <= last,
-        )
-    )
+    O dono da parcela é resolvido por subquery (plano -> transação), então o
+    mesmo predicado serve tanto para SELECT quanto para UPDATE ... WHERE.
+    """
+    filters = [
+        InstallmentCharge.paid.is_(False),
+        InstallmentCharge.due_date >= first,
+        InstallmentCharge.due_date <= last,
+    ]
     if user_id is not None:
-        installment_query = installment_query.filter(Transaction.user_id == user_id)
+        user_plans = (
+            select(InstallmentPlan.id)
+            .join(Transaction, InstallmentPlan.transaction_id == Transaction.id)
+            .where(Transaction.user_id == user_id)
+        )
+        filters.append(InstallmentCharge.plan_id.in_(user_plans))
+    return filters
+
+
+def compute_monthly_bill(year: int, month: int, user_id=None, include_ids=False):
+    """
+    Calcula a fatura do cartão para um mês, PARA UM USUÁRIO:
+
+    - Compras à vista no crédito (não parceladas), não quitadas.
+    - Parcelas (InstallmentCharge) com due_date dentro do mês, não pagas.
+
+    Por padrão só os totais são calculados, em UMA consulta
+    (SUM ... UNION ALL SUM ...), sem carregar objetos.
+    Com include_ids=True também devolve os ids das linhas da fatura.
+
+    As somas são feitas em centavos no banco; os totais saem em reais.
+    """
+    first, last = month_bounds(year, month)
+    one_shot_filter = bill_one_shot_filters(first, last, user_id)
+    installment_filter = bill_installment_filters(first, last, user_id)
+
+    result = {
+        "year": year,
+        "month": month,
+    }
+
+    if include_ids:
+        one_shot_rows = (
+            db.session.query(Transaction.id, Transaction.valor_cents)
+            .filter(*one_shot_filter)
+            .all()
+        )
+        installment_rows = (
+            db.session.query(InstallmentCharge.id, InstallmentCharge.amount_cents)
+            .filter(*installment_filter)
+            .all()
+        )
+        one_shot_cents = sum(r.valor_cents for r in one_shot_rows)
+        installments_cents = sum(r.amount_cents for r in installment_rows)
+        result["one_shot_ids"] = [r.id for r in one_shot_rows]
+        result["installment_ids"] = [r.id for r in installment_rows]
+    else:
+        one_shot_sum = select(
+            literal("one_shot").label("kind"),
+            func.coalesce(func.sum(Transaction.valor_cents), 0).label("total"),
+        ).where(*one_shot_filter)
+        installments_sum = select(
+            literal("installments").label("kind"),
+            func.coalesce(func.sum(InstallmentCharge.amount_cents), 0).label("total"),
+        ).where(*installment_filter)
+
+        totals = {
+            row.kind: int(row.total or 0)
+            for row in db.session.execute(union_all(one_shot_sum, installments_sum))
+        }
+        one_shot_cents = totals.get("one_shot", 0)
+        installments_cents = totals.get("installments", 0)
 
-    installment_q = installment_query.all()
+    result["total"] = from_cents(one_shot_cents + installments_cents)
+    result["one_shot_total"] = from_cents(one_shot_cents)
+    result["installments_total"] = from_cents(installments_cents)
+    return result
 
-    installments_total = sum(c.amount for c in installment_q)
-    installment_ids = [c.id for c in installment_q]
 
-    total = one_shot_total + installments_total
+def settle_monthly_bill(year: int, month: int, user_id=None):
+    """
+    Quita a fatura do mês com dois UPDATE ... WHERE em lote, usando o mesmo
+    predicado de compute_monthly_bill. Não faz commit: roda dentro da
+    transação de quem chama.
+
+    Os valores quitados vêm do próprio UPDATE (RETURNING), então o total pago
+    é exatamente o que esta transação marcou. Como o UPDATE trava as linhas,
+    um segundo pagamento concorrente espera e, ao reavaliar o WHERE
+    (settled/paid = false), não encontra mais nada para quitar.
+    """
+    first, last = month_bounds(year, month)
+    one_shot_filter = bill_one_shot_filters(first, last, user_id)
+    installment_filter = bill_installment_filters(first, last, user_id)
+    options = {"synchronize_session": False}
+
+    if db.engine.dialect.update_returning:
+        one_shot_amounts = db.session.execute(
+            update(Transaction)
+            .where(*one_shot_filter)
+            .values(settled=True)
+            .returning(Transaction.valor_cents),
+            execution_options=options,
+        ).scalars().all()
+        installment_amounts = db.session.execute(
+            update(InstallmentCharge)
+            .where(*installment_filter)
+            .values(paid=True)
+            .returning(InstallmentCharge.amount_cents),
+            execution_options=options,
+        ).scalars().all()
+
+        one_shot_cents = sum(one_shot_amounts)
+        installments_cents = sum(installment_amounts)
+        settled_transactions = len(one_shot_amounts)
+        paid_installments = len(installment_amounts)
+    else:
+        # Banco sem RETURNING: trava as linhas antes de somar e atualizar
+        one_shot_cents = int(
+            db.session.query(func.coalesce(func.sum(Transaction.valor_cents), 0))
+            .filter(*one_shot_filter)
+            .with_for_update()
+            .scalar()
+        )
+        installments_cents = int(
+            db.session.query(func.coalesce(func.sum(InstallmentCharge.amount_cents), 0))
+            .filter(*installment_filter)
+            .with_for_update()
+            .scalar()
+        )
+        settled_transactions = db.session.execute(
+            update(Transaction).where(*one_shot_filter).values(settled=True),
+            execution_options=options,
+        ).rowcount
+        paid_installments = db.session.execute(
+            update(InstallmentCharge).where(*installment_filter).values(paid=True),
+            execution_options=options,
+        ).rowcount
 
     return {
         "year": year,
         "month": month,
-        "total": total,
-        "one_shot_total": one_shot_total,
-        "installments_total": installments_total,
-        "one_shot_ids": one_shot_ids,
-        "installment_ids": installment_ids,
+        "total": from_cents(one_shot_cents + installments_cents),
+        "total_cents": one_shot_cents + installments_cents,
+        "one_shot_total": from_cents(one_shot_cents),
+        "installments_total": from_cents(installments_cents),
+        "settled_transactions": settled_transactions,
+        "paid_installments": paid_installments,
     }
 
 
@@ -125,46 +263,379 @@ def _require_user():
     return user_id, None, None
 
 
+def conditional_get(view_func):
+    """
+    GET condicional por usuário: ETag/Last-Modified vêm da versão dos dados
+    (user_data_versions). Se o cliente mandar If-None-Match (ou
+    If-Modified-Since) ainda válido, responde 304 sem rodar a view.
+
+    O ETag inclui a URL completa (com query string) e a data de hoje, porque
+    fatura e parcelas futuras dependem do dia corrente.
+
+    A versão lida aqui também é a das chaves do cache de resultados
+    (cache.pin_version): um corpo calculado/guardado para uma versão nunca
+    sai com o ETag de outra.
+    """
+    @wraps(view_func)
+    def wrapped(*args, **kwargs):
+        user_id, error_resp, status = _require_user()
+        if error_resp:
+            return error_resp, status
+
+        version, updated_at = get_data_version(user_id)
+        # o corpo (cache de resultados) sai da mesma versão do ETag
+        cache.pin_version(user_id, version)
+        today = date.today()
+        resource = hashlib.sha1(request.full_path.encode("utf-8")).hexdigest()[:12]
+        etag = f"u{user_id}-v{version}-{today.isoformat()}-{resource}"
+
+        # Last-Modified nunca antes da meia-noite de hoje (mesmo motivo do ETag)
+        midnight = datetime.combine(today, datetime.min.time())
+        last_modified = max(updated_at, midnight) if updated_at else midnight
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        elif request.if_modified_since:
+            not_modified = (
+                request.if_modified_since.replace(tzinfo=None)
+                >= last_modified.replace(microsecond=0)
+            )
+        else:
+            not_modified = False
+
+        if not_modified:
+            resp = current_app.response_class(status=304)
+        else:
+            resp = current_app.make_response(view_func(*args, **kwargs))
+            if resp.status_code != 200:
+                return resp
+
+        resp.set_etag(etag, weak=True)
+        resp.last_modified = last_modified
+        # sempre revalida com o servidor (o 304 é barato)
+        resp.headers["Cache-Control"] = "private, no-cache"
+        return resp
+
+    return wrapped
+
+
+def idempotent(view_func):
+    """
+    Header Idempotency-Key nas escritas: a primeira requisição com a chave
+    roda normalmente e tem a resposta guardada; retentativas com a mesma
+    chave (e o mesmo corpo) recebem a resposta guardada, com o header
+    Idempotent-Replayed: true, sem escrever de novo.
+
+    - mesma chave com outro corpo/rota: 422;
+    - mesma chave com a original ainda em andamento: 409 (reserva sem
+      resposta há mais de idempotency.PENDING_TIMEOUT roda de novo);
+    - respostas 5xx não são guardadas (a retentativa roda de novo).
+    """
+    @wraps(view_func)
+    def wrapped(*args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if not key:
+            return view_func(*args, **kwargs)
+        if len(key) > idempotency.MAX_KEY_LENGTH:
+            return jsonify({"error": "Idempotency-Key muito longa (máx. 100)."}), 400
+
+        user_id, error_resp, status = _require_user()
+        if error_resp:
+            return error_resp, status
+
+        fingerprint = idempotency.request_fingerprint(
+            request.method, request.path, _fingerprint_body()
+        )
+        stored = idempotency.lookup(user_id, key)
+        if stored is not None:
+            return _idempotent_replay(stored, fingerprint)
+
+        # entra no mesmo commit da escrita feita pela rota
+        idempotency.reserve(user_id, key, fingerprint)
+        resp = current_app.make_response(view_func(*args, **kwargs))
+
+        try:
+            if resp.status_code >= 500:
+                db.session.rollback()
+                # outra requisição com a mesma chave pode ter vencido a corrida
+                stored = idempotency.lookup(user_id, key)
+                if stored is not None:
+                    return _idempotent_replay(stored, fingerprint)
+                return resp
+
+            idempotency.store_response(
+                user_id, key, fingerprint, resp.status_code, resp.get_data(as_text=True)
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"[ERRO] idempotent: {e}")
+        return resp
+
+    return wrapped
+
+
+def _fingerprint_body() -> bytes:
+    """
+    Corpo usado na impressão digital do @idempotent. Em multipart o
+    boundary muda a cada envio, então entram os campos e o conteúdo dos
+    arquivos, não o corpo bruto.
+    """
+    if request.mimetype != "multipart/form-data":
+        return request.get_data()
+
+    parts = []
+    for name, value in sorted(request.form.items(multi=True)):
+        parts.append(f"{name}={value}".encode("utf-8"))
+    for name, upload in sorted(request.files.items(multi=True), key=lambda i: i[0]):
+        parts.append(f"{name}:{upload.filename}".encode("utf-8"))
+        parts.append(upload.stream.read())
+        upload.stream.seek(0)
+    return b"\n".join(parts)
+
+
+def _idempotent_replay(stored, fingerprint: str):
+    if stored.fingerprint != fingerprint:
+        return jsonify(
+            {"error": "Idempotency-Key já usada em outra requisição."}
+        ), 422
+    if stored.status_code is None:
+        return jsonify(
+            {"error": "Requisição com esta Idempotency-Key ainda em processamento."}
+        ), 409
+    resp = current_app.response_class(
+        stored.response,
+        status=stored.status_code,
+        mimetype="application/json",
+    )
+    resp.headers["Idempotent-Replayed"] = "true"
+    return resp
+
+
+def _wants_async() -> bool:
+    """?async=1 ou header 'Prefer: respond-async': enfileira e responde 202."""
+    if _parse_bool(request.args.get("async", False)):
+        return True
+    return "respond-async" in request.headers.get("Prefer", "")
+
+
+def _job_accepted(job):
+    """202 com o job e o endereço para acompanhar o status."""
+    resp = jsonify(job.to_dict())
+    resp.status_code = 202
+    resp.headers["Location"] = f"{request.script_root}/api/jobs/{job.id}"
+    return resp
+
+
 # -------------------------------------------------------------------
 # Rotas de TRANSAÇÕES (lista, criação, exclusão)
 # -------------------------------------------------------------------
 
 
+# Campos que podem ser pedidos via ?fields= (mesmas chaves do Transaction.to_dict)
+TRANSACTION_FIELDS = (
+    "id",
+    "user_id",
+    "tipo",
+    "valor",
+    "categoria",
+    "descricao",
+    "data",
+    "meio_pagamento",
+    "recorrente",
+    "logo",
+    "created_at",
+    "settled",
+    "is_installment",
+    "installment_mode",
+    "installment_count",
+    "total_amount",
+    "interest_per_month",
+    "first_due_date",
+    "subscription_id",
+)
+
+# Campos da API guardados em centavos no banco (nome na API -> coluna)
+TRANSACTION_MONEY_FIELDS = {
+    "valor": "valor_cents",
+    "total_amount": "total_amount_cents",
+}
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def _json_value(value):
+    """Converte date/datetime para ISO; demais valores passam direto."""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(data_value: date, row_id: int) -> str:
+    """Cursor opaco para paginação por (data, id)."""
+    raw = f"{data_value.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    """Inverso de encode_cursor. Levanta ValueError se o cursor for inválido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        data_str, id_str = raw.split("|", 1)
+        return parse_date(data_str), int(id_str)
+    except (ValueError, UnicodeError):
+        raise ValueError("Cursor inválido.")
+
+
+def _parse_transaction_filters(args, user_id):
+    """
+    Monta os filtros comuns da listagem de transações a partir da query string:
+
+      ?start=2025-01-01&end=2025-01-31&categoria=Lazer&categoria=Compras
+    """
+    filters = [Transaction.user_id == user_id]
+
+    start_str = args.get("start")
+    end_str = args.get("end")
+    try:
+        if start_str:
+            filters.append(Transaction.data >= parse_date(start_str))
+        if end_str:
+            filters.append(Transaction.data <= parse_date(end_str))
+    except ValueError:
+        raise ValueError("Formato de data inválido em 'start'/'end'. Use AAAA-MM-DD.")
+
+    categorias = [c for c in args.getlist("categoria") if c]
+    if len(categorias) == 1:
+        filters.append(Transaction.categoria == categorias[0])
+    elif categorias:
+        filters.append(Transaction.categoria.in_(categorias))
+
+    return filters
+
+
 @api.route("/transactions", methods=["GET"])
+@conditional_get
 def get_transactions():
-    """Retorna as transações do usuário (ou do fallback), da mais recente para a mais antiga."""
+    """
+    Retorna as transações do usuário (ou do fallback), da mais recente para a mais antiga.
+
+    Modo paginado (padrão), por cursor em (data, id):
+
+      /api/transactions?limit=50&cursor=<next_cursor>
+                       &start=2025-01-01&end=2025-12-31
+                       &categoria=Lazer
+                       &fields=id,valor,categoria,data
+
+      -> {"items": [...], "next_cursor": "..." | null}
+
+    Modo legado (lista completa, sem envelope), mantido para clientes antigos:
+
+      /api/transactions?legacy=1
+    """
     user_id, error_resp, status = _require_user()
     if error_resp:
         return error_resp, status
 
-    transactions = (
-        Transaction.query
-        .filter(Transaction.user_id == user_id)
-        .order_by(Transaction.data.desc())
+    try:
+        filters = _parse_transaction_filters(request.args, user_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if request.args.get("legacy") in ("1", "true"):
+        transactions = (
+            Transaction.query
+            .filter(*filters)
+            .order_by(Transaction.data.desc())
+            .all()
+        )
+        return jsonify([t.to_dict() for t in transactions])
+
+    # ------------------------------------------------------------------
+    # Projeção de colunas (?fields=)
+    # ------------------------------------------------------------------
+    fields_param = request.args.get("fields")
+    if fields_param:
+        fields = [f.strip() for f in fields_param.split(",") if f.strip()]
+        invalid = [f for f in fields if f not in TRANSACTION_FIELDS]
+        if invalid:
+            return jsonify(
+                {"error": f"Campos inválidos em 'fields': {', '.join(invalid)}."}
+            ), 400
+    else:
+        fields = list(TRANSACTION_FIELDS)
+
+    # id e data são sempre lidos porque formam o cursor
+    selected = list(dict.fromkeys(["id", "data", *fields]))
+    columns = [
+        getattr(Transaction, TRANSACTION_MONEY_FIELDS.get(f, f)).label(f)
+        for f in selected
+    ]
+
+    # ------------------------------------------------------------------
+    # Tamanho da página e cursor
+    # ------------------------------------------------------------------
+    try:
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "O parâmetro 'limit' deve ser um inteiro."}), 400
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    cursor = request.args.get("cursor")
+    if cursor:
+        try:
+            cursor_data, cursor_id = decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        filters.append(
+            or_(
+                Transaction.data < cursor_data,
+                and_(Transaction.data == cursor_data, Transaction.id < cursor_id),
+            )
+        )
+
+    rows = (
+        db.session.query(*columns)
+        .filter(*filters)
+        .order_by(Transaction.data.desc(), Transaction.id.desc())
+        .limit(limit + 1)
         .all()
     )
-    return jsonify([t.to_dict() for t in transactions])
 
+    has_more = len(rows) > limit
+    rows = rows[:limit]
 
-@api.route("/transactions", methods=["POST"])
-def add_transaction():
-    """
-    Cria uma nova transação para o usuário.
+    items = []
+    for row in rows:
+        mapping = row._mapping
+        items.append({
+            f: from_cents(mapping[f]) if f in TRANSACTION_MONEY_FIELDS else _json_value(mapping[f])
+            for f in fields
+        })
 
-    Casos suportados:
-      - Entrada (income)
-      - Gasto simples (expense, débito/crédito)
-      - Assinaturas (recorrente, com logo)
-      - Compra parcelada (is_installment = True, somente crédito)
-    """
-    user_id, error_resp, status = _require_user()
-    if error_resp:
-        return error_resp, status
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]._mapping
+        next_cursor = encode_cursor(last["data"], last["id"])
 
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "Dados JSON ausentes ou mal formatados"}), 400
+    return jsonify({"items": items, "next_cursor": next_cursor})
+
+
+def _parse_bool(value) -> bool:
+    """Booleano vindo de JSON ou de texto (CSV): true/1/sim/s/yes."""
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "sim", "s", "yes", "y")
+    return bool(value)
+
+
+def validate_transaction_payload(data) -> dict:
+    """
+    Valida os dados de uma nova transação (JSON do front ou linha de import)
+    e devolve os valores prontos para as colunas de Transaction.
 
+    Levanta ValueError com a mensagem de erro para o usuário.
+    """
     # ------------------------------------------------------------------
     # 1. Validação básica de campos obrigatórios
     # ------------------------------------------------------------------
@@ -176,7 +647,7 @@ def add_transaction():
 
     for field in required_fields:
         if field not in data or data[field] in ("", None):
-            return jsonify({"error": f"O campo '{field}' é obrigatório."}), 400
+            raise ValueError(f"O campo '{field}' é obrigatório.")
 
     tipo = data.get("tipo")
     categoria = data.get("categoria")
@@ -184,15 +655,14 @@ def add_transaction():
     # ------------------------------------------------------------------
     # 2. Tratamento do valor
     # ------------------------------------------------------------------
-    valor = 0.0
+    valor_cents = 0
     if "valor" in data and data["valor"] not in ("", None):
-        valor_str = str(data.get("valor")).replace(",", ".")
         try:
-            valor = float(valor_str)
-            if valor <= 0:
-                return jsonify({"error": "O valor deve ser positivo."}), 400
+            valor_cents = to_cents(data.get("valor"))
         except ValueError:
-            return jsonify({"error": "O campo 'valor' deve ser um número válido."}), 400
+            raise ValueError("O campo 'valor' deve ser um número válido.")
+        if valor_cents <= 0:
+            raise ValueError("O valor deve ser positivo.")
 
     # ------------------------------------------------------------------
     # 3. Tratamento da data
@@ -200,18 +670,18 @@ def add_transaction():
     try:
         data_obj = parse_date(data["data"])
     except ValueError:
-        return jsonify({"error": "Formato de data inválido. Use AAAA-MM-DD."}), 400
+        raise ValueError("Formato de data inválido. Use AAAA-MM-DD.")
 
     # Campos comuns
-    descricao = data.get("descricao")
-    meio_pagamento = data.get("meio_pagamento")
-    recorrente = bool(data.get("recorrente", False))
+    descricao = data.get("descricao") or None
+    meio_pagamento = data.get("meio_pagamento") or None
+    recorrente = _parse_bool(data.get("recorrente", False))
     logo = data.get("logo") or None
 
     # ------------------------------------------------------------------
     # 4. Dados de parcelamento vindos do front
     # ------------------------------------------------------------------
-    is_installment = bool(data.get("is_installment", False))
+    is_installment = _parse_bool(data.get("is_installment", False))
     installment_mode = data.get("installment_mode") or None  # 'total' ou 'parcela'
     installment_count = data.get("installment_count")
     interest_per_month = data.get("interest_per_month")
@@ -222,344 +692,1580 @@ def add_transaction():
         try:
             first_due_date = parse_date(first_due_date_str)
         except ValueError:
-            return jsonify(
-                {"error": "Formato de data inválido para 'first_due_date'. Use AAAA-MM-DD."}
-            ), 400
+            raise ValueError(
+                "Formato de data inválido para 'first_due_date'. Use AAAA-MM-DD."
+            )
 
-    # Converte interest_per_month para float, se vier algo
+    # Converte interest_per_month (% ao mês) para float, se vier algo
     if interest_per_month not in (None, ""):
         try:
             interest_per_month = float(str(interest_per_month).replace(",", "."))
         except ValueError:
-            return jsonify(
-                {"error": "O campo 'interest_per_month' deve ser um número válido."}
-            ), 400
+            raise ValueError("O campo 'interest_per_month' deve ser um número válido.")
+        if interest_per_month < 0:
+            raise ValueError("O campo 'interest_per_month' não pode ser negativo.")
     else:
         interest_per_month = None
 
     # ------------------------------------------------------------------
-    # 5. Cálculo do total_amount no caso de compra parcelada
+    # 5. Cálculo do total (centavos) no caso de compra parcelada
     # ------------------------------------------------------------------
-    total_amount = None
+    total_amount_cents = None
     if is_installment:
         if meio_pagamento != "credit":
-            return jsonify(
-                {"error": "Compras parceladas devem ser feitas no crédito."}
-            ), 400
+            raise ValueError("Compras parceladas devem ser feitas no crédito.")
 
         try:
             installment_count = int(installment_count)
-            if installment_count < 2:
-                return jsonify(
-                    {"error": "A quantidade de parcelas deve ser pelo menos 2."}
-                ), 400
         except (TypeError, ValueError):
-            return jsonify(
-                {"error": "O campo 'installment_count' deve ser um inteiro válido."}
-            ), 400
+            raise ValueError("O campo 'installment_count' deve ser um inteiro válido.")
+        if installment_count < 2:
+            raise ValueError("A quantidade de parcelas deve ser pelo menos 2.")
 
         if not installment_mode:
             installment_mode = "total"
 
         if installment_mode == "parcela":
-            # valor informado é o valor de cada parcela
-            total_amount = valor * installment_count
+            # valor informado é o valor de cada parcela (juros já embutidos)
+            total_amount_cents = valor_cents * installment_count
+        elif interest_per_month:
+            # valor informado é o preço à vista, financiado com juros (Price)
+            total_amount_cents = (
+                price_installment_cents(valor_cents, installment_count, interest_per_month)
+                * installment_count
+            )
         else:
             # valor informado é o total da compra
-            total_amount = valor
+            total_amount_cents = valor_cents
 
-    # ------------------------------------------------------------------
-    # 6. Criação da transação base
-    # ------------------------------------------------------------------
-    new_transaction = Transaction(
-        user_id=user_id,
-        tipo=tipo,
-        valor=valor,
-        categoria=categoria,
-        descricao=descricao,
-        data=data_obj,
-        meio_pagamento=meio_pagamento,
-        recorrente=recorrente,
-        logo=logo,
-        is_installment=is_installment,
-        installment_mode=installment_mode if is_installment else None,
-        installment_count=installment_count if is_installment else None,
-        total_amount=total_amount if is_installment else None,
-        interest_per_month=interest_per_month if is_installment else None,
-        first_due_date=first_due_date if is_installment else None,
-    )
+    return {
+        "tipo": tipo,
+        "valor_cents": valor_cents,
+        "categoria": categoria,
+        "descricao": descricao,
+        "data": data_obj,
+        "meio_pagamento": meio_pagamento,
+        "recorrente": recorrente,
+        "logo": logo,
+        "is_installment": is_installment,
+        "installment_mode": installment_mode if is_installment else None,
+        "installment_count": installment_count if is_installment else None,
+        "total_amount_cents": total_amount_cents if is_installment else None,
+        "interest_per_month": interest_per_month if is_installment else None,
+        "first_due_date": first_due_date if is_installment else None,
+    }
 
-    try:
-        db.session.add(new_transaction)
-        db.session.flush()  # garante que new_transaction.id exista
 
-        # ------------------------------------------------------------------
-        # 7. Se for compra parcelada, cria o plano + parcelas
-        # ------------------------------------------------------------------
-        if is_installment:
-            # Plano
-            plan = InstallmentPlan(
-                transaction_id=new_transaction.id,
-                descricao=new_transaction.descricao or new_transaction.categoria,
-                total_amount=total_amount,
-                installments=installment_count,
-                mode=installment_mode,
-                interest_per_month=interest_per_month,
-            )
-            db.session.add(plan)
-            db.session.flush()
+def installment_plan_values(tx_values: dict) -> dict:
+    """Colunas do InstallmentPlan de uma transação parcelada já validada."""
+    return {
+        "descricao": tx_values["descricao"] or tx_values["categoria"],
+        "total_amount_cents": tx_values["total_amount_cents"],
+        "installments": tx_values["installment_count"],
+        "mode": tx_values["installment_mode"],
+        "interest_per_month": tx_values["interest_per_month"],
+    }
 
-            # Valor por parcela:
-            if installment_mode == "parcela":
-                amount_per_installment = valor
-            else:
-                # valor informado é o total da compra
-                base = round(total_amount / installment_count, 2)
-                # Ajuste na última parcela
-                values = [base] * installment_count
-                diff = round(total_amount - base * installment_count, 2)
-                values[-1] += diff
-
-            # Data da primeira parcela
-            first_due = first_due_date or data_obj
-
-            # Cria parcelas
-            charges = []
-            for i in range(installment_count):
-                if installment_mode == "parcela":
-                    amount = valor
-                else:
-                    amount = values[i]
-
-                due = add_months(first_due, i)
-
-                charge = InstallmentCharge(
-                    plan_id=plan.id,
-                    installment_number=i + 1,
-                    amount=amount,
-                    due_date=due,
-                )
-                db.session.add(charge)
-                charges.append(charge)
 
-        db.session.commit()
-        return jsonify(new_transaction.to_dict()), 201
+def installment_schedule(tx_values: dict) -> list:
+    """
+    Gera as parcelas (installment_number, amount_cents, due_date) de uma
+    compra parcelada já validada por validate_transaction_payload.
 
-    except Exception as e:
-        db.session.rollback()
-        print(f"[ERRO] add_transaction: {e}")
-        return jsonify({"error": "Erro interno ao salvar a transação."}), 500
+    Valores e vencimentos são montados como colunas inteiras de uma vez e
+    depois combinados em linhas, prontas para um INSERT multi-linha.
+    """
+    count = tx_values["installment_count"]
+
+    # Valor por parcela (centavos):
+    if tx_values["installment_mode"] == "parcela":
+        amounts = [tx_values["valor_cents"]] * count
+    elif tx_values["interest_per_month"]:
+        # parcelas fixas da tabela Price (total já inclui os juros)
+        amounts = [tx_values["total_amount_cents"] // count] * count
+    else:
+        # valor informado é o total da compra; o resto da divisão vai na última
+        amounts = split_cents(tx_values["total_amount_cents"], count)
 
+    # Vencimentos: mês a mês a partir da primeira fatura
+    first_due = tx_values["first_due_date"] or tx_values["data"]
+    due_dates = [add_months(first_due, i) for i in range(count)]
 
-@api.route("/transactions/<int:transaction_id>", methods=["DELETE"])
-def delete_transaction(transaction_id: int):
+    return [
+        {"installment_number": n, "amount_cents": amount, "due_date": due}
+        for n, amount, due in zip(range(1, count + 1), amounts, due_dates)
+    ]
+
+
+# Linhas por INSERT multi-linha de parcelas (4 parâmetros por linha; fica
+# bem abaixo do limite de variáveis por statement do SQLite)
+CHARGE_INSERT_BATCH = 1000
+
+
+def insert_installment_plans(items):
     """
-    Deleta uma transação pelo ID (e, se for parcelada, o plano/parcelas via cascade),
-    APENAS do usuário logado (ou fallback).
+    Cria os planos de parcelamento e todas as parcelas em lote.
+
+    items: lista de (transaction_id, valores_validados) de compras parceladas.
+
+    Os planos entram num INSERT ... RETURNING (ids na ordem dos itens) e as
+    parcelas em INSERTs multi-linha (VALUES (...), (...), ...), um por
+    CHARGE_INSERT_BATCH parcelas — para uma compra só, um único INSERT.
     """
-    user_id, error_resp, status = _require_user()
-    if error_resp:
-        return error_resp, status
+    if not items:
+        return
 
-    transaction = (
-        Transaction.query
-        .filter(
-            Transaction.id == transaction_id,
-            Transaction.user_id == user_id,
+    plan_rows = [
+        {"transaction_id": tx_id, **installment_plan_values(values)}
+        for tx_id, values in items
+    ]
+    if db.engine.dialect.insert_executemany_returning_sort_by_parameter_order:
+        plan_ids = db.session.execute(
+            insert(InstallmentPlan).returning(InstallmentPlan.id, sort_by_parameter_order=True),
+            plan_rows,
+        ).scalars().all()
+    else:
+        # banco sem RETURNING em lote: um INSERT por plano
+        plan_ids = [
+            db.session.execute(insert(InstallmentPlan).values(row)).inserted_primary_key[0]
+            for row in plan_rows
+        ]
+
+    charges = [
+        {"plan_id": plan_id, **charge}
+        for plan_id, (_, values) in zip(plan_ids, items)
+        for charge in installment_schedule(values)
+    ]
+    for start in range(0, len(charges), CHARGE_INSERT_BATCH):
+        db.session.execute(
+            insert(InstallmentCharge).values(charges[start:start + CHARGE_INSERT_BATCH])
         )
-        .first_or_404()
+
+
+def is_subscription_payload(values: dict) -> bool:
+    """Gasto recorrente na categoria Assinaturas (formulário de assinatura)."""
+    return (
+        values["tipo"] == "expense"
+        and values["categoria"] == "Assinaturas"
+        and values["recorrente"]
+        and not values["is_installment"]
     )
 
+
+def _parse_cadence(data) -> tuple:
+    """(cadence, interval) do payload; padrão: mensal."""
+    cadence = data.get("cadence") or "monthly"
+    if cadence not in subscriptions.CADENCES:
+        raise ValueError(
+            f"O campo 'cadence' deve ser um de: {', '.join(subscriptions.CADENCES)}."
+        )
     try:
-        db.session.delete(transaction)
-        db.session.commit()
-        return jsonify({"message": "Transação excluída com sucesso"}), 200
-    except Exception as e:
-        db.session.rollback()
-        print(f"[ERRO] delete_transaction: {e}")
-        return jsonify({"error": "Erro ao excluir a transação."}), 500
+        interval = int(data.get("interval") or 1)
+    except (TypeError, ValueError):
+        raise ValueError("O campo 'interval' deve ser um inteiro válido.")
+    if interval < 1:
+        raise ValueError("O campo 'interval' deve ser pelo menos 1.")
+    return cadence, interval
 
 
-# -------------------------------------------------------------------
-# Rotas de FATURA e PARCELAS FUTURAS
-# -------------------------------------------------------------------
+def register_subscription(user_id, values: dict, cadence: str, interval: int):
+    """
+    Liga uma transação recorrente de assinatura à Subscription (sem commit).
+
+    - Sem assinatura ativa com o mesmo nome: cria uma, ancorada na data da
+      transação. As cobranças automáticas começam na primeira ocorrência
+      depois de hoje: um lançamento retroativo não gera cobranças passadas
+      (mesma regra do backfill da migração 8).
+    - Com assinatura ativa: atualiza valor/meio/logo. Se a data cair numa
+      ocorrência dela, a transação é essa cobrança (subscription_id) e o
+      gerador não a cria de novo; se a cobrança já tinha sido gerada, ela é
+      devolvida para ser atualizada em vez de duplicada. Fora do calendário
+      da assinatura, a transação fica avulsa.
+
+    Retorna (subscription_id ou None, cobrança já existente ou None).
+    """
+    name = values["descricao"] or values["categoria"]
+    existing = Subscription.query.filter_by(
+        user_id=user_id, name=name, active=True
+    ).first()
+    if existing is None:
+        subscription = subscriptions.new_subscription(
+            user_id,
+            name,
+            values["valor_cents"],
+            values["data"],
+            cadence=cadence,
+            interval=interval,
+            categoria=values["categoria"],
+            meio_pagamento=values["meio_pagamento"],
+            logo=values["logo"],
+            first_occurrence=subscriptions.first_occurrence_after(
+                values["data"], cadence, interval, date.today()
+            ),
+        )
+        db.session.add(subscription)
+        db.session.flush()
+        return subscription.id, None
 
+    existing.amount_cents = values["valor_cents"]
+    existing.meio_pagamento = values["meio_pagamento"]
+    existing.logo = values["logo"]
 
-@api.route("/billing/current", methods=["GET"])
-def get_current_bill():
+    if subscriptions.occurrence_index(existing, values["data"]) is None:
+        return None, None
+
+    charge = Transaction.query.filter_by(
+        subscription_id=existing.id, data=values["data"]
+    ).first()
+    return existing.id, charge
+
+
+@api.route("/transactions", methods=["POST"])
+@idempotent
+def add_transaction():
     """
-    Retorna a fatura do cartão do mês atual (ou de ano/mês passados via query)
-    para o usuário (ou fallback):
+    Cria uma nova transação para o usuário.
 
-      /api/billing/current?year=2025&month=11
+    Casos suportados:
+      - Entrada (income)
+      - Gasto simples (expense, débito/crédito)
+      - Assinaturas (recorrente, com logo)
+      - Compra parcelada (is_installment = True, somente crédito)
     """
     user_id, error_resp, status = _require_user()
     if error_resp:
         return error_resp, status
 
-    today = date.today()
-    year = int(request.args.get("year", today.year))
-    month = int(request.args.get("month", today.month))
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Dados JSON ausentes ou mal formatados"}), 400
+
+    try:
+        values = validate_transaction_payload(data)
+        cadence = _parse_cadence(data) if is_subscription_payload(values) else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # ------------------------------------------------------------------
+    # 6. Criação da transação base
+    # ------------------------------------------------------------------
+    new_transaction = Transaction(user_id=user_id, **values)
+
+    try:
+        # Assinatura recorrente: esta é a 1ª cobrança, as próximas são geradas
+        if cadence is not None:
+            subscription_id, charge = register_subscription(user_id, values, *cadence)
+            if charge is not None:
+                return _update_subscription_charge(user_id, charge, values)
+            new_transaction.subscription_id = subscription_id
+
+        db.session.add(new_transaction)
+        db.session.flush()  # garante que new_transaction.id exista
+        rollup.record_transactions(user_id, [new_transaction])
+
+        # ------------------------------------------------------------------
+        # 7. Se for compra parcelada, cria o plano + parcelas em lote
+        # ------------------------------------------------------------------
+        if values["is_installment"]:
+            insert_installment_plans([(new_transaction.id, values)])
+
+        bump_data_version(user_id)
+        db.session.commit()
+        cache.invalidate_user(user_id)
+        return jsonify(new_transaction.to_dict()), 201
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERRO] add_transaction: {e}")
+        return jsonify({"error": "Erro interno ao salvar a transação."}), 500
+
+
+def _update_subscription_charge(user_id, charge, values: dict):
+    """
+    Lançamento manual de uma cobrança de assinatura que já foi gerada:
+    atualiza a cobrança existente (e o resumo mensal) em vez de duplicar.
+    """
+    rollup.record_transactions(user_id, [charge], sign=-1)
+    for field in ("valor_cents", "descricao", "meio_pagamento", "logo"):
+        setattr(charge, field, values[field])
+    rollup.record_transactions(user_id, [charge])
+
+    bump_data_version(user_id)
+    db.session.commit()
+    cache.invalidate_user(user_id)
+    return jsonify(charge.to_dict()), 200
+
+
+IMPORT_CHUNK_SIZE = 500
+
+
+def _insert_transaction_chunk(user_id, chunk):
+    """
+    Insere um lote de transações já validadas com INSERTs multi-linha
+    (executemany + RETURNING), expandindo os planos de parcelas em lote.
+
+    chunk: lista de (numero_da_linha, valores_validados)
+    Retorna os ids das transações, na ordem do chunk.
+    """
+    tx_ids = db.session.execute(
+        insert(Transaction).returning(Transaction.id, sort_by_parameter_order=True),
+        [{"user_id": user_id, **values} for _, values in chunk],
+    ).scalars().all()
+    rollup.record_transactions(user_id, [values for _, values in chunk])
+
+    insert_installment_plans(
+        [
+            (tx_id, values)
+            for tx_id, (_, values) in zip(tx_ids, chunk)
+            if values["is_installment"]
+        ]
+    )
+    return tx_ids
+
+
+@api.route("/transactions/import", methods=["POST"])
+@idempotent
+def import_transactions():
+    """
+    Importação em lote de transações a partir de CSV ou OFX.
+
+    O arquivo pode vir como multipart (campo 'file') ou no corpo da requisição:
+
+      POST /api/transactions/import?format=csv   (padrão)
+      POST /api/transactions/import?format=ofx
+
+    CSV: cabeçalho com as mesmas chaves do POST /api/transactions
+    (tipo, valor, categoria, data, descricao, meio_pagamento, recorrente,
+    is_installment, installment_count, ...). Cada linha passa pela mesma
+    validação do cadastro manual.
+
+    Linhas inválidas não abortam a importação: são devolvidas em 'errors'.
+
+    Com ?async=1 (ou 'Prefer: respond-async') o arquivo vai para a fila de
+    jobs e a resposta é 202 com o job (GET /api/jobs/<id> para o resultado).
+
+    Aceita Idempotency-Key (ver @idempotent): a retentativa recebe o mesmo
+    resultado sem importar as linhas de novo.
+    """
+    user_id, error_resp, status = _require_user()
+    if error_resp:
+        return error_resp, status
+
+    fmt = (request.args.get("format") or "csv").lower()
+    if fmt not in importers.READERS:
+        return jsonify({"error": "Formato inválido. Use 'csv' ou 'ofx'."}), 400
+
+    upload = request.files.get("file")
+    if upload:
+        stream = upload.stream
+    elif request.headers.get("Idempotency-Key"):
+        # @idempotent já leu o corpo para a impressão digital
+        stream = io.BytesIO(request.get_data())
+    else:
+        stream = request.stream
+
+    if _wants_async():
+        job, _ = jobs.enqueue(
+            "transactions.import",
+            {"format": fmt},
+            user_id=user_id,
+            idempotency_key=request.headers.get("Idempotency-Key"),
+            attachment=stream.read(),
+        )
+        db.session.commit()
+        return _job_accepted(job)
+
+    try:
+        result = import_stream(user_id, importers.READERS[fmt], stream)
+        db.session.commit()
+        cache.invalidate_user(user_id)
+    except importers.ImportFormatError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERRO] import_transactions: {e}")
+        return jsonify({"error": "Erro interno ao importar transações."}), 500
+
+    return jsonify(result), 200
+
+
+def import_stream(user_id, reader, stream) -> dict:
+    """
+    Valida e insere as linhas do arquivo em lotes (sem commit).
+    Levanta importers.ImportFormatError se o arquivo não puder ser lido.
+    """
+    imported = 0
+    errors = []
+    chunk = []
+
+    def flush_chunk():
+        nonlocal imported
+        if not chunk:
+            return
+        try:
+            # SAVEPOINT por lote: um lote com erro de banco não derruba os demais
+            with db.session.begin_nested():
+                _insert_transaction_chunk(user_id, chunk)
+            imported += len(chunk)
+        except Exception as e:
+            print(f"[ERRO] import_transactions (lote): {e}")
+            for row_number, _ in chunk:
+                errors.append(
+                    {"row": row_number, "error": "Erro interno ao salvar esta linha."}
+                )
+        chunk.clear()
+
+    for row_number, row in reader(stream):
+        try:
+            values = validate_transaction_payload(row)
+        except ValueError as e:
+            errors.append({"row": row_number, "error": str(e)})
+            continue
+
+        chunk.append((row_number, values))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            flush_chunk()
+
+    flush_chunk()
+    bump_data_version(user_id)
+
+    return {
+        "imported": imported,
+        "failed": len(errors),
+        "errors": errors,
+    }
+
+
+MAX_BATCH_ITEMS = 1000
+
+
+def _batch_items():
+    """Lista 'items' do corpo JSON de uma rota de lote (ValueError se inválida)."""
+    items = (request.get_json(silent=True) or {}).get("items")
+    if not isinstance(items, list) or not items:
+        raise ValueError("O campo 'items' deve ser uma lista não vazia.")
+    if len(items) > MAX_BATCH_ITEMS:
+        raise ValueError(f"No máximo {MAX_BATCH_ITEMS} itens por lote.")
+    return items
+
+
+@api.route("/transactions/batch", methods=["POST"])
+@idempotent
+def batch_transactions():
+    """
+    Cria várias transações em UMA transação do banco (um commit).
+    Tudo ou nada: se algum item for inválido, nada é gravado.
+
+      { "items": [ {mesmo corpo do POST /api/transactions}, ... ] }
+
+    Como na importação, itens recorrentes não criam assinaturas.
+    """
+    user_id, error_resp, status = _require_user()
+    if error_resp:
+        return error_resp, status
+
+    try:
+        items = _batch_items()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    chunk = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("Item deve ser um objeto JSON.")
+            chunk.append((index, validate_transaction_payload(item)))
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+
+    if errors:
+        return jsonify(
+            {"error": "Nenhuma transação foi salva: há itens inválidos.", "errors": errors}
+        ), 400
+
+    try:
+        tx_ids = _insert_transaction_chunk(user_id, chunk)
+        bump_data_version(user_id)
+        db.session.commit()
+        cache.invalidate_user(user_id)
+        return jsonify({"created": len(tx_ids), "ids": tx_ids}), 201
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERRO] batch_transactions: {e}")
+        return jsonify({"error": "Erro interno ao salvar as transações."}), 500
+
+
+@api.route("/transactions/<int:transaction_id>", methods=["DELETE"])
+def delete_transaction(transaction_id: int):
+    """
+    Deleta uma transação pelo ID (e, se for parcelada, o plano/parcelas via cascade),
+    APENAS do usuário logado (ou fallback).
+    """
+    user_id, error_resp, status = _require_user()
+    if error_resp:
+        return error_resp, status
+
+    transaction = (
+        Transaction.query
+        .filter(
+            Transaction.id == transaction_id,
+            Transaction.user_id == user_id,
+        )
+        .first_or_404()
+    )
+
+    try:
+        rollup.record_transactions(user_id, [transaction], sign=-1)
+        db.session.delete(transaction)
+        bump_data_version(user_id)
+        db.session.commit()
+        cache.invalidate_user(user_id)
+        return jsonify({"message": "Transação excluída com sucesso"}), 200
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERRO] delete_transaction: {e}")
+        return jsonify({"error": "Erro ao excluir a transação."}), 500
+
+
+# -------------------------------------------------------------------
+# Rotas de FATURA e PARCELAS FUTURAS
+# -------------------------------------------------------------------
+
+
+@api.route("/billing/current", methods=["GET"])
+@conditional_get
+def get_current_bill():
+    """
+    Retorna a fatura do cartão do mês atual (ou de ano/mês passados via query)
+    para o usuário (ou fallback):
+
+      /api/billing/current?year=2025&month=11
+    """
+    user_id, error_resp, status = _require_user()
+    if error_resp:
+        return error_resp, status
+
+    today = date.today()
+    year = int(request.args.get("year", today.year))
+    month = int(request.args.get("month", today.month))
+
+    bill = cache.get_or_compute(
+        user_id,
+        "bill",
+        lambda: compute_monthly_bill(year, month, user_id=user_id),
+        f"{year:04d}-{month:02d}",
+    )
+
+    return jsonify(
+        {
+            "year": bill["year"],
+            "month": bill["month"],
+            "total": bill["total"],
+            "one_shot_total": bill["one_shot_total"],
+            "installments_total": bill["installments_total"],
+        }
+    )
+
+
+@api.route("/billing/pay", methods=["POST"])
+@idempotent
+def pay_current_bill():
+    """
+    Paga a fatura de um mês PARA O USUÁRIO:
+
+      body JSON opcional:
+      {
+        "year": 2025,
+        "month": 11,
+        "payment_date": "2025-11-13"
+      }
+
+    Com ?async=1 (ou 'Prefer: respond-async') o pagamento é feito pelo
+    worker e a resposta é 202 com o job.
+    """
+    user_id, error_resp, status = _require_user()
+    if error_resp:
+        return error_resp, status
+
+    today = date.today()
+    data_json = request.get_json() or {}
+
+    year = int(data_json.get("year", today.year))
+    month = int(data_json.get("month", today.month))
+
+    payment_date_str = data_json.get("payment_date")
+    if payment_date_str:
+        try:
+            payment_date = parse_date(payment_date_str)
+        except ValueError:
+            return jsonify({"error": "Formato inválido para 'payment_date'."}), 400
+    else:
+        payment_date = today
+
+    if _wants_async():
+        job, _ = jobs.enqueue(
+            "billing.pay",
+            {"year": year, "month": month, "payment_date": payment_date.isoformat()},
+            user_id=user_id,
+            idempotency_key=request.headers.get("Idempotency-Key"),
+        )
+        db.session.commit()
+        return _job_accepted(job)
+
+    try:
+        result = pay_bill(user_id, year, month, payment_date)
+        if result is None:
+            db.session.rollback()
+            return jsonify(
+                {"error": "Não há fatura pendente para o período informado."}
+            ), 400
+
+        db.session.commit()
+        cache.invalidate_user(user_id)
+        return jsonify(result), 200
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERRO] pay_current_bill: {e}")
+        return jsonify({"error": "Erro ao registrar pagamento da fatura."}), 500
+
+
+def pay_bill(user_id, year: int, month: int, payment_date: date):
+    """
+    Quita a fatura do mês e lança o pagamento (sem commit).
+    Retorna o corpo da resposta, ou None se não houver fatura pendente.
+    """
+    # 1) e 2) Quita compras à vista e parcelas em lote (mesma transação)
+    settlement = settle_monthly_bill(year, month, user_id=user_id)
+    total_cents = settlement["total_cents"]
+
+    if total_cents <= 0:
+        return None
+
+    # 3) Cria transação de pagamento de fatura (saída no débito)
+    payment_tx = Transaction(
+        user_id=user_id,
+        tipo="expense",
+        valor_cents=total_cents,
+        categoria="Pagamento de Fatura",
+        descricao=f"Fatura {month:02d}/{year}",
+        data=payment_date,
+        meio_pagamento="debit",
+        recorrente=False,
+        logo=None,
+        settled=True,
+    )
+    db.session.add(payment_tx)
+    rollup.record_transactions(user_id, [payment_tx])
+
+    bump_data_version(user_id)
+    db.session.flush()  # id do pagamento na resposta
+
+    return {
+        "message": "Fatura paga com sucesso.",
+        "paid_amount": settlement["total"],
+        "year": year,
+        "month": month,
+        "settled_transactions": settlement["settled_transactions"],
+        "paid_installments": settlement["paid_installments"],
+        "payment": payment_tx.to_dict(),
+    }
+
+
+@api.route("/installments/future", methods=["GET"])
+@conditional_get
+def get_future_installments():
+    """
+    Retorna parcelas futuras (não pagas, com due_date > hoje) do usuário,
+    agrupadas por mês.
+
+    Parâmetros opcionais:
+      /api/installments/future?until=2026-12-31&limit=200
+        - until: vencimento máximo (inclusive)
+        - limit: quantidade máxima de parcelas retornadas
+    """
+    user_id, error_resp, status = _require_user()
+    if error_resp:
+        return error_resp, status
+
+    until_str = request.args.get("until")
+    until = None
+    if until_str:
+        try:
+            until = parse_date(until_str)
+        except ValueError:
+            return jsonify({"error": "Formato inválido para 'until'. Use AAAA-MM-DD."}), 400
+
+    limit = request.args.get("limit")
+    if limit not in (None, ""):
+        try:
+            limit = int(limit)
+            if limit <= 0:
+                raise ValueError
+        except ValueError:
+            return jsonify({"error": "O parâmetro 'limit' deve ser um inteiro positivo."}), 400
+    else:
+        limit = None
+
+    today = date.today()
+    result = cache.get_or_compute(
+        user_id,
+        "installments",
+        lambda: future_installments_by_month(user_id, today, until, limit),
+        today.isoformat(),
+        until.isoformat() if until else "",
+        limit or "",
+    )
+    return jsonify(result)
+
+
+def future_installments_by_month(user_id, today: date, until=None, limit=None):
+    """
+    Parcelas não pagas com vencimento após `today` (e até `until`),
+    agrupadas por mês em ordem de vencimento.
+    """
+    filters = [
+        InstallmentCharge.paid.is_(False),
+        InstallmentCharge.due_date > today,
+    ]
+    if user_id is not None:
+        filters.append(Transaction.user_id == user_id)
+    if until is not None:
+        filters.append(InstallmentCharge.due_date <= until)
+
+    # Uma única consulta com as colunas de parcela, plano e transação
+    # (sem lazy load de c.plan / plan.transaction por linha)
+    query = (
+        db.session.query(
+            InstallmentCharge.id,
+            InstallmentCharge.installment_number,
+            InstallmentCharge.amount_cents,
+            InstallmentCharge.due_date,
+            InstallmentPlan.id.label("plan_id"),
+            InstallmentPlan.descricao.label("plan_descricao"),
+            InstallmentPlan.installments,
+            Transaction.descricao.label("transaction_descricao"),
+        )
+        .join(InstallmentPlan, InstallmentCharge.plan_id == InstallmentPlan.id)
+        .join(Transaction, InstallmentPlan.transaction_id == Transaction.id)
+        .filter(*filters)
+        .order_by(InstallmentCharge.due_date, InstallmentCharge.id)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+
+    # As linhas já chegam ordenadas por vencimento: basta fechar um grupo
+    # sempre que o mês muda.
+    result = []
+    current = None
+    current_cents = 0
+    for row in query:
+        y = row.due_date.year
+        m = row.due_date.month
+
+        if current is None or (current["year"], current["month"]) != (y, m):
+            current = {
+                "year": y,
+                "month": m,
+                "total": 0.0,
+                "items": [],
+            }
+            current_cents = 0
+            result.append(current)
+
+        current_cents += row.amount_cents
+        current["total"] = from_cents(current_cents)
+        current["items"].append(
+            {
+                "id": row.id,
+                "plan_id": row.plan_id,
+                "descricao": row.plan_descricao or row.transaction_descricao or "",
+                "installment_number": row.installment_number,
+                "installments": row.installments,
+                "amount": from_cents(row.amount_cents),
+                "due_date": row.due_date.isoformat(),
+            }
+        )
+
+    return result
+
+
+# -------------------------------------------------------------------
+# RESUMO DO DASHBOARD (agregado no banco)
+# -------------------------------------------------------------------
+
+
+def transaction_groups(filters):
+    """
+    SUM/COUNT das transações por (ano, mês, tipo, categoria, meio), direto
+    na tabela transaction. Usado quando o período não é de meses inteiros
+    (o resumo mensal materializado não serve).
+    """
+    year_col = func.extract("year", Transaction.data).label("year")
+    month_col = func.extract("month", Transaction.data).label("month")
+
+    return (
+        db.session.query(
+            year_col,
+            month_col,
+            Transaction.tipo,
+            Transaction.categoria,
+            Transaction.meio_pagamento,
+            func.sum(Transaction.valor_cents).label("total"),
+            func.count(Transaction.id).label("count"),
+        )
+        .filter(*filters)
+        .group_by(
+            year_col,
+            month_col,
+            Transaction.tipo,
+            Transaction.categoria,
+            Transaction.meio_pagamento,
+        )
+        .all()
+    )
+
+
+def _leaves_balance(group) -> bool:
+    """
+    Mesma regra do app.js: só sai do saldo o que é débito,
+    pagamento de fatura ou gasto sem meio de pagamento.
+    """
+    return (
+        group.meio_pagamento == "debit"
+        or group.categoria == "Pagamento de Fatura"
+        or not group.meio_pagamento
+    )
+
+
+def compute_summary(user_id, filters=None, groups=None):
+    """
+    Agrega as transações do usuário e devolve os números que o dashboard
+    precisa, sem trafegar o histórico:
+
+    - entradas, gastos que saem do saldo (débito/fatura/sem meio) e saldo;
+    - totais por mês, por categoria de gasto e por meio de pagamento;
+    - assinaturas ativas (tabela subscriptions).
+
+    `groups` são as linhas já agregadas por mês (normalmente do
+    monthly_rollup); sem elas, agrega a tabela transaction com `filters`.
+    As somas são em centavos (exatas); a conversão para reais é no final.
+    """
+    if filters is None:
+        filters = [Transaction.user_id == user_id]
+
+    if groups is None:
+        groups = transaction_groups(filters)
+
+    total_income = 0
+    total_expenses = 0
+    transaction_count = 0
+    by_month = {}
+    by_category = {}
+    by_payment_method = {}
+
+    for g in groups:
+        total = int(g.total or 0)
+        transaction_count += g.count
+        key = (int(g.year), int(g.month))
+
+        if key not in by_month:
+            by_month[key] = {
+                "year": key[0],
+                "month": key[1],
+                "income": 0,
+                "expenses": 0,
+                "credit_expenses": 0,
+            }
+        month = by_month[key]
+
+        if g.tipo == "income":
+            total_income += total
+            month["income"] += total
+            continue
+
+        if g.tipo != "expense":
+            continue
+
+        by_category[g.categoria] = by_category.get(g.categoria, 0) + total
+        method = g.meio_pagamento or "none"
+        by_payment_method[method] = by_payment_method.get(method, 0) + total
+
+        if _leaves_balance(g):
+            total_expenses += total
+            month["expenses"] += total
+        else:
+            month["credit_expenses"] += total
+
+    # ------------------------------------------------------------------
+    # Assinaturas: tabela subscriptions (ativas), sem varrer o histórico.
+    # Totais em custo mensal equivalente (semanal/anual convertidos).
+    # ------------------------------------------------------------------
+    subscriptions_list = {"debit": [], "credit": []}
+    subscription_cents = {"debit": 0, "credit": 0}
+    active = subscriptions.active_subscriptions(user_id)
+    for sub in active:
+        bucket = "credit" if sub.meio_pagamento == "credit" else "debit"
+        subscription_cents[bucket] += subscriptions.monthly_equivalent_cents(sub)
+        subscriptions_list[bucket].append(
+            {
+                "id": sub.id,
+                "descricao": sub.name,
+                "categoria": sub.categoria,
+                "valor": from_cents(sub.amount_cents),
+                "meio_pagamento": sub.meio_pagamento,
+                "logo": sub.logo,
+                "cadence": sub.cadence,
+                "interval": sub.interval,
+                "next_due_date": sub.next_due_date.isoformat(),
+            }
+        )
+
+    today = date.today()
+    bill = compute_monthly_bill(today.year, today.month, user_id=user_id)
+
+    return {
+        "transaction_count": transaction_count,
+        "total_income": from_cents(total_income),
+        "total_expenses": from_cents(total_expenses),
+        "balance": from_cents(total_income - total_expenses),
+        "credit_card_bill": bill["total"],
+        "by_month": [
+            {
+                "year": m["year"],
+                "month": m["month"],
+                "income": from_cents(m["income"]),
+                "expenses": from_cents(m["expenses"]),
+                "credit_expenses": from_cents(m["credit_expenses"]),
+            }
+            for _, m in sorted(by_month.items())
+        ],
+        "expenses_by_category": [
+            {"categoria": cat, "total": from_cents(total)}
+            for cat, total in sorted(
+                by_category.items(), key=lambda item: item[1], reverse=True
+            )
+        ],
+        "expenses_by_payment_method": {
+            method: from_cents(total) for method, total in by_payment_method.items()
+        },
+        "subscriptions": {
+            "count": len(active),
+            "debit": subscriptions_list["debit"],
+            "debit_total": from_cents(subscription_cents["debit"]),
+            "credit": subscriptions_list["credit"],
+            "credit_total": from_cents(subscription_cents["credit"]),
+        },
+    }
+
+
+@api.route("/summary", methods=["GET"])
+@conditional_get
+def get_summary():
+    """
+    Resumo agregado do dashboard para o usuário (ou fallback).
+
+    Aceita os mesmos filtros da listagem de transações:
+
+      /api/summary?start=2025-01-01&end=2025-12-31
+    """
+    user_id, error_resp, status = _require_user()
+    if error_resp:
+        return error_resp, status
+
+    try:
+        filters = _parse_transaction_filters(request.args, user_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # _parse_transaction_filters já validou as datas
+    start = parse_date(request.args["start"]) if request.args.get("start") else None
+    end = parse_date(request.args["end"]) if request.args.get("end") else None
+    categorias = [c for c in request.args.getlist("categoria") if c]
+
+    def compute():
+        groups = None
+        if rollup.covers_period(start, end):
+            # meses inteiros: O(meses) no resumo materializado
+            groups = rollup.summary_groups(user_id, start, end, categorias)
+        return compute_summary(user_id, filters, groups=groups)
+
+    summary = cache.get_or_compute(
+        user_id,
+        "summary",
+        compute,
+        date.today().isoformat(),  # a fatura do resumo é a do mês corrente
+        request.args.get("start", ""),
+        request.args.get("end", ""),
+        ",".join(request.args.getlist("categoria")),
+    )
+    return jsonify(summary)
+
+
+def _parse_year_month(value: str) -> date:
+    """'AAAA-MM' -> primeiro dia do mês."""
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+def compute_report(user_id, period: str, start=None, end=None):
+    """
+    Entradas/gastos por mês ou por ano, só a partir do monthly_rollup
+    (custo proporcional ao número de meses, não de transações).
+    """
+    buckets = {}
+    for g in rollup.summary_groups(user_id, start, end):
+        key = (g.year, g.month) if period == "monthly" else (g.year,)
+        if key not in buckets:
+            buckets[key] = {"income": 0, "expenses": 0, "credit_expenses": 0, "count": 0}
+        bucket = buckets[key]
+        bucket["count"] += g.count
+
+        if g.tipo == "income":
+            bucket["income"] += g.total
+        elif g.tipo == "expense":
+            if _leaves_balance(g):
+                bucket["expenses"] += g.total
+            else:
+                bucket["credit_expenses"] += g.total
+
+    result = []
+    for key in sorted(buckets):
+        b = buckets[key]
+        item = {"year": key[0]}
+        if period == "monthly":
+            item["month"] = key[1]
+        item.update(
+            {
+                "income": from_cents(b["income"]),
+                "expenses": from_cents(b["expenses"]),
+                "credit_expenses": from_cents(b["credit_expenses"]),
+                "balance": from_cents(b["income"] - b["expenses"]),
+                "transaction_count": b["count"],
+            }
+        )
+        result.append(item)
+    return result
+
+
+@api.route("/reports/<period>", methods=["GET"])
+@conditional_get
+def get_report(period: str):
+    """
+    Relatório por período, a partir do resumo mensal materializado:
+
+      /api/reports/monthly?start=2025-01&end=2025-12
+      /api/reports/yearly
+    """
+    user_id, error_resp, status = _require_user()
+    if error_resp:
+        return error_resp, status
+
+    if period not in ("monthly", "yearly"):
+        return jsonify({"error": "Use /reports/monthly ou /reports/yearly."}), 404
+
+    try:
+        start = _parse_year_month(request.args["start"]) if request.args.get("start") else None
+        end = _parse_year_month(request.args["end"]) if request.args.get("end") else None
+    except ValueError:
+        return jsonify({"error": "Formato inválido em 'start'/'end'. Use AAAA-MM."}), 400
+
+    report = cache.get_or_compute(
+        user_id,
+        "report",
+        lambda: compute_report(user_id, period, start, end),
+        period,
+        request.args.get("start", ""),
+        request.args.get("end", ""),
+    )
+    return jsonify(report)
+
+
+# -------------------------------------------------------------------
+# PROJEÇÃO DE FLUXO DE CAIXA
+# -------------------------------------------------------------------
+
+
+MAX_FORECAST_MONTHS = 36
+
+
+def compute_forecast(user_id, today: date, months: int) -> dict:
+    """
+    Saldo projetado mês a mês a partir do mês corrente. Cada fonte chega
+    já agregada do banco (nenhuma varredura do histórico inteiro):
+
+    - saldo atual: resumo mensal materializado;
+    - linha de base: GROUP BY dos últimos meses completos;
+    - parcelas não pagas e fatura aberta: GROUP BY por mês/categoria;
+    - assinaturas: próximas ocorrências das assinaturas ativas.
+    """
+    start, last_of_month = month_bounds(today.year, today.month)
+    end = add_months(start, months) - timedelta(days=1)
+
+    # ------------------------------------------------------------------
+    # 1. Saldo atual e tamanho do histórico (monthly_rollup)
+    # ------------------------------------------------------------------
+    balance_cents = 0
+    first_period = None
+    for g in rollup.summary_groups(user_id):
+        total = int(g.total or 0)
+        if g.tipo == "income":
+            balance_cents += total
+        elif g.tipo == "expense" and _leaves_balance(g):
+            balance_cents -= total
+        period = (g.year, g.month)
+        if first_period is None or period < first_period:
+            first_period = period
+
+    # ------------------------------------------------------------------
+    # 2. Linha de base: média dos últimos meses completos
+    # ------------------------------------------------------------------
+    baseline_months = 0
+    if first_period is not None:
+        history_months = forecast.month_index(date(*first_period, 1), start)
+        baseline_months = max(0, min(forecast.BASELINE_MONTHS, history_months))
+
+    baseline_income = 0
+    baseline_expenses = {}
+    if baseline_months:
+        window_start = add_months(start, -baseline_months)
+        rows = (
+            db.session.query(
+                Transaction.tipo,
+                Transaction.categoria,
+                func.sum(Transaction.valor_cents).label("total"),
+            )
+            .filter(
+                Transaction.user_id == user_id,
+                Transaction.data >= window_start,
+                Transaction.data < start,
+                Transaction.is_installment.is_(False),
+                Transaction.categoria != "Pagamento de Fatura",
+                # assinaturas entram pelas próximas ocorrências (passo 3);
+                # demais recorrentes (salário, aluguel...) ficam na média
+                Transaction.subscription_id.is_(None),
+                not_(
+                    and_(
+                        Transaction.recorrente.is_(True),
+                        Transaction.categoria == "Assinaturas",
+                    )
+                ),
+            )
+            .group_by(Transaction.tipo, Transaction.categoria)
+            .all()
+        )
+        for r in rows:
+            average = round(int(r.total or 0) / baseline_months)
+            if r.tipo == "income":
+                baseline_income += average
+            elif r.tipo == "expense" and average:
+                baseline_expenses[r.categoria] = average
+
+    # ------------------------------------------------------------------
+    # 3. Lançamentos já agendados
+    # ------------------------------------------------------------------
+    scheduled = []
+
+    # compras à vista no crédito da fatura aberta (saem no mês corrente)
+    open_bill = (
+        db.session.query(
+            Transaction.categoria,
+            func.sum(Transaction.valor_cents).label("total"),
+        )
+        .filter(*bill_one_shot_filters(start, last_of_month, user_id))
+        .group_by(Transaction.categoria)
+        .all()
+    )
+    scheduled.extend(("open_bill", r.categoria, 0, int(r.total or 0)) for r in open_bill)
+
+    # parcelas não pagas, por mês de vencimento e categoria da compra
+    due_year = func.extract("year", InstallmentCharge.due_date).label("year")
+    due_month = func.extract("month", InstallmentCharge.due_date).label("month")
+    installments = (
+        db.session.query(
+            due_year,
+            due_month,
+            Transaction.categoria,
+            func.sum(InstallmentCharge.amount_cents).label("total"),
+        )
+        .join(InstallmentPlan, InstallmentCharge.plan_id == InstallmentPlan.id)
+        .join(Transaction, InstallmentPlan.transaction_id == Transaction.id)
+        .filter(
+            *bill_installment_filters(start, end),
+            Transaction.user_id == user_id,
+        )
+        .group_by(due_year, due_month, Transaction.categoria)
+        .all()
+    )
+    scheduled.extend(
+        (
+            "installments",
+            r.categoria,
+            forecast.month_index(start, date(int(r.year), int(r.month), 1)),
+            int(r.total or 0),
+        )
+        for r in installments
+    )
+
+    # próximas cobranças de assinatura
+    for sub in subscriptions.active_subscriptions(user_id):
+        scheduled.extend(
+            ("subscriptions", sub.categoria, forecast.month_index(start, d), sub.amount_cents)
+            for d in subscriptions.upcoming_dates(sub, today, end)
+        )
+
+    days_in_month = last_of_month.day
+    return forecast.build_forecast(
+        start,
+        months,
+        balance_cents,
+        baseline_income,
+        baseline_expenses,
+        scheduled,
+        first_fraction=(days_in_month - today.day) / days_in_month,
+        baseline_months=baseline_months,
+    )
+
+
+@api.route("/forecast", methods=["GET"])
+@conditional_get
+def get_forecast():
+    """
+    Projeção do saldo mês a mês (parcelas + assinaturas + média histórica):
+
+      /api/forecast?months=24   (1 a 36; padrão 12)
+    """
+    user_id, error_resp, status = _require_user()
+    if error_resp:
+        return error_resp, status
+
+    try:
+        months = int(request.args.get("months", 12))
+    except ValueError:
+        return jsonify({"error": "O parâmetro 'months' deve ser um inteiro."}), 400
+    months = max(1, min(months, MAX_FORECAST_MONTHS))
+
+    today = date.today()
+    result = cache.get_or_compute(
+        user_id,
+        "forecast",
+        lambda: compute_forecast(user_id, today, months),
+        today.isoformat(),
+        months,
+    )
+    return jsonify(result)
+
+
+# -------------------------------------------------------------------
+# SUGESTÕES (estatísticas por categoria + ranking)
+# -------------------------------------------------------------------
+
+
+def compute_insights(user_id, today: date) -> dict:
+    stats = insights.category_stats(user_id, today)
+
+    bill = compute_monthly_bill(today.year, today.month, user_id=user_id)
+    active = subscriptions.active_subscriptions(user_id)
+    subscription_monthly = sum(subscriptions.monthly_equivalent_cents(sub) for sub in active)
+
+    return {
+        "suggestions": insights.build_suggestions(
+            stats,
+            to_cents(bill["total"]),
+            len(active),
+            subscription_monthly,
+        ),
+        "stats": insights.stats_to_dict(stats),
+    }
+
+
+@api.route("/insights", methods=["GET"])
+@conditional_get
+def get_insights():
+    """
+    Sugestões de economia em ordem de impacto, com as estatísticas por
+    categoria usadas para gerá-las (média móvel, variação, outliers).
+    """
+    user_id, error_resp, status = _require_user()
+    if error_resp:
+        return error_resp, status
+
+    today = date.today()
+    result = cache.get_or_compute(
+        user_id,
+        "insights",
+        lambda: compute_insights(user_id, today),
+        today.isoformat(),
+    )
+    return jsonify(result)
+
+
+# -------------------------------------------------------------------
+# JOBS EM BACKGROUND (handlers + status)
+# -------------------------------------------------------------------
+
+
+@jobs.handler("billing.pay")
+def _job_pay_bill(job):
+    data = job.data
+    result = pay_bill(job.user_id, data["year"], data["month"], parse_date(data["payment_date"]))
+    if result is None:
+        raise jobs.PermanentError("Não há fatura pendente para o período informado.")
+    return result
+
+
+@jobs.handler("transactions.import")
+def _job_import_transactions(job):
+    reader = importers.READERS[job.data.get("format", "csv")]
+    try:
+        return import_stream(job.user_id, reader, io.BytesIO(job.attachment or b""))
+    except importers.ImportFormatError as e:
+        raise jobs.PermanentError(str(e))
+
+
+@jobs.handler("rollup.rebuild")
+def _job_rebuild_rollup(job):
+    rows = rollup.rebuild(job.user_id)
+    if job.user_id is not None:
+        bump_data_version(job.user_id)
+    else:
+        bump_all_data_versions()
+    return {"rows": rows}
+
+
+@jobs.handler("subscriptions.generate")
+def _job_generate_subscriptions(job):
+    # generate_due faz commit por lote; é idempotente (reserva por
+    # next_occurrence), então uma nova tentativa não duplica cobranças.
+    # Sem user_id: todos os usuários (job diário).
+    on_date = job.data.get("date")
+    created = subscriptions.generate_due(
+        parse_date(on_date) if on_date else None, user_id=job.user_id
+    )
+    return {"created": created}
+
+
+@api.route("/jobs", methods=["GET"])
+def list_jobs():
+    """Últimos jobs do usuário (?status=queued|running|done|failed)."""
+    user_id, error_resp, status = _require_user()
+    if error_resp:
+        return error_resp, status
+
+    query = Job.query.filter(Job.user_id == user_id)
+    if request.args.get("status"):
+        query = query.filter(Job.status == request.args["status"])
+    items = query.order_by(Job.created_at.desc(), Job.id.desc()).limit(50).all()
+    return jsonify([job.to_dict() for job in items])
+
+
+@api.route("/jobs/<int:job_id>", methods=["GET"])
+def get_job(job_id: int):
+    """Status (e resultado, quando concluído) de um job do usuário."""
+    user_id, error_resp, status = _require_user()
+    if error_resp:
+        return error_resp, status
+
+    job = Job.query.filter_by(id=job_id, user_id=user_id).first_or_404()
+    return jsonify(job.to_dict())
+
+
+@api.route("/rollup/rebuild", methods=["POST"])
+def enqueue_rollup_rebuild():
+    """Recalcula o resumo mensal do usuário em background."""
+    user_id, error_resp, status = _require_user()
+    if error_resp:
+        return error_resp, status
+
+    job, _ = jobs.enqueue(
+        "rollup.rebuild",
+        user_id=user_id,
+        idempotency_key=request.headers.get("Idempotency-Key"),
+    )
+    db.session.commit()
+    return _job_accepted(job)
+
+
+def diagnostics_only(view_func):
+    """
+    Rotas de diagnóstico (internos do processo, sem dado de usuário): só
+    respondem em debug ou com a instrumentação ligada
+    (SOLVIX_INSTRUMENTATION=1, a mesma chave do /metrics); fora disso, 404.
+    """
+    @wraps(view_func)
+    def wrapped(*args, **kwargs):
+        from .instrumentation import instrumentation
+
+        if not (current_app.debug or instrumentation.enabled):
+            abort(404)
+        return view_func(*args, **kwargs)
+
+    return wrapped
+
+
+@api.route("/cache/stats", methods=["GET"])
+@diagnostics_only
+def get_cache_stats():
+    """Contadores do cache de resultados (acertos, erros, backend em uso)."""
+    return jsonify(cache.stats())
+
+
+@api.route("/db/pool-stats", methods=["GET"])
+@diagnostics_only
+def get_pool_stats():
+    """Espera no checkout do pool de conexões e ocupação atual (por worker)."""
+    return jsonify(pool_stats.snapshot())
+
+
+# -------------------------------------------------------------------
+# ASSINATURAS (cadência + cobranças geradas + projeção)
+# -------------------------------------------------------------------
 
-    bill = compute_monthly_bill(year, month, user_id=user_id)
 
-    return jsonify(
-        {
-            "year": bill["year"],
-            "month": bill["month"],
-            "total": bill["total"],
-            "one_shot_total": bill["one_shot_total"],
-            "installments_total": bill["installments_total"],
-        }
-    )
+@api.route("/subscriptions", methods=["GET"])
+@conditional_get
+def list_subscriptions():
+    """Assinaturas ativas do usuário."""
+    user_id, error_resp, status = _require_user()
+    if error_resp:
+        return error_resp, status
 
+    return jsonify([sub.to_dict() for sub in subscriptions.active_subscriptions(user_id)])
 
-@api.route("/billing/pay", methods=["POST"])
-def pay_current_bill():
+
+@api.route("/subscriptions", methods=["POST"])
+def create_subscription():
     """
-    Paga a fatura de um mês PARA O USUÁRIO:
+    Cria uma assinatura sem lançar cobrança agora. A 1ª cobrança é gerada
+    em `anchor_date` (padrão: hoje), as seguintes conforme a cadência. Com
+    `anchor_date` no passado, começa na primeira ocorrência a partir de
+    hoje (cobranças passadas não são geradas).
 
-      body JSON opcional:
+    Body JSON:
       {
-        "year": 2025,
-        "month": 11,
-        "payment_date": "2025-11-13"
+        "name": "Netflix",
+        "valor": 55.90,
+        "cadence": "monthly",        # weekly | monthly | yearly
+        "interval": 1,
+        "anchor_date": "2025-01-10",
+        "end_date": null,
+        "meio_pagamento": "credit",
+        "logo": "https://..."
       }
     """
     user_id, error_resp, status = _require_user()
     if error_resp:
         return error_resp, status
 
-    today = date.today()
-    data_json = request.get_json() or {}
-
-    year = int(data_json.get("year", today.year))
-    month = int(data_json.get("month", today.month))
-
-    payment_date_str = data_json.get("payment_date")
-    if payment_date_str:
-        try:
-            payment_date = parse_date(payment_date_str)
-        except ValueError:
-            return jsonify({"error": "Formato inválido para 'payment_date'."}), 400
-    else:
-        payment_date = today
-
-    bill = compute_monthly_bill(year, month, user_id=user_id)
-    total = bill["total"]
-
-    if total <= 0:
-        return jsonify({"error": "Não há fatura pendente para o período informado."}), 400
+    data = request.get_json() or {}
+    name = (data.get("name") or "").strip()
+    if not name:
+        return jsonify({"error": "O campo 'name' é obrigatório."}), 400
 
     try:
-        # 1) Marca compras à vista como quitadas
-        if bill["one_shot_ids"]:
-            one_shots = Transaction.query.filter(
-                Transaction.id.in_(bill["one_shot_ids"])
-            ).all()
-            for t in one_shots:
-                t.settled = True
-
-        # 2) Marca parcelas como pagas
-        if bill["installment_ids"]:
-            charges = InstallmentCharge.query.filter(
-                InstallmentCharge.id.in_(bill["installment_ids"])
-            ).all()
-            for c in charges:
-                c.paid = True
+        amount_cents = to_cents(data.get("valor"))
+    except ValueError:
+        return jsonify({"error": "O campo 'valor' deve ser um número válido."}), 400
+    if amount_cents <= 0:
+        return jsonify({"error": "O valor deve ser positivo."}), 400
 
-        # 3) Cria transação de pagamento de fatura (saída no débito)
-        payment_tx = Transaction(
-            user_id=user_id,
-            tipo="expense",
-            valor=total,
-            categoria="Pagamento de Fatura",
-            descricao=f"Fatura {month:02d}/{year}",
-            data=payment_date,
-            meio_pagamento="debit",
-            recorrente=False,
-            logo=None,
-            settled=True,
-        )
-        db.session.add(payment_tx)
+    try:
+        cadence, interval = _parse_cadence(data)
+        anchor_date = parse_date(data["anchor_date"]) if data.get("anchor_date") else date.today()
+        end_date = parse_date(data["end_date"]) if data.get("end_date") else None
+        subscription = subscriptions.new_subscription(
+            user_id,
+            name,
+            amount_cents,
+            anchor_date,
+            cadence=cadence,
+            interval=interval,
+            categoria=data.get("categoria") or "Assinaturas",
+            meio_pagamento=data.get("meio_pagamento") or None,
+            logo=data.get("logo") or None,
+            end_date=end_date,
+            first_occurrence=subscriptions.first_occurrence_after(
+                anchor_date, cadence, interval, date.today() - timedelta(days=1), k=0
+            ),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
+    try:
+        db.session.add(subscription)
+        if subscription.next_due_date <= date.today():
+            # 1ª cobrança é hoje: o worker gera já, sem esperar o job diário
+            jobs.enqueue("subscriptions.generate", user_id=user_id)
+        bump_data_version(user_id)
         db.session.commit()
-
-        return jsonify(
-            {
-                "message": "Fatura paga com sucesso.",
-                "paid_amount": total,
-                "year": year,
-                "month": month,
-                "payment": payment_tx.to_dict(),
-            }
-        ), 200
-
+        cache.invalidate_user(user_id)
+        return jsonify(subscription.to_dict()), 201
     except Exception as e:
         db.session.rollback()
-        print(f"[ERRO] pay_current_bill: {e}")
-        return jsonify({"error": "Erro ao registrar pagamento da fatura."}), 500
+        print(f"[ERRO] create_subscription: {e}")
+        return jsonify({"error": "Erro interno ao salvar a assinatura."}), 500
 
 
-@api.route("/installments/future", methods=["GET"])
-def get_future_installments():
+@api.route("/subscriptions/<int:subscription_id>", methods=["DELETE"])
+def cancel_subscription(subscription_id: int):
     """
-    Retorna parcelas futuras (não pagas, com due_date > hoje) do usuário,
-    agrupadas por mês.
+    Cancela a assinatura: para de gerar cobranças. As já lançadas continuam
+    no histórico.
     """
     user_id, error_resp, status = _require_user()
     if error_resp:
         return error_resp, status
 
-    today = date.today()
+    subscription = Subscription.query.filter_by(
+        id=subscription_id, user_id=user_id
+    ).first_or_404()
 
-    charges_query = (
-        InstallmentCharge.query
-        .join(InstallmentPlan)
-        .join(Transaction, InstallmentPlan.transaction_id == Transaction.id)
-        .filter(
-            InstallmentCharge.paid.is_(False),
-            InstallmentCharge.due_date > today,
-        )
-    )
-    if user_id is not None:
-        charges_query = charges_query.filter(Transaction.user_id == user_id)
+    try:
+        subscription.active = False
+        bump_data_version(user_id)
+        db.session.commit()
+        cache.invalidate_user(user_id)
+        return jsonify({"message": "Assinatura cancelada."}), 200
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERRO] cancel_subscription: {e}")
+        return jsonify({"error": "Erro interno ao cancelar a assinatura."}), 500
 
-    charges = charges_query.order_by(InstallmentCharge.due_date).all()
 
-    grouped = {}
-    for c in charges:
-        y = c.due_date.year
-        m = c.due_date.month
-        key = f"{y:04d}-{m:02d}"
+MAX_PROJECTION_MONTHS = 36
 
-        if key not in grouped:
-            grouped[key] = {
-                "year": y,
-                "month": m,
-                "total": 0.0,
-                "items": [],
-            }
 
-        plan = c.plan
-        desc = plan.descricao or (plan.transaction.descricao if plan.transaction else "")
+@api.route("/subscriptions/projection", methods=["GET"])
+@conditional_get
+def get_subscriptions_projection():
+    """
+    Gasto previsto com assinaturas por mês, a partir do mês atual:
 
-        grouped[key]["total"] += c.amount
-        grouped[key]["items"].append(
-            {
-                "id": c.id,
-                "plan_id": plan.id,
-                "descricao": desc,
-                "installment_number": c.installment_number,
-                "installments": plan.installments,
-                "amount": c.amount,
-                "due_date": c.due_date.isoformat(),
-            }
-        )
+      /api/subscriptions/projection?months=12
+    """
+    user_id, error_resp, status = _require_user()
+    if error_resp:
+        return error_resp, status
+
+    try:
+        months = int(request.args.get("months", 12))
+    except ValueError:
+        return jsonify({"error": "O parâmetro 'months' deve ser um inteiro."}), 400
+    months = max(1, min(months, MAX_PROJECTION_MONTHS))
+
+    today = date.today()
+    start = date(today.year, today.month, 1)
+
+    projection = cache.get_or_compute(
+        user_id,
+        "subscriptions_projection",
+        lambda: subscriptions.project(user_id, start, months),
+        start.isoformat(),
+        months,
+    )
+    return jsonify({"months": projection})
 
-    # Ordena por mês
-    result = [grouped[k] for k in sorted(grouped.keys())]
-    return jsonify(result)
 
 # -------------------------------------------------------------------
 # CAIXINHAS / RESERVAS (SavingBox + SavingMovement)
@@ -567,17 +2273,21 @@ def get_future_installments():
 
 @api.route("/saving-boxes", methods=["GET"])
 @api.route("/investments", methods=["GET"])  # alias compatível com versão antiga
+@conditional_get
 def list_saving_boxes():
     """
     Lista as caixinhas do usuário logado (ou fallback),
-    com saldo atual calculado.
+    com o saldo materializado (uma única consulta, sem ler os movimentos).
     """
     user_id, error_resp, status = _require_user()
     if error_resp:
         return error_resp, status
 
-    boxes = SavingBox.query.filter_by(user_id=user_id, archived=False).all()
-    return jsonify([b.to_dict(include_movements=False) for b in boxes])
+    def load_boxes():
+        boxes = SavingBox.query.filter_by(user_id=user_id, archived=False).all()
+        return [b.to_dict(include_movements=False) for b in boxes]
+
+    return jsonify(cache.get_or_compute(user_id, "boxes", load_boxes))
 
 
 @api.route("/saving-boxes", methods=["POST"])
@@ -606,26 +2316,27 @@ def create_saving_box():
     description = data_json.get("description")
     target_amount = data_json.get("target_amount")
 
+    target_amount_cents = None
     if target_amount not in (None, ""):
         try:
-            target_amount = float(str(target_amount).replace(",", "."))
+            target_amount_cents = to_cents(target_amount)
         except ValueError:
             return jsonify(
                 {"error": "O campo 'target_amount' deve ser um número válido."}
             ), 400
-    else:
-        target_amount = None
 
     box = SavingBox(
         user_id=user_id,
         name=name,
         description=description,
-        target_amount=target_amount,
+        target_amount_cents=target_amount_cents,
     )
 
     try:
         db.session.add(box)
+        bump_data_version(user_id)
         db.session.commit()
+        cache.invalidate_user(user_id)
         return jsonify(box.to_dict(include_movements=False)), 201
     except Exception as e:
         db.session.rollback()
@@ -635,32 +2346,133 @@ def create_saving_box():
 
 @api.route("/saving-boxes/<int:box_id>", methods=["GET"])
 @api.route("/investments/<int:box_id>", methods=["GET"])  # alias compatível
+@conditional_get
 def get_saving_box(box_id: int):
     """
-    Detalhes de uma caixinha (com movimentos) do usuário.
+    Detalhes de uma caixinha do usuário, com a primeira página de
+    movimentos (mais recentes primeiro):
+
+      -> {..., "movements": [...], "movements_next_cursor": "..." | null}
+
+    As demais páginas vêm de /api/saving-boxes/<id>/movements?cursor=...
+    Modo legado (histórico completo): /api/saving-boxes/<id>?legacy=1
+    """
+    user_id, error_resp, status = _require_user()
+    if error_resp:
+        return error_resp, status
+
+    box = SavingBox.query.filter_by(id=box_id, user_id=user_id).first_or_404()
+    if request.args.get("legacy") in ("1", "true"):
+        return jsonify(box.to_dict(include_movements=True))
+
+    try:
+        movements, next_cursor = _movements_page(box.id, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    data = box.to_dict()
+    data["movements"] = movements
+    data["movements_next_cursor"] = next_cursor
+    return jsonify(data)
+
+
+@api.route("/saving-boxes/<int:box_id>/movements", methods=["GET"])
+@api.route("/investments/<int:box_id>/movements", methods=["GET"])  # alias
+@conditional_get
+def list_saving_box_movements(box_id: int):
+    """
+    Movimentos de uma caixinha, paginados por cursor em (data, id):
+
+      /api/saving-boxes/<id>/movements?limit=50&cursor=<next_cursor>
+
+      -> {"items": [...], "next_cursor": "..." | null}
     """
     user_id, error_resp, status = _require_user()
     if error_resp:
         return error_resp, status
 
     box = SavingBox.query.filter_by(id=box_id, user_id=user_id).first_or_404()
-    return jsonify(box.to_dict(include_movements=True))
+    try:
+        items, next_cursor = _movements_page(box.id, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"items": items, "next_cursor": next_cursor})
+
+
+def _movements_page(box_id: int, args):
+    """
+    Uma página de movimentos (data desc, id desc) a partir de ?limit e
+    ?cursor. Retorna (itens, next_cursor). ValueError se os parâmetros
+    forem inválidos.
+    """
+    try:
+        limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("O parâmetro 'limit' deve ser um inteiro.")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    query = SavingMovement.query.filter(SavingMovement.box_id == box_id)
+    cursor = args.get("cursor")
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        query = query.filter(
+            or_(
+                SavingMovement.date < cursor_date,
+                and_(SavingMovement.date == cursor_date, SavingMovement.id < cursor_id),
+            )
+        )
+
+    rows = (
+        query
+        .order_by(SavingMovement.date.desc(), SavingMovement.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].id)
+    return [m.to_dict() for m in rows], next_cursor
+
+
+def _movement_response(box, movement, tx):
+    """
+    Resposta de depósito/resgate: só o que mudou (saldo da caixinha, o
+    movimento novo e a transação), com tamanho constante não importa
+    quantos movimentos a caixinha já tenha. ?legacy=1 devolve a caixinha
+    com o histórico completo, como antes.
+    """
+    if request.args.get("legacy") in ("1", "true"):
+        db.session.refresh(box)
+        return {
+            "box": box.to_dict(include_movements=True),
+            "transaction": tx.to_dict(),
+        }
+    return {
+        "box": box.to_dict(),
+        "movement": movement.to_dict(),
+        "transaction": tx.to_dict(),
+    }
 
 
 def _parse_amount_and_date(data_json, default_date: date | None = None):
     """
     Helper pra reaproveitar em depósito/saque de caixinha.
+    Retorna (valor_em_centavos, data).
     """
     amount_raw = data_json.get("amount")
     if amount_raw in (None, ""):
         raise ValueError("O campo 'amount' é obrigatório.")
 
     try:
-        amount = float(str(amount_raw).replace(",", "."))
+        amount_cents = to_cents(amount_raw)
     except ValueError:
         raise ValueError("O campo 'amount' deve ser um número válido.")
 
-    if amount <= 0:
+    if amount_cents <= 0:
         raise ValueError("O valor deve ser positivo.")
 
     date_str = data_json.get("date")
@@ -672,11 +2484,52 @@ def _parse_amount_and_date(data_json, default_date: date | None = None):
     else:
         d = default_date or date.today()
 
-    return amount, d
+    return amount_cents, d
+
+
+def _movement_rows(user_id, box, kind: str, amount_cents: int, d: date, desc=None):
+    """
+    Valores da Transaction e do SavingMovement de um depósito ('deposit',
+    sai do saldo como gasto no débito) ou resgate ('withdraw', volta como
+    entrada).
+    """
+    if kind == "deposit":
+        tx_values = {
+            "tipo": "expense",
+            "categoria": SAVING_DEPOSIT_CATEGORY,
+            "descricao": desc or f"Depósito em {box.name}",
+            "meio_pagamento": "debit",
+        }
+        movement_desc = desc or "Depósito em caixinha"
+    else:
+        tx_values = {
+            "tipo": "income",
+            "categoria": SAVING_WITHDRAW_CATEGORY,
+            "descricao": desc or f"Resgate de {box.name}",
+            "meio_pagamento": None,
+        }
+        movement_desc = desc or "Resgate da caixinha"
+
+    tx_values.update(
+        user_id=user_id,
+        valor_cents=amount_cents,
+        data=d,
+        recorrente=False,
+        logo=None,
+    )
+    movement_values = {
+        "box_id": box.id,
+        "type": kind,
+        "amount_cents": amount_cents,
+        "date": d,
+        "description": movement_desc,
+    }
+    return tx_values, movement_values
 
 
 @api.route("/saving-boxes/<int:box_id>/deposit", methods=["POST"])
 @api.route("/investments/<int:box_id>/deposit", methods=["POST"])  # alias
+@idempotent
 def deposit_into_saving_box(box_id: int):
     """
     Depósito em uma caixinha.
@@ -690,6 +2543,9 @@ def deposit_into_saving_box(box_id: int):
       "date": "2025-11-01",   (opcional, default hoje)
       "description": "Depósito mensal"
     }
+
+    Resposta: {"box": ..., "movement": ..., "transaction": ...}
+    (ver _movement_response).
     """
     user_id, error_resp, status = _require_user()
     if error_resp:
@@ -701,46 +2557,33 @@ def deposit_into_saving_box(box_id: int):
     desc = data_json.get("description")
 
     try:
-        amount, d = _parse_amount_and_date(data_json)
+        amount_cents, d = _parse_amount_and_date(data_json)
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
 
-    tx = Transaction(
-      user_id=user_id,
-      tipo="expense",
-      valor=amount,
-      categoria="Depósito em Caixinha",
-      descricao=desc or f"Depósito em {box.name}",
-      data=d,
-      meio_pagamento="debit",
-      recorrente=False,
-      logo=None,
-    )
-
-    movement = SavingMovement(
-      box_id=box.id,
-      type="deposit",
-      amount=amount,
-      date=d,
-      description=desc or "Depósito em caixinha",
-      transaction_id=None,
-    )
+    tx_values, movement_values = _movement_rows(user_id, box, "deposit", amount_cents, d, desc)
+    tx = Transaction(**tx_values)
+    movement = SavingMovement(**movement_values, transaction_id=None)
 
     try:
         db.session.add(tx)
+        rollup.record_transactions(user_id, [tx])
         db.session.flush()
         movement.transaction_id = tx.id
         db.session.add(movement)
-        db.session.commit()
 
-        db.session.refresh(box)
+        # saldo materializado: incremento atômico no próprio banco
+        db.session.execute(
+            update(SavingBox)
+            .where(SavingBox.id == box.id)
+            .values(balance_cents=SavingBox.balance_cents + amount_cents),
+            execution_options={"synchronize_session": False},
+        )
+        bump_data_version(user_id)
+        db.session.commit()
+        cache.invalidate_user(user_id)
 
-        return jsonify(
-            {
-                "box": box.to_dict(include_movements=True),
-                "transaction": tx.to_dict(),
-            }
-        ), 201
+        return jsonify(_movement_response(box, movement, tx)), 201
     except Exception as e:
         db.session.rollback()
         print(f"[ERRO] deposit_into_saving_box: {e}")
@@ -749,6 +2592,7 @@ def deposit_into_saving_box(box_id: int):
 
 @api.route("/saving-boxes/<int:box_id>/withdraw", methods=["POST"])
 @api.route("/investments/<int:box_id>/withdraw", methods=["POST"])  # alias
+@idempotent
 def withdraw_from_saving_box(box_id: int):
     """
     Resgate de uma caixinha para o saldo disponível.
@@ -762,6 +2606,9 @@ def withdraw_from_saving_box(box_id: int):
       "date": "2025-11-10",  (opcional, default hoje)
       "description": "Resgate para gastos"
     }
+
+    Resposta: {"box": ..., "movement": ..., "transaction": ...}
+    (ver _movement_response).
     """
     user_id, error_resp, status = _require_user()
     if error_resp:
@@ -773,56 +2620,348 @@ def withdraw_from_saving_box(box_id: int):
     desc = data_json.get("description")
 
     try:
-        amount, d = _parse_amount_and_date(data_json)
+        amount_cents, d = _parse_amount_and_date(data_json)
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
 
-    current_balance = box.current_balance()
-    if amount > current_balance + 1e-9:
-        return jsonify(
-            {
-                "error": "Valor de resgate maior que o saldo disponível na caixinha.",
-                "current_balance": current_balance,
-            }
-        ), 400
-
-    tx = Transaction(
-      user_id=user_id,
-      tipo="income",
-      valor=amount,
-      categoria="Retirada de Caixinha",
-      descricao=desc or f"Resgate de {box.name}",
-      data=d,
-      meio_pagamento=None,
-      recorrente=False,
-      logo=None,
-    )
-
-    movement = SavingMovement(
-      box_id=box.id,
-      type="withdraw",
-      amount=amount,
-      date=d,
-      description=desc or "Resgate da caixinha",
-      transaction_id=None,
-    )
+    tx_values, movement_values = _movement_rows(user_id, box, "withdraw", amount_cents, d, desc)
+    tx = Transaction(**tx_values)
+    movement = SavingMovement(**movement_values, transaction_id=None)
 
     try:
+        # Débito atômico do saldo: o WHERE impede resgatar mais do que há,
+        # mesmo com dois resgates simultâneos na mesma caixinha.
+        debited = db.session.execute(
+            update(SavingBox)
+            .where(
+                SavingBox.id == box.id,
+                SavingBox.balance_cents >= amount_cents,
+            )
+            .values(balance_cents=SavingBox.balance_cents - amount_cents),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+
+        if not debited:
+            db.session.rollback()
+            db.session.refresh(box)
+            current_balance = box.current_balance()
+            return jsonify(
+                {
+                    "error": "Valor de resgate maior que o saldo disponível na caixinha.",
+                    "current_balance": current_balance,
+                }
+            ), 400
+
         db.session.add(tx)
+        rollup.record_transactions(user_id, [tx])
         db.session.flush()
         movement.transaction_id = tx.id
         db.session.add(movement)
+        bump_data_version(user_id)
         db.session.commit()
+        cache.invalidate_user(user_id)
 
-        db.session.refresh(box)
+        return jsonify(_movement_response(box, movement, tx)), 201
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERRO] withdraw_from_saving_box: {e}")
+        return jsonify({"error": "Erro ao registrar resgate da caixinha."}), 500
+
+
+@api.route("/saving-boxes/movements/batch", methods=["POST"])
+@api.route("/investments/movements/batch", methods=["POST"])  # alias
+@idempotent
+def batch_saving_movements():
+    """
+    Vários depósitos/resgates (em uma ou mais caixinhas) em UMA transação
+    do banco, com um commit. Tudo ou nada.
+
+    {
+      "items": [
+        {"box_id": 1, "type": "deposit", "amount": 200, "date": "2025-11-01",
+         "description": "Depósito mensal"},
+        {"box_id": 2, "type": "withdraw", "amount": 50}
+      ]
+    }
+
+    O saldo de cada caixinha é atualizado uma vez, com o valor líquido do
+    lote; o lote é recusado se deixar alguma caixinha com saldo negativo.
+    """
+    user_id, error_resp, status = _require_user()
+    if error_resp:
+        return error_resp, status
+
+    try:
+        items = _batch_items()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def box_id_of(item):
+        try:
+            return int(item.get("box_id"))
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    box_ids = {box_id_of(item) for item in items} - {None}
+    boxes = {
+        box.id: box
+        for box in SavingBox.query.filter(
+            SavingBox.user_id == user_id, SavingBox.id.in_(box_ids)
+        )
+    }
+
+    rows = []
+    deltas = {}
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("Item deve ser um objeto JSON.")
+            box = boxes.get(box_id_of(item))
+            if box is None:
+                raise ValueError("Caixinha não encontrada.")
+            kind = item.get("type")
+            if kind not in ("deposit", "withdraw"):
+                raise ValueError("O campo 'type' deve ser 'deposit' ou 'withdraw'.")
+            amount_cents, d = _parse_amount_and_date(item)
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+            continue
+
+        rows.append(_movement_rows(user_id, box, kind, amount_cents, d, item.get("description")))
+        delta = amount_cents if kind == "deposit" else -amount_cents
+        deltas[box.id] = deltas.get(box.id, 0) + delta
+
+    if errors:
+        return jsonify(
+            {"error": "Nenhum movimento foi registrado: há itens inválidos.", "errors": errors}
+        ), 400
+
+    try:
+        # um UPDATE por caixinha; o WHERE impede saldo negativo mesmo com
+        # outros resgates simultâneos
+        for box_id, delta in deltas.items():
+            applied = db.session.execute(
+                update(SavingBox)
+                .where(
+                    SavingBox.id == box_id,
+                    SavingBox.balance_cents + delta >= 0,
+                )
+                .values(balance_cents=SavingBox.balance_cents + delta),
+                execution_options={"synchronize_session": False},
+            ).rowcount
+            if not applied:
+                db.session.rollback()
+                return jsonify(
+                    {
+                        "error": "Valor de resgate maior que o saldo disponível na caixinha.",
+                        "box_id": box_id,
+                    }
+                ), 400
 
+        tx_rows = [tx_values for tx_values, _ in rows]
+        tx_ids = db.session.execute(
+            insert(Transaction).returning(Transaction.id, sort_by_parameter_order=True),
+            tx_rows,
+        ).scalars().all()
+        rollup.record_transactions(user_id, tx_rows)
+        db.session.execute(
+            insert(SavingMovement),
+            [
+                {**movement_values, "transaction_id": tx_id}
+                for (_, movement_values), tx_id in zip(rows, tx_ids)
+            ],
+        )
+
+        bump_data_version(user_id)
+        db.session.commit()
+        cache.invalidate_user(user_id)
+
+        balances = (
+            db.session.query(SavingBox.id, SavingBox.balance_cents)
+            .filter(SavingBox.id.in_(list(deltas)))
+            .all()
+        )
         return jsonify(
             {
-                "box": box.to_dict(include_movements=True),
-                "transaction": tx.to_dict(),
+                "created": len(rows),
+                "transaction_ids": tx_ids,
+                "boxes": [
+                    {"id": b.id, "current_balance": from_cents(b.balance_cents)}
+                    for b in balances
+                ],
             }
         ), 201
     except Exception as e:
         db.session.rollback()
-        print(f"[ERRO] withdraw_from_saving_box: {e}")
-        return jsonify({"error": "Erro ao registrar resgate da caixinha."}), 500
+        print(f"[ERRO] batch_saving_movements: {e}")
+        return jsonify({"error": "Erro ao registrar os movimentos."}), 500
+
+
+# -------------------------------------------------------------------
+# EXPORTAÇÃO (streaming NDJSON / CSV)
+# -------------------------------------------------------------------
+
+EXPORT_BATCH_SIZE = 1000
+
+
+# Campos exportados que estão em centavos no banco e saem em reais
+EXPORT_MONEY_FIELDS = {"valor", "total_amount", "amount"}
+
+
+def _export_value(field, value):
+    if field in EXPORT_MONEY_FIELDS:
+        return from_cents(value)
+    return _json_value(value)
+
+
+def _export_transactions(user_id):
+    columns = [
+        getattr(Transaction, TRANSACTION_MONEY_FIELDS.get(f, f)).label(f)
+        for f in TRANSACTION_FIELDS
+    ]
+    query = (
+        db.session.query(*columns)
+        .filter(Transaction.user_id == user_id)
+        .order_by(Transaction.data, Transaction.id)
+    )
+    return list(TRANSACTION_FIELDS), query
+
+
+def _export_installments(user_id):
+    fields = [
+        "id",
+        "plan_id",
+        "transaction_id",
+        "installment_number",
+        "amount",
+        "due_date",
+        "paid",
+        "created_at",
+    ]
+    query = (
+        db.session.query(
+            InstallmentCharge.id,
+            InstallmentCharge.plan_id,
+            InstallmentPlan.transaction_id,
+            InstallmentCharge.installment_number,
+            InstallmentCharge.amount_cents.label("amount"),
+            InstallmentCharge.due_date,
+            InstallmentCharge.paid,
+            InstallmentCharge.created_at,
+        )
+        .join(InstallmentPlan, InstallmentCharge.plan_id == InstallmentPlan.id)
+        .join(Transaction, InstallmentPlan.transaction_id == Transaction.id)
+        .filter(Transaction.user_id == user_id)
+        .order_by(InstallmentCharge.due_date, InstallmentCharge.id)
+    )
+    return fields, query
+
+
+def _export_movements(user_id):
+    fields = [
+        "id",
+        "box_id",
+        "type",
+        "amount",
+        "date",
+        "description",
+        "transaction_id",
+        "created_at",
+    ]
+    query = (
+        db.session.query(
+            *[
+                SavingMovement.amount_cents.label("amount")
+                if f == "amount"
+                else getattr(SavingMovement, f)
+                for f in fields
+            ]
+        )
+        .join(SavingBox, SavingMovement.box_id == SavingBox.id)
+        .filter(SavingBox.user_id == user_id)
+        .order_by(SavingMovement.date, SavingMovement.id)
+    )
+    return fields, query
+
+
+EXPORT_ENTITIES = {
+    "transactions": _export_transactions,
+    "installments": _export_installments,
+    "movements": _export_movements,
+}
+
+
+def _stream_rows(query):
+    """Itera com cursor do lado do servidor, em lotes de EXPORT_BATCH_SIZE."""
+    return query.execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+
+def _iter_ndjson(user_id, entities):
+    for entity in entities:
+        fields, query = EXPORT_ENTITIES[entity](user_id)
+        for row in _stream_rows(query):
+            mapping = row._mapping
+            record = {"record": entity}
+            record.update({f: _export_value(f, mapping[f]) for f in fields})
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def _iter_csv(user_id, entity):
+    fields, query = EXPORT_ENTITIES[entity](user_id)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(fields)
+    for row in _stream_rows(query):
+        mapping = row._mapping
+        writer.writerow([_export_value(f, mapping[f]) for f in fields])
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    yield buffer.getvalue()
+
+
+@api.route("/export", methods=["GET"])
+def export_ledger():
+    """
+    Exporta os dados do usuário em streaming (memória constante):
+
+      /api/export                                  -> NDJSON com tudo
+      /api/export?format=ndjson&entity=movements   -> NDJSON só das caixinhas
+      /api/export?format=csv&entity=transactions   -> CSV (uma entidade por arquivo)
+
+    entity: transactions | installments | movements
+    """
+    user_id, error_resp, status = _require_user()
+    if error_resp:
+        return error_resp, status
+
+    fmt = (request.args.get("format") or "ndjson").lower()
+    entity = request.args.get("entity")
+
+    if entity is not None and entity not in EXPORT_ENTITIES:
+        return jsonify(
+            {"error": "Entidade inválida. Use transactions, installments ou movements."}
+        ), 400
+
+    if fmt == "ndjson":
+        entities = [entity] if entity else list(EXPORT_ENTITIES)
+        body = _iter_ndjson(user_id, entities)
+        mimetype = "application/x-ndjson"
+        filename = f"solvix-{entity or 'export'}.ndjson"
+    elif fmt == "csv":
+        entity = entity or "transactions"
+        body = _iter_csv(user_id, entity)
+        mimetype = "text/csv"
+        filename = f"solvix-{entity}.csv"
+    else:
+        return jsonify({"error": "Formato inválido. Use 'ndjson' ou 'csv'."}), 400
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
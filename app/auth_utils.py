@@ -1,32 +1,250 @@
 # app/auth_utils.py
+import base64
+import hashlib
+import hmac
 import json
 import os
-import hashlib
+import secrets
+import threading
 
 # Caminho para o users.json dentro da pasta app
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 USERS_FILE = os.path.join(BASE_DIR, "users.json")
 
+_NOT_LOADED = object()
+
+
+class JsonUserStore:
+    """
+    Usuários do users.json, indexados em memória por username e por id.
+
+    O arquivo só é relido quando o mtime muda; entre uma alteração e outra,
+    cada login custa um os.stat() + uma busca em dict.
+
+    Somente leitura: o users.json é versionado junto com o código, então o
+    app não o regrava (nem no rehash de senhas).
+    """
+
+    def __init__(self, path: str = USERS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = _NOT_LOADED
+        self._users = []
+        self._by_username = {}
+        self._by_id = {}
+
+    def _current_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _ensure_loaded(self):
+        mtime = self._current_mtime()
+        if mtime == self._mtime:
+            return
+
+        with self._lock:
+            if mtime == self._mtime:
+                return
+
+            if mtime is None:
+                users = []
+            else:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    users = json.load(f)
+
+            self._users = users
+            self._by_username = {u.get("username"): u for u in users}
+            self._by_id = {u.get("id"): u for u in users}
+            self._mtime = mtime
+
+    def all(self):
+        self._ensure_loaded()
+        return list(self._users)
+
+    def by_username(self, username: str):
+        self._ensure_loaded()
+        return self._by_username.get(username)
+
+    def by_id(self, user_id):
+        self._ensure_loaded()
+        return self._by_id.get(user_id)
+
+
+class DatabaseUserStore:
+    """Usuários na tabela `users` (mesmo banco dos modelos em app/models.py)."""
+
+    def all(self):
+        from .models import User
+
+        return [u.to_dict() for u in User.query.order_by(User.id).all()]
+
+    def by_username(self, username: str):
+        from .models import User
+
+        user = User.query.filter_by(username=username).first()
+        return user.to_dict() if user else None
+
+    def by_id(self, user_id):
+        from . import db
+        from .models import User
+
+        user = db.session.get(User, user_id)
+        return user.to_dict() if user else None
+
+    def update_password_hash(self, user_id, password_hash: str):
+        from . import db
+        from .models import User
+
+        db.session.query(User).filter(User.id == user_id).update(
+            {"password_hash": password_hash}
+        )
+        db.session.commit()
+
+
+_json_store = JsonUserStore()
+_database_store = DatabaseUserStore()
+
+
+def get_user_store():
+    """
+    Store configurado em SOLVIX_USER_STORE:
+      - 'json' (padrão): app/users.json, com índice em memória;
+      - 'db': tabela users (importe com `flask --app run import-users`).
+    """
+    from flask import current_app, has_app_context
+
+    backend = os.getenv("SOLVIX_USER_STORE", "json")
+    if has_app_context():
+        backend = current_app.config.get("SOLVIX_USER_STORE", backend)
+    return _database_store if backend == "db" else _json_store
+
 
 def load_users():
-    """Carrega todos os usuários do users.json."""
-    if not os.path.exists(USERS_FILE):
-        return []
-    with open(USERS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    """Carrega todos os usuários do store configurado."""
+    return get_user_store().all()
 
 
 def find_user_by_username(username: str):
     """Retorna o dicionário do usuário dado um username, ou None se não achar."""
-    users = load_users()
-    for user in users:
-        if user.get("username") == username:
-            return user
-    return None
+    return get_user_store().by_username(username)
+
+
+def find_user_by_id(user_id):
+    """Retorna o dicionário do usuário dado o id, ou None se não achar."""
+    return get_user_store().by_id(user_id)
+
+
+# -------------------------------------------------------------------
+# Hash de senhas
+# -------------------------------------------------------------------
+#
+# Formatos aceitos no campo password_hash:
+#   scrypt$<log2 N>$<r>$<p>$<salt>$<hash>        (padrão)
+#   pbkdf2_sha256$<iterações>$<salt>$<hash>
+#   <64 hex>                                     (legado: SHA-256 sem salt)
+#
+# O custo é configurável por ambiente, para caber no orçamento de CPU dos
+# workers do gunicorn (meça com benchmarks/bench_password_hashing.py):
+#   SOLVIX_PASSWORD_SCHEME  scrypt | pbkdf2_sha256
+#   SOLVIX_PASSWORD_COST    scrypt: log2 de N (padrão 14)
+#                           pbkdf2_sha256: iterações (padrão 600000)
+#
+# Com SOLVIX_USER_STORE=db, hashes legados ou com custo diferente do
+# configurado são refeitos no próximo login bem-sucedido
+# (rehash_password_if_needed). O users.json não é regravado.
+
+DEFAULT_SCHEME = "scrypt"
+DEFAULT_COSTS = {
+    "scrypt": 14,
+    "pbkdf2_sha256": 600_000,
+}
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def password_settings():
+    """(scheme, cost) configurados no ambiente."""
+    scheme = os.getenv("SOLVIX_PASSWORD_SCHEME", DEFAULT_SCHEME)
+    if scheme not in DEFAULT_COSTS:
+        scheme = DEFAULT_SCHEME
+    cost = int(os.getenv("SOLVIX_PASSWORD_COST", DEFAULT_COSTS[scheme]))
+    return scheme, cost
+
+
+def _scrypt(plain: str, salt: bytes, log2_n: int, r: int, p: int) -> bytes:
+    n = 1 << log2_n
+    return hashlib.scrypt(
+        plain.encode("utf-8"),
+        salt=salt,
+        n=n,
+        r=r,
+        p=p,
+        maxmem=128 * r * (n + p + 2) + 1024 * 1024,
+        dklen=32,
+    )
+
+
+def _pbkdf2(plain: str, salt: bytes, iterations: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", plain.encode("utf-8"), salt, iterations)
+
+
+def make_password_hash(plain_password: str, scheme: str = None, cost: int = None) -> str:
+    """Gera o hash (com salt) de uma senha no esquema/custo configurado."""
+    default_scheme, default_cost = password_settings()
+    scheme = scheme or default_scheme
+    if cost is None:
+        cost = default_cost if scheme == default_scheme else DEFAULT_COSTS[scheme]
+
+    salt = secrets.token_bytes(16)
+    if scheme == "scrypt":
+        digest = _scrypt(plain_password, salt, cost, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${cost}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+    if scheme == "pbkdf2_sha256":
+        digest = _pbkdf2(plain_password, salt, cost)
+        return f"pbkdf2_sha256${cost}${_b64(salt)}${_b64(digest)}"
+    raise ValueError(f"Esquema de hash desconhecido: {scheme}")
+
+
+def verify_password_hash(password_hash: str, plain_password: str) -> bool:
+    """Confere a senha contra qualquer um dos formatos suportados."""
+    try:
+        if password_hash.startswith("scrypt$"):
+            _, log2_n, r, p, salt, digest = password_hash.split("$")
+            computed = _scrypt(plain_password, _unb64(salt), int(log2_n), int(r), int(p))
+            return hmac.compare_digest(computed, _unb64(digest))
+
+        if password_hash.startswith("pbkdf2_sha256$"):
+            _, iterations, salt, digest = password_hash.split("$")
+            computed = _pbkdf2(plain_password, _unb64(salt), int(iterations))
+            return hmac.compare_digest(computed, _unb64(digest))
+    except (ValueError, TypeError):
+        return False
+
+    # legado: SHA-256 em hex, sem salt
+    computed_hash = hashlib.sha256(plain_password.encode("utf-8")).hexdigest()
+    return hmac.compare_digest(computed_hash, password_hash)
+
+
+def password_needs_rehash(password_hash: str) -> bool:
+    """True se o hash for legado ou não usar o esquema/custo configurado."""
+    scheme, cost = password_settings()
+    if scheme == "scrypt":
+        return not password_hash.startswith(f"scrypt${cost}${SCRYPT_R}${SCRYPT_P}$")
+    return not password_hash.startswith(f"{scheme}${cost}$")
 
 
 def check_password(user, plain_password: str) -> bool:
-    """Verifica se a senha em texto corresponde ao hash salvo no users.json."""
+    """Verifica se a senha em texto corresponde ao hash salvo do usuário."""
     if not user:
         return False
 
@@ -34,10 +252,27 @@ def check_password(user, plain_password: str) -> bool:
     if not password_hash:
         return False
 
-    computed_hash = hashlib.sha256(plain_password.encode("utf-8")).hexdigest()
-    return computed_hash == password_hash
+    return verify_password_hash(password_hash, plain_password)
 
 
-def make_password_hash(plain_password: str) -> str:
-    """Helper opcional para gerar hash de novas senhas."""
-    return hashlib.sha256(plain_password.encode("utf-8")).hexdigest()
+def rehash_password_if_needed(user, plain_password: str) -> bool:
+    """
+    Depois de um login bem-sucedido, refaz o hash se ele for legado ou de
+    outro custo. Só grava no store do banco; com o users.json não faz nada.
+    Falhas ao gravar não impedem o login. Retorna True se o hash foi
+    atualizado.
+    """
+    store = get_user_store()
+    if not isinstance(store, DatabaseUserStore):
+        return False
+    if not password_needs_rehash(user.get("password_hash") or ""):
+        return False
+
+    try:
+        store.update_password_hash(
+            user.get("id"), make_password_hash(plain_password)
+        )
+        return True
+    except Exception as e:
+        print(f"[ERRO] rehash_password_if_needed: {e}")
+        return False
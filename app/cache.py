@@ -0,0 +1,227 @@
+# app/cache.py
+"""
+Cache de resultados por usuário (fatura, parcelas futuras, caixinhas, resumo).
+
+Os resultados só mudam quando o próprio usuário escreve algo, então cada
+chave leva a versão dos dados do usuário no banco (user_data_versions, a
+mesma do ETag). Toda escrita faz bump_data_version na própria transação:
+depois do commit, qualquer processo (outro worker do gunicorn, o
+worker.py) passa a montar chaves novas e as entradas antigas ficam
+inalcançáveis (saem por LRU/TTL). `cache.invalidate_user(user_id)` só
+libera a memória local mais cedo; não é necessário para a consistência.
+
+Backends:
+  - memória (padrão): LRU dentro do processo (cada worker tem o seu);
+  - Redis (ou compatível): SOLVIX_CACHE_URL=redis://localhost:6379/0
+    (requer o pacote `redis`; compartilhado entre workers do gunicorn).
+
+Configuração por ambiente:
+  SOLVIX_CACHE_URL   memory:// (padrão) | redis://... | none:// (desliga)
+  SOLVIX_CACHE_SIZE  máximo de entradas no LRU em memória (padrão 2048)
+  SOLVIX_CACHE_TTL   validade das entradas em segundos (padrão 300)
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, has_app_context
+
+
+class MemoryBackend:
+    """LRU simples em memória, protegido por lock (threads do servidor)."""
+
+    name = "memory"
+
+    def __init__(self, maxsize: int = 2048):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def forget_user(self, user_id):
+        # as entradas antigas desse usuário já não servem: libera espaço
+        prefix = f"u:{user_id}:"
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def size(self) -> int:
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisBackend:
+    """Backend Redis/compatível. Valores guardados como JSON."""
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        import redis  # dependência opcional
+
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._client.get(f"solvix:cache:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self._client.set(f"solvix:cache:{key}", json.dumps(value), ex=ttl or None)
+
+    def forget_user(self, user_id):
+        # versões antigas ficam inalcançáveis e expiram pelo TTL
+        pass
+
+    def size(self) -> int:
+        return None
+
+    def clear(self):
+        for key in self._client.scan_iter("solvix:*"):
+            self._client.delete(key)
+
+
+def _data_version(user_id) -> int:
+    """
+    Versão dos dados do usuário usada nas chaves: a fixada pelo request (a
+    mesma do ETag, ver ResultCache.pin_version) ou a atual do banco.
+    """
+    pinned = g.get("cache_versions") if has_app_context() else None
+    if pinned and user_id in pinned:
+        return pinned[user_id]
+
+    # import tardio: versioning importa os models
+    from .versioning import get_data_version
+
+    return get_data_version(user_id)[0]
+
+
+class ResultCache:
+    """Fachada usada pelas rotas, com contadores de acertos/erros."""
+
+    def __init__(self):
+        self.backend = None
+        self.ttl = 300
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        url = app.config.get("SOLVIX_CACHE_URL") or os.getenv(
+            "SOLVIX_CACHE_URL", "memory://"
+        )
+        self.ttl = int(app.config.get("SOLVIX_CACHE_TTL") or os.getenv("SOLVIX_CACHE_TTL", 300))
+        maxsize = int(app.config.get("SOLVIX_CACHE_SIZE") or os.getenv("SOLVIX_CACHE_SIZE", 2048))
+
+        if url.startswith("none:"):
+            self.backend = None
+        elif url.startswith(("redis://", "rediss://", "unix://")):
+            try:
+                self.backend = RedisBackend(url)
+            except ImportError:
+                print("[AVISO] cache: pacote 'redis' não instalado, usando memória.")
+                self.backend = MemoryBackend(maxsize)
+        else:
+            self.backend = MemoryBackend(maxsize)
+
+    def _count(self, attr):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def get_or_compute(self, user_id, name: str, compute, *parts):
+        """
+        Retorna o valor em cache para (usuário, nome, partes) ou calcula,
+        guarda e retorna. O valor precisa ser serializável em JSON.
+        """
+        if self.backend is None:
+            return compute()
+
+        try:
+            version = _data_version(user_id)
+            key = ":".join(
+                [f"u:{user_id}", f"v{version}", name, *[str(p) for p in parts]]
+            )
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"[ERRO] cache.get: {e}")
+            self._count("errors")
+            return compute()
+
+        if value is not None:
+            self._count("hits")
+            return value
+
+        self._count("misses")
+        value = compute()
+        try:
+            self.backend.set(key, value, ttl=self.ttl)
+        except Exception as e:
+            print(f"[ERRO] cache.set: {e}")
+            self._count("errors")
+        return value
+
+    def pin_version(self, user_id, version: int):
+        """
+        Usa `version` nas chaves do usuário até o fim do request. O
+        conditional_get fixa a versão com que montou o ETag, assim corpo e
+        ETag saem sempre da mesma versão. Como a versão é lida antes do
+        cálculo, o corpo nunca é mais velho que o ETag; se uma escrita
+        chegar no meio, o próximo GET já recebe outro ETag.
+        """
+        if has_app_context():
+            g.setdefault("cache_versions", {})[user_id] = version
+
+    def unpin_version(self, user_id):
+        """Volta a ler a versão do banco (chamado por bump_data_version)."""
+        if has_app_context():
+            g.get("cache_versions", {}).pop(user_id, None)
+
+    def invalidate_user(self, user_id):
+        """
+        Descarta o que estiver em cache para o usuário neste processo
+        (nos demais, a versão nova no banco já torna as entradas inválidas).
+        """
+        if self.backend is None:
+            return
+        try:
+            self.backend.forget_user(user_id)
+        except Exception as e:
+            print(f"[ERRO] cache.invalidate_user: {e}")
+            self._count("errors")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": self.backend.name if self.backend else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": (self.hits / total) if total else None,
+            "size": self.backend.size() if self.backend else 0,
+        }
+
+
+cache = ResultCache()
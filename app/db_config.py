@@ -0,0 +1,158 @@
+# app/db_config.py
+"""
+Configuração do engine do SQLAlchemy a partir de variáveis de ambiente.
+
+Postgres (DATABASE_URL):
+  SOLVIX_DB_POOL_SIZE          conexões fixas por worker (padrão 5)
+  SOLVIX_DB_MAX_OVERFLOW       conexões extras em pico (padrão 10)
+  SOLVIX_DB_POOL_TIMEOUT       segundos esperando uma conexão livre (padrão 30)
+  SOLVIX_DB_POOL_RECYCLE       recicla conexões após N segundos (padrão 1800)
+  SOLVIX_DB_POOL_PRE_PING      testa a conexão antes de usar (padrão 1)
+  SOLVIX_DB_STATEMENT_TIMEOUT  statement_timeout em ms (padrão: sem limite)
+  SOLVIX_DB_NULLPOOL           1 = sem pool no app (pgbouncer faz o pooling)
+
+SQLite (fallback local):
+  SOLVIX_SQLITE_JOURNAL_MODE   padrão WAL
+  SOLVIX_SQLITE_SYNCHRONOUS    padrão NORMAL
+  SOLVIX_SQLITE_BUSY_TIMEOUT   ms esperando lock de escrita (padrão 5000)
+
+O tempo de espera no checkout do pool é medido em `pool_stats`.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+def _env_int(name: str, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "sim", "on")
+
+
+class PoolWaitStats:
+    """Tempo de espera para obter conexão do pool (por processo)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+        self.pool = None
+
+    def record(self, wait: float):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        data = {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "total_wait_seconds": round(self.total_wait, 6),
+            "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3)
+            if self.checkouts
+            else None,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+        pool = self.pool
+        if isinstance(pool, QueuePool):
+            data.update(
+                {
+                    "pool_size": pool.size(),
+                    "checked_out": pool.checkedout(),
+                    "checked_in": pool.checkedin(),
+                    "overflow": pool.overflow(),
+                }
+            )
+        return data
+
+
+pool_stats = PoolWaitStats()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool que mede quanto tempo cada checkout esperou."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        pool_stats.pool = self
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            pool_stats.record_timeout()
+            raise
+        pool_stats.record(time.perf_counter() - start)
+        return conn
+
+
+def engine_options(db_url: str) -> dict:
+    """Monta SQLALCHEMY_ENGINE_OPTIONS conforme o banco e o ambiente."""
+    if db_url.startswith("sqlite"):
+        return {}
+
+    options = {
+        "pool_pre_ping": _env_bool("SOLVIX_DB_POOL_PRE_PING", True),
+    }
+
+    if _env_bool("SOLVIX_DB_NULLPOOL", False):
+        options["poolclass"] = NullPool
+        return options
+
+    options.update(
+        {
+            "poolclass": TimedQueuePool,
+            "pool_size": _env_int("SOLVIX_DB_POOL_SIZE", 5),
+            "max_overflow": _env_int("SOLVIX_DB_MAX_OVERFLOW", 10),
+            "pool_timeout": _env_int("SOLVIX_DB_POOL_TIMEOUT", 30),
+            "pool_recycle": _env_int("SOLVIX_DB_POOL_RECYCLE", 1800),
+        }
+    )
+    return options
+
+
+def install_connection_hooks(engine):
+    """Pragmas do SQLite / statement_timeout do Postgres em cada conexão nova."""
+    dialect = engine.dialect.name
+
+    if dialect == "sqlite":
+        journal_mode = os.getenv("SOLVIX_SQLITE_JOURNAL_MODE", "WAL")
+        synchronous = os.getenv("SOLVIX_SQLITE_SYNCHRONOUS", "NORMAL")
+        busy_timeout = _env_int("SOLVIX_SQLITE_BUSY_TIMEOUT", 5000)
+
+        @event.listens_for(engine, "connect")
+        def _sqlite_pragmas(dbapi_conn, _record):
+            cursor = dbapi_conn.cursor()
+            cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+            cursor.execute(f"PRAGMA synchronous={synchronous}")
+            cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+            cursor.close()
+
+    elif dialect == "postgresql":
+        statement_timeout = _env_int("SOLVIX_DB_STATEMENT_TIMEOUT", None)
+        if statement_timeout is None:
+            return
+
+        @event.listens_for(engine, "connect")
+        def _pg_statement_timeout(dbapi_conn, _record):
+            cursor = dbapi_conn.cursor()
+            cursor.execute(f"SET statement_timeout = {int(statement_timeout)}")
+            cursor.close()
+            dbapi_conn.commit()
@@ -0,0 +1,133 @@
+# app/forecast.py
+"""
+Projeção de fluxo de caixa mês a mês (12 a 36 meses).
+
+As consultas ficam em api.compute_forecast, que entrega só agregados:
+
+- linha de base: média mensal de entradas e de gastos por categoria nos
+  últimos meses completos (sem parcelados, assinaturas e pagamentos de
+  fatura, que entram pelas fontes abaixo);
+- lançamentos agendados já somados por (fonte, categoria, mês): parcelas
+  não pagas, próximas cobranças de assinatura e a fatura aberta do mês.
+
+Aqui tudo vira um vetor por categoria com uma posição por mês, e a conta
+é feita vetor a vetor (soma, acumulado), sem voltar às linhas do
+histórico. O mês 0 é o mês corrente: a linha de base entra só na fração
+de dias que ainda falta.
+"""
+from itertools import accumulate
+
+from .money import from_cents
+
+# meses completos usados na média da linha de base
+BASELINE_MONTHS = 6
+
+
+def month_index(start, d) -> int:
+    """Posição do mês de `d` no vetor que começa no mês de `start`."""
+    return (d.year - start.year) * 12 + (d.month - start.month)
+
+
+def _constant(value: int, months: int, first_fraction: float) -> list:
+    """Vetor [valor] * meses, com o mês 0 proporcional aos dias restantes."""
+    vector = [value] * months
+    if months:
+        vector[0] = round(value * first_fraction)
+    return vector
+
+
+def _add(a: list, b: list) -> list:
+    return [x + y for x, y in zip(a, b)]
+
+
+def _sub(a: list, b: list) -> list:
+    return [x - y for x, y in zip(a, b)]
+
+
+def _column_sums(vectors, months: int) -> list:
+    vectors = list(vectors)
+    if not vectors:
+        return [0] * months
+    return [sum(column) for column in zip(*vectors)]
+
+
+def build_forecast(start, months: int, start_balance_cents: int,
+                   baseline_income_cents: int, baseline_expenses: dict,
+                   scheduled, first_fraction: float = 1.0,
+                   baseline_months: int = BASELINE_MONTHS) -> dict:
+    """
+    start: primeiro dia do mês corrente (mês 0).
+    baseline_expenses: {categoria: média mensal em centavos}, calculada
+      sobre `baseline_months` meses.
+    scheduled: iterável de (fonte, categoria, índice_do_mês, centavos),
+      com índices fora de [0, months) ignorados.
+    """
+    by_source = {
+        "baseline": {
+            cat: _constant(cents, months, first_fraction)
+            for cat, cents in baseline_expenses.items()
+        }
+    }
+    for source, categoria, idx, cents in scheduled:
+        if not 0 <= idx < months:
+            continue
+        vectors = by_source.setdefault(source, {})
+        vector = vectors.get(categoria)
+        if vector is None:
+            vector = vectors[categoria] = [0] * months
+        vector[idx] += cents
+
+    # vetores por categoria (todas as fontes) e por fonte (todas as categorias)
+    by_category = {}
+    for vectors in by_source.values():
+        for cat, vector in vectors.items():
+            current = by_category.get(cat)
+            by_category[cat] = vector if current is None else _add(current, vector)
+    source_totals = {
+        source: _column_sums(vectors.values(), months)
+        for source, vectors in by_source.items()
+    }
+
+    income = _constant(baseline_income_cents, months, first_fraction)
+    expenses = _column_sums(by_category.values(), months)
+    net = _sub(income, expenses)
+    balance = list(accumulate(net, initial=start_balance_cents))[1:]
+
+    result = []
+    for i in range(months):
+        month_number = start.month - 1 + i
+        result.append(
+            {
+                "year": start.year + month_number // 12,
+                "month": month_number % 12 + 1,
+                "income": from_cents(income[i]),
+                "expenses": from_cents(expenses[i]),
+                "net": from_cents(net[i]),
+                "balance": from_cents(balance[i]),
+                "breakdown": {
+                    source: from_cents(totals[i])
+                    for source, totals in source_totals.items()
+                },
+                "expenses_by_category": {
+                    cat: from_cents(vector[i])
+                    for cat, vector in sorted(by_category.items())
+                    if vector[i]
+                },
+            }
+        )
+
+    return {
+        "start_balance": from_cents(start_balance_cents),
+        "baseline": {
+            "months": baseline_months,
+            "income": from_cents(baseline_income_cents),
+            "expenses_by_category": {
+                cat: from_cents(cents)
+                for cat, cents in sorted(
+                    baseline_expenses.items(), key=lambda item: item[1], reverse=True
+                )
+            },
+        },
+        "months": result,
+        "end_balance": from_cents(balance[-1]) if balance else from_cents(start_balance_cents),
+    }
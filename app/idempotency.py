@@ -0,0 +1,107 @@
+# app/idempotency.py
+"""
+Suporte ao header Idempotency-Key nas rotas de escrita.
+
+O decorator `idempotent` (api.py) usa estas funções assim:
+
+1. Se já existe resposta guardada para (usuário, chave), devolve a mesma
+   resposta (replay), sem rodar a rota de novo.
+2. Senão, adiciona a chave na sessão ANTES de rodar a rota: ela é gravada
+   no mesmo commit da escrita. Se a rota der rollback, a chave some junto
+   e a retentativa roda normalmente; se duas requisições com a mesma chave
+   correrem juntas, a segunda falha no commit (chave primária) e recebe o
+   replay/409 da primeira.
+3. Depois que a rota responde, a resposta é guardada na linha.
+
+Se guardar a resposta falhar depois que a rota já deu commit, a chave fica
+"em andamento" (status_code nulo). Uma reserva assim mais velha que
+PENDING_TIMEOUT é tratada como abandonada: a retentativa roda de novo, em
+vez de receber 409 até a chave expirar.
+
+As linhas expiram após IDEMPOTENCY_TTL e são apagadas em lote, no máximo
+uma vez a cada EVICTION_INTERVAL por processo.
+"""
+import hashlib
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+
+from . import db
+from .models import IdempotencyKey
+
+IDEMPOTENCY_TTL = timedelta(hours=24)
+# reserva sem resposta depois disso: a requisição original morreu/falhou
+PENDING_TIMEOUT = timedelta(minutes=2)
+EVICTION_INTERVAL = 600  # segundos
+MAX_KEY_LENGTH = 100
+
+_last_eviction = None
+
+
+def request_fingerprint(method: str, path: str, body: bytes) -> str:
+    digest = hashlib.sha256()
+    digest.update(method.encode("utf-8"))
+    digest.update(b" ")
+    digest.update(path.encode("utf-8"))
+    digest.update(b"\n")
+    digest.update(body or b"")
+    return digest.hexdigest()
+
+
+def lookup(user_id, key: str):
+    """Linha ainda válida para (usuário, chave), ou None."""
+    row = db.session.get(IdempotencyKey, (user_id, key), populate_existing=True)
+    if row is None:
+        return None
+    now = datetime.utcnow()
+    expired = row.created_at < now - IDEMPOTENCY_TTL
+    abandoned = row.status_code is None and row.created_at < now - PENDING_TIMEOUT
+    if expired or abandoned:
+        # libera a chave para reuso
+        db.session.delete(row)
+        db.session.flush()
+        return None
+    return row
+
+
+def reserve(user_id, key: str, fingerprint: str):
+    """Adiciona a chave (ainda sem resposta) na transação corrente."""
+    row = IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        fingerprint=fingerprint,
+        created_at=datetime.utcnow(),
+    )
+    db.session.add(row)
+    return row
+
+
+def store_response(user_id, key: str, fingerprint: str, status_code: int, body: str):
+    """Guarda a resposta da requisição original (sem commit)."""
+    row = db.session.get(IdempotencyKey, (user_id, key))
+    if row is None:
+        row = reserve(user_id, key, fingerprint)
+    row.status_code = status_code
+    row.response = body
+    maybe_evict()
+
+
+def evict_expired(now=None) -> int:
+    """Apaga as chaves mais velhas que o TTL (sem commit)."""
+    now = now or datetime.utcnow()
+    result = db.session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.created_at < now - IDEMPOTENCY_TTL),
+        execution_options={"synchronize_session": False},
+    )
+    return result.rowcount
+
+
+def maybe_evict():
+    """evict_expired no máximo uma vez a cada EVICTION_INTERVAL."""
+    global _last_eviction
+    now = time.monotonic()
+    if _last_eviction is not None and now - _last_eviction < EVICTION_INTERVAL:
+        return
+    _last_eviction = now
+    evict_expired()
@@ -0,0 +1,128 @@
+# app/importers.py
+"""
+Leitores de arquivos para a importação em lote de transações.
+
+Cada leitor recebe um stream binário (upload ou corpo da requisição) e
+devolve, linha a linha, tuplas (numero_da_linha, dict) com as mesmas chaves
+aceitas pelo POST /api/transactions. Nada é carregado inteiro em memória.
+"""
+import csv
+import itertools
+import re
+from decimal import Decimal, InvalidOperation
+
+
+class ImportFormatError(ValueError):
+    """Arquivo em formato que não conseguimos ler (cabeçalho, estrutura...)."""
+
+
+def _decode_line(raw: bytes) -> str:
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        # extratos de bancos brasileiros costumam vir em Windows-1252
+        return raw.decode("cp1252", errors="replace")
+
+
+def _iter_text_lines(stream):
+    """Linhas do stream binário já decodificadas (sem o BOM do UTF-8)."""
+    for index, raw in enumerate(stream):
+        line = _decode_line(raw)
+        yield line.lstrip("\ufeff") if index == 0 else line
+
+
+# -------------------------------------------------------------------
+# CSV
+# -------------------------------------------------------------------
+
+
+def iter_csv_rows(stream):
+    """
+    Lê um CSV com cabeçalho. Aceita ',' ou ';' como separador
+    (detectado pela primeira linha) e UTF-8 ou Windows-1252 (linha a linha).
+    """
+    text = _iter_text_lines(stream)
+
+    header = next(text, "")
+    if not header.strip():
+        raise ImportFormatError("Arquivo CSV vazio ou sem cabeçalho.")
+
+    delimiter = ";" if header.count(";") > header.count(",") else ","
+    reader = csv.DictReader(itertools.chain([header], text), delimiter=delimiter)
+
+    if "tipo" not in (reader.fieldnames or []):
+        raise ImportFormatError("Cabeçalho do CSV deve conter ao menos 'tipo', 'valor', 'categoria' e 'data'.")
+
+    for row in reader:
+        cleaned = {
+            (k or "").strip(): (v.strip() if isinstance(v, str) else v)
+            for k, v in row.items()
+        }
+        yield reader.line_num, cleaned
+
+
+# -------------------------------------------------------------------
+# OFX (SGML 1.x ou XML 2.x)
+# -------------------------------------------------------------------
+
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)")
+
+
+def _ofx_to_payload(fields: dict, credit_card: bool) -> dict:
+    amount_str = (fields.get("TRNAMT") or "").replace(",", ".")
+    try:
+        # Decimal (e não float) para o valor chegar exato em centavos
+        amount = Decimal(amount_str)
+    except InvalidOperation:
+        amount = None
+
+    posted = fields.get("DTPOSTED") or ""
+    data = f"{posted[0:4]}-{posted[4:6]}-{posted[6:8]}" if len(posted) >= 8 else None
+
+    descricao = (fields.get("NAME") or fields.get("MEMO") or "").strip()[:150]
+    is_income = amount is not None and amount > 0
+
+    return {
+        "tipo": "income" if is_income else "expense",
+        "valor": str(abs(amount)) if amount is not None else fields.get("TRNAMT"),
+        "categoria": "Outros",
+        "descricao": descricao or None,
+        "data": data,
+        "meio_pagamento": None if is_income else ("credit" if credit_card else "debit"),
+    }
+
+
+def iter_ofx_rows(stream):
+    """Lê os blocos <STMTTRN> de um extrato OFX, um de cada vez."""
+    current = None
+    credit_card = False
+    count = 0
+    seen_ofx = False
+
+    for raw in stream:
+        line = _decode_line(raw)
+        for closing, tag, value in _OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == "OFX":
+                seen_ofx = True
+            elif tag == "CCSTMTRS" and not closing:
+                credit_card = True
+            elif tag == "STMTTRN":
+                if closing:
+                    if current is not None:
+                        count += 1
+                        yield count, _ofx_to_payload(current, credit_card)
+                    current = None
+                else:
+                    current = {}
+            elif current is not None and not closing and value.strip():
+                current[tag] = value.strip()
+
+    if not seen_ofx:
+        raise ImportFormatError("Arquivo OFX inválido (tag <OFX> não encontrada).")
+
+
+READERS = {
+    "csv": iter_csv_rows,
+    "ofx": iter_ofx_rows,
+}
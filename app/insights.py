@@ -0,0 +1,280 @@
+# app/insights.py
+"""
+Motor de sugestões de economia (antes calculado no app.js).
+
+As estatísticas por categoria saem do resumo mensal materializado
+(monthly_rollup), que já é atualizado a cada escrita. Aqui só lemos uma
+janela fixa de meses (WINDOW_MONTHS completos + o mês corrente), então o
+custo depende do número de categorias, não do tamanho do histórico:
+
+- média móvel e desvio padrão do gasto mensal de cada categoria;
+- variação do último mês completo contra o anterior;
+- outlier: o mês corrente já passou de média + OUTLIER_Z desvios.
+
+As sugestões são pontuadas pelo impacto (em proporção da renda mensal
+média) e devolvidas em ordem. O resultado fica no cache de resultados
+(invalidado a cada escrita do usuário).
+"""
+from datetime import date
+from math import sqrt
+
+from . import rollup
+from .models import SAVING_DEPOSIT_CATEGORY, SAVING_WITHDRAW_CATEGORY
+from .money import from_cents
+
+WINDOW_MONTHS = 6
+OUTLIER_Z = 2.0
+MAX_SUGGESTIONS = 5
+
+# variação mínima (mês contra mês) para virar sugestão
+MOM_MIN_RATIO = 0.25
+MOM_MIN_CENTS = 5_000
+
+# categorias que não são consumo (não entram nas médias de gasto): a fatura
+# já foi contada compra a compra e o depósito em caixinha é dinheiro guardado
+NON_SPENDING_CATEGORIES = {"Pagamento de Fatura", SAVING_DEPOSIT_CATEGORY}
+
+# entradas que não são renda (resgate de caixinha volta dinheiro já contado)
+NON_INCOME_CATEGORIES = {SAVING_WITHDRAW_CATEGORY}
+
+# ordem de exibição por tipo (mesmas classes CSS do front)
+TYPE_PRIORITY = {"warning": 0, "info": 1, "success": 2}
+
+
+def _brl(cents: int) -> str:
+    """Centavos -> 'R$ 1.234,56' (texto das sugestões)."""
+    text = f"{abs(cents) / 100:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    return f"-R$ {text}" if cents < 0 else f"R$ {text}"
+
+
+def _shift_month(year: int, month: int, delta: int):
+    index = year * 12 + (month - 1) + delta
+    return index // 12, index % 12 + 1
+
+
+def category_stats(user_id, today: date | None = None) -> dict:
+    """
+    Estatísticas da janela de meses a partir do monthly_rollup.
+
+    Retorna {"months": n, "income_mean": c, "spending_mean": c,
+    "categories": [...]}, com valores em centavos.
+    """
+    today = today or date.today()
+    months = [_shift_month(today.year, today.month, -i) for i in range(WINDOW_MONTHS, 0, -1)]
+    window_start = date(*months[0], 1)
+
+    current_key = (today.year, today.month)
+    income = {}
+    spending = {}
+    by_category = {}
+    first_period = None
+
+    for g in rollup.summary_groups(user_id, window_start):
+        key = (int(g.year), int(g.month))
+        total = int(g.total or 0)
+        if first_period is None or key < first_period:
+            first_period = key
+        if g.tipo == "income" and g.categoria not in NON_INCOME_CATEGORIES:
+            income[key] = income.get(key, 0) + total
+        elif g.tipo == "expense" and g.categoria not in NON_SPENDING_CATEGORIES:
+            spending[key] = spending.get(key, 0) + total
+            per_month = by_category.setdefault(g.categoria, {})
+            per_month[key] = per_month.get(key, 0) + total
+
+    # só conta os meses completos desde o primeiro lançamento da janela
+    if first_period is not None and first_period < current_key:
+        months = [m for m in months if m >= first_period]
+    else:
+        months = []
+    n = len(months)
+
+    def mean(values: dict) -> int:
+        return round(sum(values.get(m, 0) for m in months) / n) if n else 0
+
+    categories = []
+    for categoria, per_month in by_category.items():
+        series = [per_month.get(m, 0) for m in months]
+        avg = sum(series) / n if n else 0
+        stdev = sqrt(sum((v - avg) ** 2 for v in series) / n) if n else 0
+        last = series[-1] if n >= 1 else 0
+        previous = series[-2] if n >= 2 else 0
+        current = per_month.get(current_key, 0)
+        categories.append(
+            {
+                "categoria": categoria,
+                "mean": round(avg),
+                "stdev": round(stdev),
+                "last_month": last,
+                "previous_month": previous,
+                "mom_delta": last - previous,
+                "current_month": current,
+                "outlier": bool(n >= 3 and avg and current > avg + OUTLIER_Z * stdev),
+            }
+        )
+    categories.sort(key=lambda c: (c["mean"], c["current_month"]), reverse=True)
+
+    return {
+        "months": n,
+        "income_mean": mean(income),
+        "spending_mean": mean(spending),
+        "categories": categories,
+    }
+
+
+def _suggestion(type_, label, text, score, categoria=None):
+    return {
+        "type": type_,
+        "label": label,
+        "text": text,
+        "score": round(score, 4),
+        "categoria": categoria,
+    }
+
+
+def build_suggestions(stats: dict, bill_cents: int, subscription_count: int,
+                      subscription_monthly_cents: int) -> list:
+    """Sugestões pontuadas pelo impacto relativo à renda média, em ordem."""
+    income = stats["income_mean"]
+    spending = stats["spending_mean"]
+    categories = stats["categories"]
+    # sem renda registrada, mede o impacto contra o próprio gasto
+    base = income or spending or 1
+
+    if not categories:
+        return [
+            _suggestion(
+                "info", "Dica",
+                "Comece registrando seus gastos para receber sugestões personalizadas",
+                0,
+            )
+        ]
+
+    result = []
+
+    # 1. categoria que pesa demais na renda
+    top = categories[0]
+    if income and top["mean"] > income * 0.3:
+        result.append(
+            _suggestion(
+                "warning", "Atenção",
+                f"Seus gastos com {top['categoria']} representam mais de 30% da sua "
+                f"renda (média de {_brl(top['mean'])}/mês). Considere reduzir nesta categoria.",
+                top["mean"] / base,
+                top["categoria"],
+            )
+        )
+
+    # 2. fora do padrão neste mês
+    for c in categories:
+        if c["outlier"]:
+            result.append(
+                _suggestion(
+                    "warning", "Fora do padrão",
+                    f"Você já gastou {_brl(c['current_month'])} com {c['categoria']} este mês, "
+                    f"bem acima da sua média de {_brl(c['mean'])}.",
+                    (c["current_month"] - c["mean"]) / base,
+                    c["categoria"],
+                )
+            )
+
+    # 3. variação do último mês completo
+    for c in categories:
+        delta = c["mom_delta"]
+        if abs(delta) < MOM_MIN_CENTS or not c["previous_month"]:
+            continue
+        if abs(delta) / c["previous_month"] < MOM_MIN_RATIO:
+            continue
+        if delta > 0:
+            result.append(
+                _suggestion(
+                    "info", "Tendência",
+                    f"Seus gastos com {c['categoria']} subiram {_brl(delta)} no último mês "
+                    f"({_brl(c['previous_month'])} → {_brl(c['last_month'])}).",
+                    delta / base,
+                    c["categoria"],
+                )
+            )
+        else:
+            result.append(
+                _suggestion(
+                    "success", "Boa!",
+                    f"Você reduziu {_brl(-delta)} em {c['categoria']} no último mês. Continue assim!",
+                    -delta / base,
+                    c["categoria"],
+                )
+            )
+
+    # 4. taxa de poupança
+    if income:
+        if spending > income * 0.8:
+            result.append(
+                _suggestion(
+                    "warning", "Alerta",
+                    "Você está gastando mais de 80% da sua renda. Tente economizar mais "
+                    "para criar uma reserva de emergência.",
+                    spending / base,
+                )
+            )
+        elif income - spending > income * 0.3:
+            result.append(
+                _suggestion(
+                    "success", "Parabéns",
+                    "Você está economizando mais de 30% da sua renda! Continue monitorando seus gastos!",
+                    (income - spending) / base,
+                )
+            )
+
+    # 5. assinaturas
+    if subscription_count > 5 or (income and subscription_monthly_cents > income * 0.1):
+        result.append(
+            _suggestion(
+                "info", "Dica",
+                f"Você tem {subscription_count} assinaturas ativas "
+                f"({_brl(subscription_monthly_cents)}/mês). Revise quais realmente usa "
+                "e considere cancelar as não essenciais.",
+                subscription_monthly_cents / base,
+            )
+        )
+
+    # 6. fatura alta
+    if income and bill_cents > income * 0.5:
+        result.append(
+            _suggestion(
+                "warning", "Atenção",
+                "Sua fatura do cartão está alta. Pague o quanto antes para evitar juros "
+                "e priorize débito.",
+                bill_cents / base,
+            )
+        )
+
+    if not result:
+        return [
+            _suggestion(
+                "success", "Tudo certo",
+                "Suas finanças estão equilibradas. Continue!",
+                0,
+            )
+        ]
+
+    result.sort(key=lambda s: (TYPE_PRIORITY[s["type"]], -s["score"]))
+    return result[:MAX_SUGGESTIONS]
+
+
+def stats_to_dict(stats: dict) -> dict:
+    """Estatísticas em reais para o JSON."""
+    return {
+        "months": stats["months"],
+        "income_mean": from_cents(stats["income_mean"]),
+        "spending_mean": from_cents(stats["spending_mean"]),
+        "categories": [
+            {
+                **c,
+                **{
+                    key: from_cents(c[key])
+                    for key in ("mean", "stdev", "last_month", "previous_month",
+                                "mom_delta", "current_month")
+                },
+            }
+            for c in stats["categories"]
+        ],
+    }
@@ -0,0 +1,318 @@
+# app/instrumentation.py
+"""
+Instrumentação opcional de requisições e SQL (SOLVIX_INSTRUMENTATION=1).
+
+Para cada requisição:
+  - latência por endpoint (histograma),
+  - quantidade de queries e tempo total de SQL (eventos do engine),
+  - header Server-Timing (app / db) para ver no DevTools do navegador.
+
+Tudo fica exposto em formato Prometheus em GET /metrics, junto com os
+contadores do cache de resultados e do pool de conexões.
+
+Profiler por amostragem (SOLVIX_PROFILE_SLOW_MS=<limite em ms>): enquanto uma
+requisição roda, uma thread amostra a pilha dela a cada
+SOLVIX_PROFILE_INTERVAL_MS (padrão 5 ms). Se a requisição passar do limite,
+as pilhas mais frequentes são impressas no log e guardadas em
+GET /metrics/slow (últimas 20).
+
+As métricas são por processo (cada worker do gunicorn tem as suas).
+"""
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+from flask import g, has_request_context, jsonify, request
+from sqlalchemy import event
+
+from .db_config import _env_bool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """Histograma cumulativo no formato Prometheus, com labels."""
+
+    def __init__(self, name: str, help_text: str, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._series[labels] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self, label_names) -> list:
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            items = sorted(self._series.items())
+            for labels, series in items:
+                base = ",".join(
+                    f'{k}="{_escape(v)}"' for k, v in zip(label_names, labels)
+                )
+                sep = "," if base else ""
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {series["count"]}')
+                lines.append(f"{self.name}_sum{{{base}}} {series['sum']:.6f}")
+                lines.append(f"{self.name}_count{{{base}}} {series['count']}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class SlowRequestSampler:
+    """Amostrador de pilhas das threads que estão atendendo requisições."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._active = {}  # thread_id -> Counter de pilhas
+        self._lock = threading.Lock()
+        self._thread = None
+        self.recent = deque(maxlen=20)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="solvix-sampler", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, samples in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is None:
+                        continue
+                    stack = traceback.extract_stack(frame)
+                    key = ";".join(f"{f.name} ({os.path.basename(f.filename)}:{f.lineno})" for f in stack)
+                    samples[key] += 1
+
+    def start(self):
+        self._ensure_thread()
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+
+    def stop(self) -> Counter:
+        with self._lock:
+            return self._active.pop(threading.get_ident(), Counter())
+
+
+class Instrumentation:
+    def __init__(self):
+        self.enabled = False
+        self.request_latency = Histogram(
+            "solvix_http_request_duration_seconds",
+            "Latência das requisições HTTP por endpoint.",
+            LATENCY_BUCKETS,
+        )
+        self.request_queries = Histogram(
+            "solvix_http_request_queries",
+            "Quantidade de queries SQL por requisição.",
+            QUERY_COUNT_BUCKETS,
+        )
+        self.request_sql_time = Histogram(
+            "solvix_http_request_sql_seconds",
+            "Tempo total de SQL por requisição.",
+            LATENCY_BUCKETS,
+        )
+        self.total_queries = 0
+        self.total_sql_seconds = 0.0
+        self._lock = threading.Lock()
+        self.sampler = None
+        self.slow_threshold = None
+
+    def init_app(self, app, engine):
+        enabled = app.config.get("SOLVIX_INSTRUMENTATION")
+        if enabled is None:
+            enabled = _env_bool("SOLVIX_INSTRUMENTATION", False)
+        self.enabled = bool(enabled)
+        if not self.enabled:
+            return
+
+        slow_ms = os.getenv("SOLVIX_PROFILE_SLOW_MS")
+        if slow_ms:
+            self.slow_threshold = float(slow_ms) / 1000
+            interval_ms = float(os.getenv("SOLVIX_PROFILE_INTERVAL_MS", "5"))
+            self.sampler = SlowRequestSampler(interval_ms / 1000)
+
+        self._install_sql_events(engine)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule("/metrics", "metrics", self.metrics_view)
+        app.add_url_rule("/metrics/slow", "metrics_slow", self.slow_view)
+
+    # ------------------------------------------------------------------
+    # SQL
+    # ------------------------------------------------------------------
+
+    def _install_sql_events(self, engine):
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before_cursor_execute(conn, cursor, statement, params, context, executemany):
+            conn.info.setdefault("solvix_query_start", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after_cursor_execute(conn, cursor, statement, params, context, executemany):
+            starts = conn.info.get("solvix_query_start")
+            if not starts:
+                return
+            elapsed = time.perf_counter() - starts.pop()
+
+            with self._lock:
+                self.total_queries += 1
+                self.total_sql_seconds += elapsed
+
+            if has_request_context() and "solvix_started" in g:
+                g.solvix_queries += 1
+                g.solvix_sql_time += elapsed
+
+    # ------------------------------------------------------------------
+    # Requisições
+    # ------------------------------------------------------------------
+
+    def _before_request(self):
+        g.solvix_started = time.perf_counter()
+        g.solvix_queries = 0
+        g.solvix_sql_time = 0.0
+        if self.sampler is not None:
+            self.sampler.start()
+
+    def _after_request(self, response):
+        started = g.pop("solvix_started", None)
+        if started is None:
+            return response
+
+        elapsed = time.perf_counter() - started
+        queries = g.get("solvix_queries", 0)
+        sql_time = g.get("solvix_sql_time", 0.0)
+        endpoint = request.endpoint or "unknown"
+
+        self.request_latency.observe(
+            (endpoint, request.method, str(response.status_code)), elapsed
+        )
+        self.request_queries.observe((endpoint,), queries)
+        self.request_sql_time.observe((endpoint,), sql_time)
+
+        response.headers.add(
+            "Server-Timing",
+            f'app;dur={elapsed * 1000:.1f}, db;dur={sql_time * 1000:.1f};desc="{queries} queries"',
+        )
+
+        if self.sampler is not None:
+            samples = self.sampler.stop()
+            if elapsed >= self.slow_threshold:
+                self._report_slow(endpoint, elapsed, queries, sql_time, samples)
+
+        return response
+
+    def _teardown_request(self, exc):
+        # after_request não roda quando a view levanta exceção; sem isto a
+        # entrada da thread ficaria no amostrador para sempre.
+        if self.sampler is not None:
+            self.sampler.stop()
+
+    def _report_slow(self, endpoint, elapsed, queries, sql_time, samples: Counter):
+        top = samples.most_common(5)
+        report = {
+            "endpoint": endpoint,
+            "path": request.full_path,
+            "duration_ms": round(elapsed * 1000, 1),
+            "queries": queries,
+            "sql_ms": round(sql_time * 1000, 1),
+            "samples": sum(samples.values()),
+            "top_stacks": [{"count": n, "stack": stack} for stack, n in top],
+        }
+        self.sampler.recent.append(report)
+
+        print(
+            f"[LENTO] {endpoint} {report['duration_ms']} ms "
+            f"({queries} queries, {report['sql_ms']} ms SQL, {report['samples']} amostras)"
+        )
+        for stack, n in top:
+            print(f"  {n:>4}x {stack.split(';')[-1]}")
+
+    # ------------------------------------------------------------------
+    # Exposição
+    # ------------------------------------------------------------------
+
+    def render_prometheus(self) -> str:
+        from .cache import cache
+        from .db_config import pool_stats
+
+        lines = []
+        lines += self.request_latency.render(("endpoint", "method", "status"))
+        lines += self.request_queries.render(("endpoint",))
+        lines += self.request_sql_time.render(("endpoint",))
+
+        lines += [
+            "# HELP solvix_sql_queries_total Queries SQL executadas.",
+            "# TYPE solvix_sql_queries_total counter",
+            f"solvix_sql_queries_total {self.total_queries}",
+            "# HELP solvix_sql_seconds_total Tempo total gasto em SQL.",
+            "# TYPE solvix_sql_seconds_total counter",
+            f"solvix_sql_seconds_total {self.total_sql_seconds:.6f}",
+        ]
+
+        stats = cache.stats()
+        for key in ("hits", "misses", "errors"):
+            lines += [
+                f"# TYPE solvix_cache_{key}_total counter",
+                f"solvix_cache_{key}_total {stats[key]}",
+            ]
+
+        pool = pool_stats.snapshot()
+        lines += [
+            "# TYPE solvix_db_pool_checkouts_total counter",
+            f"solvix_db_pool_checkouts_total {pool['checkouts']}",
+            "# TYPE solvix_db_pool_timeouts_total counter",
+            f"solvix_db_pool_timeouts_total {pool['timeouts']}",
+            "# TYPE solvix_db_pool_wait_seconds_total counter",
+            f"solvix_db_pool_wait_seconds_total {pool['total_wait_seconds']}",
+        ]
+        for key in ("checked_out", "overflow"):
+            if key in pool:
+                lines += [
+                    f"# TYPE solvix_db_pool_{key} gauge",
+                    f"solvix_db_pool_{key} {pool[key]}",
+                ]
+
+        return "\n".join(lines) + "\n"
+
+    def metrics_view(self):
+        return (
+            self.render_prometheus(),
+            200,
+            {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    def slow_view(self):
+        recent = list(self.sampler.recent) if self.sampler is not None else []
+        return jsonify(recent)
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,263 @@
+# app/jobs.py
+"""
+Fila de jobs em background, guardada na tabela `jobs` (SQLite ou Postgres).
+
+- As rotas chamam `enqueue(...)` (sem commit) e respondem 202 na hora.
+- O worker (`python worker.py`, ao lado do run.py) reserva o próximo job
+  com UPDATE ... WHERE status = 'queued' (quem atualizar a linha primeiro
+  fica com ela; funciona igual nos dois bancos) e chama o handler
+  registrado com `@handler("<tipo>")`.
+- O handler roda na MESMA transação que marca o job como 'done': ou o
+  trabalho e a conclusão são gravados juntos, ou nada é. Em caso de erro o
+  job volta para a fila com espera exponencial até `max_attempts`.
+- Jobs 'running' cujo worker morreu (lock mais velho que LOCK_TIMEOUT)
+  voltam para a fila.
+- Jobs diários (DAILY_JOBS, ex.: gerar cobranças de assinatura) são
+  enfileirados pelo próprio worker na virada do dia.
+- Idempotency key: enfileirar de novo com a mesma chave (por usuário)
+  devolve o job já existente em vez de criar outro.
+- Cache: o worker é outro processo, então o que invalida o cache dos
+  processos web é o bump_data_version que o handler faz na transação do
+  job (as chaves do cache levam a versão do banco).
+"""
+import json
+import os
+import socket
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .cache import cache
+from .models import Job
+
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BASE_SECONDS = 10
+LOCK_TIMEOUT = timedelta(minutes=15)
+
+HANDLERS = {}
+
+# enfileirados pelo worker uma vez por dia: tipo -> payload
+DAILY_JOBS = {
+    "subscriptions.generate": {},
+}
+
+
+class PermanentError(Exception):
+    """Erro que não adianta tentar de novo (ex.: arquivo inválido)."""
+
+
+def handler(kind: str):
+    """
+    Registra a função que executa jobs do tipo `kind`.
+
+    A função recebe o Job (payload já decodificado em job.data) e devolve
+    um dict JSON com o resultado. Não deve dar commit. Se alterar dados
+    do usuário, deve chamar bump_data_version (é o que invalida o cache
+    dos processos web). Para falhar sem novas tentativas, levante
+    PermanentError.
+    """
+    def decorator(fn):
+        HANDLERS[kind] = fn
+        return fn
+
+    return decorator
+
+
+def _scoped_key(user_id, idempotency_key):
+    if not idempotency_key:
+        return None
+    owner = user_id if user_id is not None else "-"
+    return f"{owner}:{idempotency_key}"[:150]
+
+
+def enqueue(kind: str, payload=None, user_id=None, idempotency_key=None,
+            attachment=None, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+            run_at=None):
+    """
+    Enfileira um job (sem commit). Retorna (job, created); created=False
+    quando a idempotency key já tinha um job.
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"Tipo de job desconhecido: {kind}")
+
+    key = _scoped_key(user_id, idempotency_key)
+    if key is not None:
+        existing = Job.query.filter_by(idempotency_key=key).first()
+        if existing is not None:
+            return existing, False
+
+    job = Job(
+        user_id=user_id,
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        attachment=attachment,
+        idempotency_key=key,
+        status="queued",
+        attempts=0,
+        max_attempts=max_attempts,
+        run_at=run_at or datetime.utcnow(),
+    )
+    try:
+        # SAVEPOINT: se outra requisição criou a mesma chave, desfaz só o INSERT
+        with db.session.begin_nested():
+            db.session.add(job)
+    except IntegrityError:
+        return Job.query.filter_by(idempotency_key=key).one(), False
+    return job, True
+
+
+# -------------------------------------------------------------------
+# Worker
+# -------------------------------------------------------------------
+
+
+def enqueue_daily(today=None) -> int:
+    """
+    Enfileira os DAILY_JOBS do dia (com commit). A idempotency key por dia
+    (a mesma do `generate-subscriptions --enqueue`) faz vários workers e o
+    cron enfileirarem cada um uma vez só. Retorna quantos foram criados.
+    """
+    day = (today or date.today()).isoformat()
+    created = 0
+    for kind, payload in DAILY_JOBS.items():
+        if kind in HANDLERS:
+            _, new = enqueue(kind, payload, idempotency_key=f"{kind}:{day}")
+            created += new
+    db.session.commit()
+    return created
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def requeue_stale(now=None) -> int:
+    """Devolve para a fila os jobs 'running' de workers que sumiram."""
+    now = now or datetime.utcnow()
+    stale = [Job.status == "running", Job.locked_at < now - LOCK_TIMEOUT]
+    options = {"synchronize_session": False}
+
+    db.session.execute(
+        update(Job)
+        .where(*stale, Job.attempts >= Job.max_attempts)
+        .values(status="failed", locked_by=None, finished_at=now,
+                error="worker interrompido durante a execução"),
+        execution_options=options,
+    )
+    result = db.session.execute(
+        update(Job)
+        .where(*stale)
+        .values(status="queued", locked_by=None, locked_at=None, run_at=now),
+        execution_options=options,
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def claim_next(worker_id: str, now=None):
+    """Reserva o próximo job pronto para rodar (ou None)."""
+    now = now or datetime.utcnow()
+    candidates = (
+        db.session.query(Job.id)
+        .filter(Job.status == "queued", Job.run_at <= now)
+        .order_by(Job.run_at, Job.id)
+        .limit(5)
+        .all()
+    )
+    for (job_id,) in candidates:
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "queued")
+            .values(
+                status="running",
+                locked_by=worker_id,
+                locked_at=now,
+                attempts=Job.attempts + 1,
+            ),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id, populate_existing=True)
+    return None
+
+
+def run_job(job) -> bool:
+    """Executa um job já reservado. Retorna True se concluiu."""
+    job_id = job.id
+    fn = HANDLERS.get(job.kind)
+    try:
+        if fn is None:
+            raise RuntimeError(f"sem handler para '{job.kind}'")
+        job.data = json.loads(job.payload or "{}")
+        result = fn(job)
+
+        job.status = "done"
+        job.result = json.dumps(result if result is not None else {})
+        job.error = None
+        job.finished_at = datetime.utcnow()
+        job.locked_by = None
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(Job, job_id, populate_existing=True)
+        print(f"[ERRO] job {job_id} ({job.kind}), tentativa {job.attempts}: {e}")
+
+        job.error = str(e)[:2000]
+        job.locked_by = None
+        if isinstance(e, PermanentError) or job.attempts >= job.max_attempts:
+            job.status = "failed"
+            job.finished_at = datetime.utcnow()
+        else:
+            job.status = "queued"
+            delay = RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+            job.run_at = datetime.utcnow() + timedelta(seconds=delay)
+        db.session.commit()
+        return False
+
+    # só libera a memória local; os processos web enxergam a versão nova
+    if job.user_id is not None:
+        cache.invalidate_user(job.user_id)
+    return True
+
+
+def work(worker_id=None, poll_interval: float = 1.0, once: bool = False,
+         max_jobs=None) -> int:
+    """
+    Loop do worker (precisa de app context). Com once=True processa o que
+    estiver pronto e sai. Retorna quantos jobs foram executados.
+    """
+    worker_id = worker_id or default_worker_id()
+    processed = 0
+    last_stale_check = None
+    last_daily = None
+
+    while max_jobs is None or processed < max_jobs:
+        if last_daily != date.today():
+            try:
+                enqueue_daily()
+                last_daily = date.today()
+            except Exception as e:
+                db.session.rollback()
+                print(f"[ERRO] enqueue_daily: {e}")
+
+        if (last_stale_check is None
+                or time.monotonic() - last_stale_check > LOCK_TIMEOUT.total_seconds() / 3):
+            requeue_stale()
+            last_stale_check = time.monotonic()
+
+        job = claim_next(worker_id)
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        run_job(job)
+        processed += 1
+        db.session.remove()
+
+    return processed
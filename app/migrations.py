@@ -0,0 +1,462 @@
+# app/migrations.py
+"""
+Migrações versionadas do schema.
+
+Substitui o antigo `db.create_all()` no start da aplicação:
+
+- Banco vazio: cria tudo com `create_all()` e marca a versão mais nova.
+- Banco já existente sem controle de versão (deploys antigos): aplica
+  todas as migrações, que são idempotentes (só criam o que falta).
+- Banco com controle de versão: aplica as migrações pendentes, em ordem.
+
+A versão aplicada fica na tabela `schema_version`. No Postgres um advisory
+lock evita que vários workers do gunicorn migrem ao mesmo tempo.
+
+Para adicionar uma migração, basta registrar uma função com o decorator
+`@migration(<versão>, "<descrição>")`. Ela recebe a conexão já dentro da
+transação e deve ser idempotente sempre que possível.
+"""
+import sqlite3
+from datetime import datetime
+
+from sqlalchemy import (
+    CheckConstraint,
+    Column,
+    DateTime,
+    ForeignKeyConstraint,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    UniqueConstraint,
+    func,
+    inspect,
+    select,
+    text,
+)
+
+from . import db
+
+# chave arbitrária do pg_advisory_xact_lock das migrações
+MIGRATION_LOCK_KEY = 730_112_001
+
+_version_metadata = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    _version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=True),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+MIGRATIONS = []
+
+
+def migration(version: int, description: str):
+    """Registra uma função de migração para a versão informada."""
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+
+    return decorator
+
+
+def head_version() -> int:
+    """Versão mais nova conhecida pelo código."""
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def _stamp(conn, version: int, description: str):
+    conn.execute(
+        schema_version.insert().values(
+            version=version,
+            description=description,
+            applied_at=datetime.utcnow(),
+        )
+    )
+
+
+def _create_indexes(conn, names):
+    """Cria (se ainda não existirem) os índices do metadata com esses nomes."""
+    wanted = set(names)
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in wanted:
+                index.create(bind=conn, checkfirst=True)
+
+
+def _add_column_if_missing(conn, table_name: str, column_name: str):
+    """ALTER TABLE ... ADD COLUMN a partir da definição da coluna no modelo."""
+    existing = {c["name"] for c in inspect(conn).get_columns(table_name)}
+    if column_name in existing:
+        return False
+
+    column = db.metadata.tables[table_name].c[column_name]
+    preparer = conn.dialect.identifier_preparer
+    ddl = (
+        f"ALTER TABLE {preparer.quote(table_name)} "
+        f"ADD COLUMN {preparer.quote(column_name)} "
+        f"{column.type.compile(dialect=conn.dialect)}"
+    )
+    if column.server_default is not None:
+        ddl += f" DEFAULT {column.server_default.arg}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    conn.execute(text(ddl))
+    return True
+
+
+def _convert_to_cents(conn, table_name: str, old_column: str, new_column: str):
+    """
+    Troca uma coluna de reais (float) pela equivalente em centavos inteiros:
+    cria a nova, copia arredondando para o centavo e remove a antiga.
+    Não faz nada se a coluna antiga já não existir.
+    """
+    existing = {c["name"] for c in inspect(conn).get_columns(table_name)}
+    if old_column not in existing:
+        return False
+
+    preparer = conn.dialect.identifier_preparer
+    table = preparer.quote(table_name)
+    old = preparer.quote(old_column)
+    new = preparer.quote(new_column)
+
+    if new_column not in existing:
+        column = db.metadata.tables[table_name].c[new_column]
+        ddl = f"ALTER TABLE {table} ADD COLUMN {new} {column.type.compile(dialect=conn.dialect)}"
+        if not column.nullable:
+            ddl += " NOT NULL DEFAULT 0"
+        conn.execute(text(ddl))
+
+    conn.execute(
+        text(
+            f"UPDATE {table} SET {new} = CAST(ROUND(CAST({old} AS NUMERIC) * 100) AS BIGINT) "
+            f"WHERE {old} IS NOT NULL"
+        )
+    )
+    _drop_column(conn, table_name, old_column)
+    return True
+
+
+def _drop_column(conn, table_name: str, column_name: str):
+    """
+    ALTER TABLE ... DROP COLUMN. O SQLite só tem DROP COLUMN a partir da
+    3.35; em versões anteriores a tabela é recriada sem a coluna.
+    """
+    if conn.dialect.name == "sqlite" and sqlite3.sqlite_version_info < (3, 35, 0):
+        _rebuild_sqlite_table_without(conn, table_name, column_name)
+        return
+
+    preparer = conn.dialect.identifier_preparer
+    conn.execute(
+        text(
+            f"ALTER TABLE {preparer.quote(table_name)} "
+            f"DROP COLUMN {preparer.quote(column_name)}"
+        )
+    )
+
+
+def _rebuild_sqlite_table_without(conn, table_name: str, column_name: str):
+    """
+    Roteiro do SQLite para remover coluna sem DROP COLUMN: cria uma cópia
+    da tabela sem ela (colunas e constraints refletidas do banco, não dos
+    modelos), copia as linhas, troca uma pela outra e recria os índices.
+    """
+    insp = inspect(conn)
+    preparer = conn.dialect.identifier_preparer
+
+    columns = [c for c in insp.get_columns(table_name) if c["name"] != column_name]
+    primary_key = insp.get_pk_constraint(table_name)["constrained_columns"]
+    index_sql = [
+        conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = :name"),
+            {"name": index["name"]},
+        ).scalar()
+        for index in insp.get_indexes(table_name)
+        if column_name not in index["column_names"]
+    ]
+
+    # as FKs precisam das tabelas referenciadas no mesmo metadata
+    metadata = MetaData()
+    metadata.reflect(bind=conn)
+    constraints = [
+        ForeignKeyConstraint(
+            fk["constrained_columns"],
+            [f"{fk['referred_table']}.{col}" for col in fk["referred_columns"]],
+            **fk.get("options", {}),
+        )
+        for fk in insp.get_foreign_keys(table_name)
+        if column_name not in fk["constrained_columns"]
+    ]
+    constraints += [
+        UniqueConstraint(*uc["column_names"], name=uc["name"])
+        for uc in insp.get_unique_constraints(table_name)
+        if column_name not in uc["column_names"]
+    ]
+    constraints += [
+        CheckConstraint(ck["sqltext"], name=ck["name"])
+        for ck in insp.get_check_constraints(table_name)
+        if column_name not in ck["sqltext"]
+    ]
+
+    rebuilt_name = f"_rebuild_{table_name}"
+    Table(
+        rebuilt_name,
+        metadata,
+        *[
+            Column(
+                c["name"],
+                c["type"],
+                primary_key=c["name"] in primary_key,
+                nullable=c["nullable"],
+                server_default=text(c["default"]) if c["default"] is not None else None,
+            )
+            for c in columns
+        ],
+        *constraints,
+    ).create(bind=conn)
+
+    table = preparer.quote(table_name)
+    rebuilt = preparer.quote(rebuilt_name)
+    names = ", ".join(preparer.quote(c["name"]) for c in columns)
+    conn.execute(text(f"INSERT INTO {rebuilt} ({names}) SELECT {names} FROM {table}"))
+    conn.execute(text(f"DROP TABLE {table}"))
+    conn.execute(text(f"ALTER TABLE {rebuilt} RENAME TO {table}"))
+    for sql in index_sql:
+        if sql:
+            conn.exec_driver_sql(sql)
+
+
+# -------------------------------------------------------------------
+# Migrações
+# -------------------------------------------------------------------
+
+
+@migration(1, "schema inicial")
+def _m001_initial(conn):
+    db.metadata.create_all(bind=conn)
+
+
+@migration(2, "índices compostos/parciais das consultas principais")
+def _m002_hot_query_indexes(conn):
+    _create_indexes(
+        conn,
+        [
+            "ix_transaction_user_data",
+            "ix_transaction_open_credit",
+            "ix_installment_plans_transaction_id",
+            "ix_installment_charges_paid_due",
+            "ix_installment_charges_plan_id",
+            "ix_saving_boxes_user_archived",
+            "ix_saving_movements_box_date",
+        ],
+    )
+
+
+@migration(3, "saldo materializado das caixinhas (saving_boxes.balance)")
+def _m003_saving_box_balance(conn):
+    # Como foi publicada (saldo em reais, recalculado dos movimentos); a
+    # migração 6 converte para balance_cents. SQL à mão porque os modelos
+    # atuais já não têm a coluna `balance`.
+    existing = {c["name"] for c in inspect(conn).get_columns("saving_boxes")}
+    if "balance" not in existing:
+        conn.execute(
+            text("ALTER TABLE saving_boxes ADD COLUMN balance FLOAT DEFAULT 0 NOT NULL")
+        )
+
+    # bancos pré-versionamento podem ter saving_movements criada já em centavos
+    movement_columns = {c["name"] for c in inspect(conn).get_columns("saving_movements")}
+    amount = "amount" if "amount" in movement_columns else "amount_cents / 100.0"
+    conn.execute(
+        text(
+            f"""
+            UPDATE saving_boxes SET balance = (
+                SELECT COALESCE(SUM(CASE saving_movements.type
+                    WHEN 'deposit' THEN ({amount})
+                    WHEN 'withdraw' THEN -({amount})
+                    ELSE 0 END), 0)
+                FROM saving_movements
+                WHERE saving_movements.box_id = saving_boxes.id
+            )
+            """
+        )
+    )
+
+
+@migration(4, "versão dos dados por usuário (user_data_versions)")
+def _m004_user_data_versions(conn):
+    db.metadata.tables["user_data_versions"].create(bind=conn, checkfirst=True)
+
+
+@migration(5, "tabela de usuários (users)")
+def _m005_users(conn):
+    db.metadata.tables["users"].create(bind=conn, checkfirst=True)
+
+
+@migration(6, "valores monetários em centavos inteiros (*_cents)")
+def _m006_money_in_cents(conn):
+    from .models import SavingBox
+
+    _convert_to_cents(conn, "transaction", "valor", "valor_cents")
+    _convert_to_cents(conn, "transaction", "total_amount", "total_amount_cents")
+    _convert_to_cents(conn, "installment_plans", "total_amount", "total_amount_cents")
+    _convert_to_cents(conn, "installment_charges", "amount", "amount_cents")
+    _convert_to_cents(conn, "saving_movements", "amount", "amount_cents")
+    _convert_to_cents(conn, "saving_boxes", "target_amount", "target_amount_cents")
+
+    # saldo materializado pela migração 3; bancos que não têm a coluna
+    # `balance` ganham balance_cents recalculado dos movimentos
+    if not _convert_to_cents(conn, "saving_boxes", "balance", "balance_cents"):
+        _add_column_if_missing(conn, "saving_boxes", "balance_cents")
+        conn.execute(SavingBox.reconcile_statement())
+
+
+@migration(7, "resumo mensal materializado (monthly_rollup) + backfill")
+def _m007_monthly_rollup(conn):
+    from . import rollup
+
+    db.metadata.tables["monthly_rollup"].create(bind=conn, checkfirst=True)
+    rollup.rebuild(bind=conn)
+
+
+@migration(8, "assinaturas recorrentes (subscriptions) + transaction.subscription_id")
+def _m008_subscriptions(conn):
+    from datetime import date
+
+    from . import subscriptions
+
+    db.metadata.tables["subscriptions"].create(bind=conn, checkfirst=True)
+    _add_column_if_missing(conn, "transaction", "subscription_id")
+    _create_indexes(conn, ["ux_transaction_subscription_data"])
+
+    # Backfill: uma assinatura mensal por descrição, ancorada na última
+    # cobrança recorrente já lançada. A próxima cobrança é a primeira depois
+    # de hoje (não gera cobranças retroativas).
+    transactions = db.metadata.tables["transaction"]
+    subs = db.metadata.tables["subscriptions"]
+    name = func.coalesce(transactions.c.descricao, transactions.c.categoria)
+
+    already = select(subs.c.id).limit(1)
+    if conn.execute(already).first() is not None:
+        return
+
+    latest_ids = (
+        select(func.max(transactions.c.id))
+        .where(
+            transactions.c.user_id.isnot(None),
+            transactions.c.tipo == "expense",
+            transactions.c.categoria == "Assinaturas",
+            transactions.c.recorrente.is_(True),
+        )
+        .group_by(transactions.c.user_id, name)
+    )
+    rows = conn.execute(
+        select(
+            transactions.c.id,
+            transactions.c.user_id,
+            name.label("name"),
+            transactions.c.categoria,
+            transactions.c.valor_cents,
+            transactions.c.meio_pagamento,
+            transactions.c.logo,
+            transactions.c.data,
+        ).where(transactions.c.id.in_(latest_ids))
+    ).all()
+
+    today = date.today()
+    for r in rows:
+        k = 1
+        next_due = subscriptions.occurrence_date(r.data, "monthly", 1, k)
+        while next_due <= today:
+            k += 1
+            next_due = subscriptions.occurrence_date(r.data, "monthly", 1, k)
+
+        sub_id = conn.execute(
+            subs.insert().values(
+                user_id=r.user_id,
+                name=r.name,
+                categoria=r.categoria,
+                amount_cents=r.valor_cents,
+                meio_pagamento=r.meio_pagamento,
+                logo=r.logo,
+                cadence="monthly",
+                interval=1,
+                anchor_date=r.data,
+                next_occurrence=k,
+                next_due_date=next_due,
+                active=True,
+                created_at=datetime.utcnow(),
+            )
+        ).inserted_primary_key[0]
+        conn.execute(
+            transactions.update()
+            .where(transactions.c.id == r.id)
+            .values(subscription_id=sub_id)
+        )
+
+
+@migration(9, "fila de jobs em background (jobs)")
+def _m009_jobs(conn):
+    db.metadata.tables["jobs"].create(bind=conn, checkfirst=True)
+
+
+@migration(10, "respostas de escritas idempotentes (idempotency_keys)")
+def _m010_idempotency_keys(conn):
+    db.metadata.tables["idempotency_keys"].create(bind=conn, checkfirst=True)
+
+
+# -------------------------------------------------------------------
+# Execução
+# -------------------------------------------------------------------
+
+
+def upgrade(engine=None):
+    """
+    Leva o banco até a versão mais nova. Retorna a lista de versões aplicadas.
+    """
+    engine = engine or db.engine
+    applied = []
+
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"),
+                {"key": MIGRATION_LOCK_KEY},
+            )
+
+        existing_tables = set(inspect(conn).get_table_names())
+        app_tables = set(db.metadata.tables.keys())
+
+        schema_version.create(bind=conn, checkfirst=True)
+        current = conn.execute(select(func.max(schema_version.c.version))).scalar()
+
+        if current is None:
+            if not (existing_tables & app_tables):
+                # Banco novo: cria tudo de uma vez já no formato mais recente
+                db.metadata.create_all(bind=conn)
+                _stamp(conn, head_version(), "schema criado do zero")
+                return [head_version()]
+
+            # Banco anterior ao controle de versão: roda tudo desde a
+            # migração 1 (create_all só cria as tabelas que faltarem)
+            current = 0
+
+        for version, description, fn in MIGRATIONS:
+            if version <= current:
+                continue
+            fn(conn)
+            _stamp(conn, version, description)
+            applied.append(version)
+
+    return applied
+
+
+def current_version(engine=None):
+    """Versão aplicada no banco (ou None se nunca migrou)."""
+    engine = engine or db.engine
+    with engine.connect() as conn:
+        if not inspect(conn).has_table("schema_version"):
+            return None
+        return conn.execute(select(func.max(schema_version.c.version))).scalar()
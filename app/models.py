@@ -1,4 +1,7 @@
+import json
+
 from . import db
+from .money import from_cents
 from datetime import datetime, date
 
 
@@ -14,6 +17,29 @@ class Transaction(db.Model):
     Também pode estar associado a um plano de parcelamento.
     """
     __tablename__ = "transaction"
+    __table_args__ = (
+        # Listagem/paginação por usuário em (data, id)
+        db.Index("ix_transaction_user_data", "user_id", "data", "id"),
+        # Uma ocorrência por assinatura e data (geração idempotente)
+        db.Index(
+            "ux_transaction_subscription_data",
+            "subscription_id",
+            "data",
+            unique=True,
+        ),
+        # Predicado da fatura: compras no crédito ainda não quitadas
+        db.Index(
+            "ix_transaction_open_credit",
+            "user_id",
+            "data",
+            postgresql_where=db.text(
+                "tipo = 'expense' AND meio_pagamento = 'credit' AND settled IS false"
+            ),
+            sqlite_where=db.text(
+                "tipo = 'expense' AND meio_pagamento = 'credit' AND settled IS 0"
+            ),
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -23,7 +49,7 @@ class Transaction(db.Model):
 
     # Campos obrigatórios
     tipo = db.Column(db.String(10), nullable=False)          # 'income' ou 'expense'
-    valor = db.Column(db.Float, nullable=False)              # valor principal informado
+    valor_cents = db.Column(db.BigInteger, nullable=False)   # valor principal informado (centavos)
     categoria = db.Column(db.String(50), nullable=False)
     data = db.Column(db.Date, nullable=False, default=datetime.utcnow)
 
@@ -51,8 +77,8 @@ class Transaction(db.Model):
     # Quantidade de parcelas (2x, 3x, 10x, etc.)
     installment_count = db.Column(db.Integer, nullable=True)
 
-    # Valor total da compra parcelada (já calculado no backend)
-    total_amount = db.Column(db.Float, nullable=True)
+    # Valor total da compra parcelada em centavos (já calculado no backend)
+    total_amount_cents = db.Column(db.BigInteger, nullable=True)
 
     # Juros ao mês (%) se informado
     interest_per_month = db.Column(db.Float, nullable=True)
@@ -60,6 +86,13 @@ class Transaction(db.Model):
     # Data da primeira fatura em que a 1ª parcela vence
     first_due_date = db.Column(db.Date, nullable=True)
 
+    # Assinatura que gerou esta ocorrência (se houver)
+    subscription_id = db.Column(
+        db.Integer,
+        db.ForeignKey("subscriptions.id"),
+        nullable=True
+    )
+
     # Relação 1:1 com o plano de parcelas
     installment_plan = db.relationship(
         "InstallmentPlan",
@@ -78,7 +111,7 @@ class Transaction(db.Model):
             "id": self.id,
             "user_id": self.user_id,
             "tipo": self.tipo,
-            "valor": self.valor,
+            "valor": from_cents(self.valor_cents),
             "categoria": self.categoria,
             "descricao": self.descricao,
             "data": self.data.isoformat() if self.data else None,
@@ -90,9 +123,10 @@ class Transaction(db.Model):
             "is_installment": self.is_installment,
             "installment_mode": self.installment_mode,
             "installment_count": self.installment_count,
-            "total_amount": self.total_amount,
+            "total_amount": from_cents(self.total_amount_cents),
             "interest_per_month": self.interest_per_month,
             "first_due_date": self.first_due_date.isoformat() if self.first_due_date else None,
+            "subscription_id": self.subscription_id,
         }
 
 
@@ -104,6 +138,9 @@ class InstallmentPlan(db.Model):
     Cada plano está vinculado a UMA Transaction de resumo.
     """
     __tablename__ = "installment_plans"
+    __table_args__ = (
+        db.Index("ix_installment_plans_transaction_id", "transaction_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -116,8 +153,8 @@ class InstallmentPlan(db.Model):
 
     descricao = db.Column(db.String(150), nullable=True)
 
-    # Valor total (já considerando se foi enviado como total ou como parcela * n)
-    total_amount = db.Column(db.Float, nullable=False)
+    # Valor total em centavos (já considerando se foi enviado como total ou como parcela * n)
+    total_amount_cents = db.Column(db.BigInteger, nullable=False)
 
     # Quantidade de parcelas
     installments = db.Column(db.Integer, nullable=False)
@@ -139,7 +176,7 @@ class InstallmentPlan(db.Model):
     )
 
     def __repr__(self):
-        return f"<InstallmentPlan id={self.id} total={self.total_amount}x{self.installments}>"
+        return f"<InstallmentPlan id={self.id} total_cents={self.total_amount_cents}x{self.installments}>"
 
 
 class InstallmentCharge(db.Model):
@@ -149,6 +186,11 @@ class InstallmentCharge(db.Model):
     Ex.: parcela 1/3 do Notebook, R$ 1.000,00, vencimento 10/11/2025.
     """
     __tablename__ = "installment_charges"
+    __table_args__ = (
+        # Fatura do mês e parcelas futuras: não pagas, por vencimento
+        db.Index("ix_installment_charges_paid_due", "paid", "due_date"),
+        db.Index("ix_installment_charges_plan_id", "plan_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -161,8 +203,8 @@ class InstallmentCharge(db.Model):
     # 1, 2, 3, ... N
     installment_number = db.Column(db.Integer, nullable=False)
 
-    # Valor desta parcela específica
-    amount = db.Column(db.Float, nullable=False)
+    # Valor desta parcela específica (centavos)
+    amount_cents = db.Column(db.BigInteger, nullable=False)
 
     # Data de vencimento desta parcela
     due_date = db.Column(db.Date, nullable=False)
@@ -175,7 +217,7 @@ class InstallmentCharge(db.Model):
     def __repr__(self):
         return (
             f"<InstallmentCharge plan={self.plan_id} "
-            f"n={self.installment_number} amount={self.amount} due={self.due_date}>"
+            f"n={self.installment_number} amount_cents={self.amount_cents} due={self.due_date}>"
         )
 
 
@@ -183,14 +225,24 @@ class InstallmentCharge(db.Model):
 # NOVOS MODELOS – "CAIXINHAS" / RESERVAS (INVESTIMENTOS)
 # ============================================================
 
+# Categorias das Transactions criadas pelos depósitos/resgates de caixinha
+# (dinheiro mudando de lugar, não consumo nem renda)
+SAVING_DEPOSIT_CATEGORY = "Depósito em Caixinha"
+SAVING_WITHDRAW_CATEGORY = "Retirada de Caixinha"
+
+
 class SavingBox(db.Model):
     """
     Caixinha / reserva de dinheiro (tipo porquinho/inter caixinhas).
 
-    Cada usuário pode ter várias SavingBox. O saldo é calculado
-    a partir dos movimentos (SavingMovement).
+    Cada usuário pode ter várias SavingBox. O saldo fica materializado
+    na coluna `balance_cents`, atualizada junto com cada SavingMovement
+    (depósito/resgate). `reconcile_balances` recalcula a partir dos movimentos.
     """
     __tablename__ = "saving_boxes"
+    __table_args__ = (
+        db.Index("ix_saving_boxes_user_archived", "user_id", "archived"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -203,12 +255,15 @@ class SavingBox(db.Model):
     # Descrição opcional
     description = db.Column(db.String(255), nullable=True)
 
-    # Meta opcional (ex.: quero juntar 10.000 aqui)
-    target_amount = db.Column(db.Float, nullable=True)
+    # Meta opcional em centavos (ex.: quero juntar 10.000 aqui)
+    target_amount_cents = db.Column(db.BigInteger, nullable=True)
 
     # Marcar se a caixinha está arquivada / inativa
     archived = db.Column(db.Boolean, default=False)
 
+    # Saldo atual em centavos (depósitos - resgates), mantido pelos endpoints de movimento
+    balance_cents = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
+
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # Relação com os movimentos
@@ -220,17 +275,41 @@ class SavingBox(db.Model):
     )
 
     def current_balance(self) -> float:
+        """Saldo materializado em reais (depósitos somam, retiradas subtraem)."""
+        return from_cents(self.balance_cents or 0)
+
+    @staticmethod
+    def reconcile_statement(box_ids=None):
+        """
+        UPDATE que recalcula `balance_cents` a partir dos movimentos, em uma
+        única instrução (subquery correlacionada por caixinha).
+        """
+        signed_amount = db.case(
+            (SavingMovement.type == "deposit", SavingMovement.amount_cents),
+            (SavingMovement.type == "withdraw", -SavingMovement.amount_cents),
+            else_=0,
+        )
+        movements_sum = (
+            db.select(db.func.coalesce(db.func.sum(signed_amount), 0))
+            .where(SavingMovement.box_id == SavingBox.id)
+            .scalar_subquery()
+        )
+        stmt = db.update(SavingBox).values(balance_cents=movements_sum)
+        if box_ids is not None:
+            stmt = stmt.where(SavingBox.id.in_(box_ids))
+        return stmt
+
+    @classmethod
+    def reconcile_balances(cls, box_ids=None) -> int:
         """
-        Saldo calculado com base nos movimentos:
-        depósitos somam, retiradas subtraem.
+        Recalcula os saldos na sessão atual (sem commit).
+        Retorna quantas caixinhas foram atualizadas.
         """
-        total = 0.0
-        for m in self.movements:
-            if m.type == "deposit":
-                total += m.amount
-            elif m.type == "withdraw":
-                total -= m.amount
-        return total
+        result = db.session.execute(
+            cls.reconcile_statement(box_ids),
+            execution_options={"synchronize_session": False},
+        )
+        return result.rowcount
 
     def to_dict(self, include_movements: bool = False):
         data = {
@@ -238,7 +317,7 @@ class SavingBox(db.Model):
             "user_id": self.user_id,
             "name": self.name,
             "description": self.description,
-            "target_amount": self.target_amount,
+            "target_amount": from_cents(self.target_amount_cents),
             "archived": self.archived,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "current_balance": self.current_balance(),
@@ -256,6 +335,9 @@ class SavingMovement(db.Model):
       - 'withdraw' -> dinheiro saindo da caixinha (ex.: retorno para saldo disponível)
     """
     __tablename__ = "saving_movements"
+    __table_args__ = (
+        db.Index("ix_saving_movements_box_date", "box_id", "date"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -268,8 +350,8 @@ class SavingMovement(db.Model):
     # Tipo de movimento: 'deposit' ou 'withdraw'
     type = db.Column(db.String(20), nullable=False)
 
-    # Valor do movimento (sempre positivo; o sinal é interpretado pelo 'type')
-    amount = db.Column(db.Float, nullable=False)
+    # Valor do movimento em centavos (sempre positivo; o sinal é interpretado pelo 'type')
+    amount_cents = db.Column(db.BigInteger, nullable=False)
 
     # Data em que o movimento ocorreu (data lógica)
     date = db.Column(db.Date, nullable=False, default=date.today)
@@ -291,9 +373,227 @@ class SavingMovement(db.Model):
             "id": self.id,
             "box_id": self.box_id,
             "type": self.type,
-            "amount": self.amount,
+            "amount": from_cents(self.amount_cents),
             "date": self.date.isoformat() if self.date else None,
             "description": self.description,
             "transaction_id": self.transaction_id,
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
+
+
+# ============================================================
+# ASSINATURAS (cobranças recorrentes)
+# ============================================================
+
+class Subscription(db.Model):
+    """
+    Assinatura recorrente (Netflix, academia, ...).
+
+    As cobranças são Transactions geradas por app/subscriptions.py: a k-ésima
+    ocorrência vence em anchor_date + k * interval (semanas/meses/anos),
+    sempre contado a partir da âncora para o dia não "escorregar" (31/01 ->
+    28/02 -> 31/03). `next_occurrence` é o k da próxima cobrança a gerar e
+    `next_due_date` a data dela (indexada para o job achar as vencidas).
+    """
+    __tablename__ = "subscriptions"
+    __table_args__ = (
+        db.Index("ix_subscriptions_user_active", "user_id", "active"),
+        db.Index("ix_subscriptions_active_due", "active", "next_due_date"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+
+    # Dados copiados para cada cobrança gerada
+    name = db.Column(db.String(150), nullable=False)
+    categoria = db.Column(db.String(50), nullable=False, default="Assinaturas")
+    amount_cents = db.Column(db.BigInteger, nullable=False)
+    meio_pagamento = db.Column(db.String(20), nullable=True)
+    logo = db.Column(db.String(250), nullable=True)
+
+    # Cadência: 'weekly', 'monthly' ou 'yearly', a cada `interval` períodos
+    cadence = db.Column(db.String(10), nullable=False, default="monthly")
+    interval = db.Column(db.Integer, nullable=False, default=1)
+
+    anchor_date = db.Column(db.Date, nullable=False)
+    next_occurrence = db.Column(db.Integer, nullable=False, default=1)
+    next_due_date = db.Column(db.Date, nullable=False)
+
+    # Última data em que ainda cobra (opcional)
+    end_date = db.Column(db.Date, nullable=True)
+
+    active = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "categoria": self.categoria,
+            "valor": from_cents(self.amount_cents),
+            "meio_pagamento": self.meio_pagamento,
+            "logo": self.logo,
+            "cadence": self.cadence,
+            "interval": self.interval,
+            "anchor_date": self.anchor_date.isoformat() if self.anchor_date else None,
+            "next_due_date": self.next_due_date.isoformat() if self.next_due_date else None,
+            "end_date": self.end_date.isoformat() if self.end_date else None,
+            "active": self.active,
+        }
+
+
+# ============================================================
+# FILA DE JOBS (processados pelo worker.py)
+# ============================================================
+
+class Job(db.Model):
+    """
+    Trabalho pesado enfileirado pelas rotas e executado pelo worker
+    (app/jobs.py). Status: 'queued' -> 'running' -> 'done' | 'failed'.
+    Falhas voltam para 'queued' com run_at no futuro até max_attempts.
+    """
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # próximo job a executar
+        db.Index("ix_jobs_status_run_at", "status", "run_at"),
+        db.Index("ix_jobs_user_created", "user_id", "created_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=True)  # None = job do sistema
+    kind = db.Column(db.String(50), nullable=False)
+
+    payload = db.Column(db.Text, nullable=True)          # JSON
+    attachment = db.Column(db.LargeBinary, nullable=True)  # ex.: arquivo importado
+
+    # "<user_id>:<chave do cliente>"; repetir a chave devolve o mesmo job
+    idempotency_key = db.Column(db.String(150), nullable=True, unique=True)
+
+    status = db.Column(db.String(10), nullable=False, default="queued")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+
+    result = db.Column(db.Text, nullable=True)  # JSON
+    error = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "result": json.loads(self.result) if self.result else None,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "run_at": self.run_at.isoformat() if self.run_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+# ============================================================
+# IDEMPOTENCY KEYS (respostas de escritas para replay)
+# ============================================================
+
+class IdempotencyKey(db.Model):
+    """
+    Resposta guardada de uma escrita feita com o header Idempotency-Key.
+    Uma retentativa com a mesma chave recebe a mesma resposta sem repetir
+    a escrita. Linhas mais velhas que o TTL são apagadas (app/idempotency.py).
+    """
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        db.Index("ix_idempotency_keys_created", "created_at"),
+    )
+
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    key = db.Column(db.String(100), primary_key=True)
+
+    # hash de método + caminho + corpo: a chave não vale para outra requisição
+    fingerprint = db.Column(db.String(64), nullable=False)
+
+    # None enquanto a requisição original ainda não respondeu
+    status_code = db.Column(db.Integer, nullable=True)
+    response = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+# ============================================================
+# RESUMO MENSAL MATERIALIZADO (monthly_rollup)
+# ============================================================
+
+class MonthlyRollup(db.Model):
+    """
+    Soma e contagem das transações por usuário, mês, tipo, categoria e meio
+    de pagamento. Mantido a cada escrita (app/rollup.py), para que resumos
+    e relatórios custem O(meses) em vez de O(transações).
+
+    meio_pagamento vazio ('') representa "sem meio de pagamento" (NULL não
+    pode fazer parte da chave primária).
+    """
+    __tablename__ = "monthly_rollup"
+
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    month = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    tipo = db.Column(db.String(10), primary_key=True)
+    categoria = db.Column(db.String(50), primary_key=True)
+    meio_pagamento = db.Column(db.String(20), primary_key=True, default="")
+
+    total_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+# ============================================================
+# VERSÃO DOS DADOS POR USUÁRIO (ETag / GET condicional)
+# ============================================================
+
+class UserDataVersion(db.Model):
+    """
+    Contador de escritas por usuário.
+
+    Toda rota que altera dados do usuário incrementa `version` na mesma
+    transação. As rotas de leitura usam (version, updated_at) como
+    ETag/Last-Modified e respondem 304 sem consultar as tabelas de dados.
+    """
+    __tablename__ = "user_data_versions"
+
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+# ============================================================
+# USUÁRIOS (opcional: SOLVIX_USER_STORE=db)
+# ============================================================
+
+class User(db.Model):
+    """
+    Usuário de login guardado no banco, alternativa ao app/users.json.
+
+    Mesmo formato do JSON (id, name, username, password_hash), para que as
+    rotas de login funcionem igual com qualquer um dos dois stores.
+    """
+    __tablename__ = "users"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=True)
+    username = db.Column(db.String(80), nullable=False, unique=True, index=True)
+    password_hash = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "username": self.username,
+            "password_hash": self.password_hash,
+        }
@@ -0,0 +1,79 @@
+# app/money.py
+"""
+Valores monetários em centavos inteiros.
+
+No banco e nas contas internas todo valor em dinheiro é um `int` de
+centavos (colunas *_cents): somas no SQL são exatas e não há ajuste de
+arredondamento nem comparação com epsilon.
+
+A API continua recebendo e devolvendo reais (ex.: 10.5 / "10,50"), então a
+conversão acontece só nas bordas: `to_cents` ao ler o payload e
+`from_cents` ao serializar.
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+
+def _to_decimal(value) -> Decimal:
+    """Número ou texto (',' ou '.' decimal) -> Decimal. ValueError se inválido."""
+    if isinstance(value, float):
+        # repr() dá a menor representação decimal do float (0.29 -> "0.29")
+        text = repr(value)
+    else:
+        text = str(value).strip().replace(",", ".")
+
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"valor inválido: {value!r}")
+    if not amount.is_finite():
+        raise ValueError(f"valor inválido: {value!r}")
+    return amount
+
+
+def to_cents(value) -> int:
+    """
+    Converte um valor em reais (número ou texto, com ',' ou '.' decimal)
+    para centavos. Frações de centavo são arredondadas (meio para cima).
+    Levanta ValueError se não for um número.
+    """
+    if value is None or isinstance(value, bool):
+        raise ValueError("valor ausente")
+
+    if isinstance(value, int):
+        return value * 100
+
+    amount = _to_decimal(value)
+    return int((amount * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    """Centavos -> reais (float) para o JSON. None continua None."""
+    if cents is None:
+        return None
+    return int(cents) / 100
+
+
+def split_cents(total_cents: int, count: int) -> list:
+    """
+    Divide um total em `count` parcelas iguais de centavos; a diferença da
+    divisão fica na última parcela (a soma é sempre exatamente o total).
+    """
+    base = total_cents // count
+    values = [base] * count
+    values[-1] += total_cents - base * count
+    return values
+
+
+def price_installment_cents(principal_cents: int, count: int, rate_percent) -> int:
+    """
+    Parcela fixa (tabela Price) de um financiamento de `principal_cents` em
+    `count` meses a `rate_percent` % ao mês:
+
+        parcela = P * i / (1 - (1 + i) ** -n)
+
+    Calculada em Decimal e arredondada para o centavo. `rate_percent`
+    precisa ser > 0 (sem juros, use split_cents).
+    """
+    rate = _to_decimal(rate_percent) / 100
+    factor = rate / (1 - (1 + rate) ** -count)
+    return int((Decimal(principal_cents) * factor).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
@@ -0,0 +1,205 @@
+# app/rollup.py
+"""
+Resumo mensal materializado (tabela monthly_rollup).
+
+As rotas que criam ou apagam transações chamam `record_transactions` ANTES
+do commit (entra na mesma transação), com sign=+1 ao criar e sign=-1 ao
+apagar. Cada chamada agrupa as transações por chave e aplica os deltas com
+um único UPSERT (INSERT ... ON CONFLICT DO UPDATE) em lote.
+
+`rebuild` recalcula tudo a partir da tabela transaction (backfill inicial
+ou correção), via `flask --app run rebuild-rollup`.
+"""
+from calendar import monthrange
+from collections import namedtuple
+
+from sqlalchemy import Integer, cast, delete, func, insert, select, update
+
+from . import db
+from .models import MonthlyRollup, Transaction
+
+KEY_COLUMNS = ("user_id", "year", "month", "tipo", "categoria", "meio_pagamento")
+
+# Mesmo formato das linhas do GROUP BY em compute_summary
+RollupGroup = namedtuple(
+    "RollupGroup", "year month tipo categoria meio_pagamento total count"
+)
+
+
+def _field(item, name):
+    return item[name] if isinstance(item, dict) else getattr(item, name)
+
+
+def _dialect_insert():
+    """insert() com suporte a ON CONFLICT, se o banco tiver."""
+    name = db.session.get_bind().dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def record_transactions(user_id, items, sign: int = 1):
+    """
+    Soma (sign=1) ou subtrai (sign=-1) transações do resumo mensal (sem commit).
+
+    items: objetos Transaction ou dicts com data, tipo, categoria,
+    meio_pagamento e valor_cents.
+    """
+    deltas = {}
+    for item in items:
+        d = _field(item, "data")
+        key = (
+            user_id,
+            d.year,
+            d.month,
+            _field(item, "tipo"),
+            _field(item, "categoria"),
+            _field(item, "meio_pagamento") or "",
+        )
+        total, count = deltas.get(key, (0, 0))
+        deltas[key] = (total + sign * _field(item, "valor_cents"), count + sign)
+
+    if not deltas:
+        return
+
+    rows = [
+        {**dict(zip(KEY_COLUMNS, key)), "total_cents": total, "count": count}
+        for key, (total, count) in deltas.items()
+    ]
+
+    dialect_insert = _dialect_insert()
+    if dialect_insert is not None:
+        stmt = dialect_insert(MonthlyRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(KEY_COLUMNS),
+            set_={
+                "total_cents": MonthlyRollup.total_cents + stmt.excluded.total_cents,
+                "count": MonthlyRollup.count + stmt.excluded.count,
+            },
+        )
+        db.session.execute(stmt, rows)
+    else:
+        # Sem ON CONFLICT: UPDATE e, se a linha não existir, INSERT
+        for row in rows:
+            key_filter = [getattr(MonthlyRollup, c) == row[c] for c in KEY_COLUMNS]
+            updated = db.session.execute(
+                update(MonthlyRollup)
+                .where(*key_filter)
+                .values(
+                    total_cents=MonthlyRollup.total_cents + row["total_cents"],
+                    count=MonthlyRollup.count + row["count"],
+                ),
+                execution_options={"synchronize_session": False},
+            ).rowcount
+            if not updated:
+                db.session.execute(insert(MonthlyRollup).values(row))
+
+    if sign < 0:
+        # grupos que ficaram vazios não precisam continuar na tabela
+        db.session.execute(
+            delete(MonthlyRollup).where(
+                MonthlyRollup.user_id == user_id,
+                MonthlyRollup.count <= 0,
+            ),
+            execution_options={"synchronize_session": False},
+        )
+
+
+def rebuild(user_id=None, bind=None) -> int:
+    """
+    Recalcula o resumo mensal (de um usuário ou de todos) a partir das
+    transações, com DELETE + INSERT ... SELECT ... GROUP BY. Sem commit.
+    Retorna quantas linhas foram geradas.
+    """
+    executor = bind if bind is not None else db.session
+
+    year_col = cast(func.extract("year", Transaction.data), Integer)
+    month_col = cast(func.extract("month", Transaction.data), Integer)
+    method_col = func.coalesce(Transaction.meio_pagamento, "")
+
+    filters = [Transaction.user_id.isnot(None)]
+    delete_stmt = delete(MonthlyRollup)
+    if user_id is not None:
+        filters.append(Transaction.user_id == user_id)
+        delete_stmt = delete_stmt.where(MonthlyRollup.user_id == user_id)
+
+    grouped = (
+        select(
+            Transaction.user_id,
+            year_col,
+            month_col,
+            Transaction.tipo,
+            Transaction.categoria,
+            method_col,
+            func.sum(Transaction.valor_cents),
+            func.count(Transaction.id),
+        )
+        .where(*filters)
+        .group_by(
+            Transaction.user_id,
+            year_col,
+            month_col,
+            Transaction.tipo,
+            Transaction.categoria,
+            method_col,
+        )
+    )
+
+    executor.execute(delete_stmt)
+    result = executor.execute(
+        insert(MonthlyRollup).from_select(
+            [*KEY_COLUMNS, "total_cents", "count"], grouped
+        )
+    )
+    return result.rowcount
+
+
+def covers_period(start=None, end=None) -> bool:
+    """
+    True se o período puder ser respondido pelo resumo mensal: sem limites
+    ou com limites em meses inteiros (start no dia 1, end no último dia).
+    """
+    if start is not None and start.day != 1:
+        return False
+    if end is not None and end.day != monthrange(end.year, end.month)[1]:
+        return False
+    return True
+
+
+def summary_groups(user_id, start=None, end=None, categorias=None):
+    """
+    Linhas (year, month, tipo, categoria, meio_pagamento, total, count) do
+    resumo mensal, no mesmo formato do GROUP BY sobre transaction.
+    `total` vem em centavos.
+    """
+    period = MonthlyRollup.year * 100 + MonthlyRollup.month
+    filters = [MonthlyRollup.user_id == user_id]
+    if start is not None:
+        filters.append(period >= start.year * 100 + start.month)
+    if end is not None:
+        filters.append(period <= end.year * 100 + end.month)
+    if categorias:
+        filters.append(MonthlyRollup.categoria.in_(categorias))
+
+    rows = db.session.execute(
+        select(
+            MonthlyRollup.year,
+            MonthlyRollup.month,
+            MonthlyRollup.tipo,
+            MonthlyRollup.categoria,
+            MonthlyRollup.meio_pagamento,
+            MonthlyRollup.total_cents,
+            MonthlyRollup.count,
+        ).where(*filters)
+    )
+    return [
+        RollupGroup(
+            r.year, r.month, r.tipo, r.categoria, r.meio_pagamento or None,
+            r.total_cents, r.count,
+        )
+        for r in rows
+    ]
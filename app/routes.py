@@ -9,7 +9,11 @@ from flask import (
 )
 from functools import wraps
 
-from .auth_utils import find_user_by_username, check_password
+from .auth_utils import (
+    find_user_by_username,
+    check_password,
+    rehash_password_if_needed,
+)
 
 # Define o Blueprint para as rotas de visualização (frontend)
 routes = Blueprint("routes", __name__)
@@ -45,6 +49,9 @@ def login():
             flash("Usuário ou senha inválidos.", "danger")
             return render_template("login.html")
 
+        # hashes antigos (SHA-256) ou de outro custo são refeitos aqui
+        rehash_password_if_needed(user, password)
+
         # Guarda dados básicos na sessão
         session["user_id"] = user.get("id")
         session["username"] = user.get("username")
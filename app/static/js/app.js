@@ -52,6 +52,9 @@ let transactions = [];
 let currentType = "expense"; // default
 let billingInfo = null; // dados da fatura atual (API)
 let futureInstallments = []; // parcelas futuras (API)
+let summaryInfo = null; // resumo agregado no servidor (API)
+let insightsInfo = null; // sugestões calculadas no servidor (API)
+let transactionsCursor = null; // cursor da próxima página de transações
 
 // --- HELPERS DE FORMATAÇÃO ---
 function formatCurrency(value) {
@@ -96,11 +99,66 @@ function showToast(message, type = "success") {
   }, 3000);
 }
 
+// --- GET CONDICIONAL (ETag / Last-Modified) ---
+// guarda a última resposta de cada URL; se o servidor responder 304,
+// reaproveita o corpo já carregado em vez de baixar tudo de novo.
+const conditionalCache = new Map(); // url -> { etag, lastModified, data }
+
+async function fetchJSONConditional(url, errorMessage) {
+  const cached = conditionalCache.get(url);
+  const headers = {};
+  if (cached) {
+    if (cached.etag) headers["If-None-Match"] = cached.etag;
+    if (cached.lastModified) headers["If-Modified-Since"] = cached.lastModified;
+  }
+
+  const r = await fetch(url, { headers, cache: "no-store" });
+  if (r.status === 304 && cached) return cached.data;
+  if (!r.ok) throw new Error(errorMessage);
+
+  const data = await r.json();
+  const etag = r.headers.get("ETag");
+  if (etag) {
+    conditionalCache.set(url, {
+      etag,
+      lastModified: r.headers.get("Last-Modified"),
+      data,
+    });
+  }
+  return data;
+}
+
 // --- CHAMADAS À API (DB) ---
-async function apiLoadTransactions() {
-  const r = await fetch("/api/transactions");
-  if (!r.ok) throw new Error("Falha ao carregar transações");
-  return await r.json();
+// só as colunas que a lista do dashboard realmente usa
+const TRANSACTION_LIST_FIELDS = [
+  "id",
+  "tipo",
+  "valor",
+  "categoria",
+  "descricao",
+  "data",
+  "meio_pagamento",
+  "logo",
+  "is_installment",
+  "installment_count",
+].join(",");
+
+async function apiLoadTransactions(cursor) {
+  const params = new URLSearchParams({ fields: TRANSACTION_LIST_FIELDS });
+  if (cursor) params.set("cursor", cursor);
+  // { items, next_cursor }
+  return await fetchJSONConditional(
+    `/api/transactions?${params.toString()}`,
+    "Falha ao carregar transações"
+  );
+}
+
+async function apiGetSummary() {
+  return await fetchJSONConditional("/api/summary", "Falha ao carregar resumo");
+}
+
+async function apiGetInsights() {
+  return await fetchJSONConditional("/api/insights", "Falha ao carregar sugestões");
 }
 
 async function apiCreateTransaction(payload) {
@@ -127,9 +185,10 @@ async function apiDeleteTransaction(id) {
 
 // --- API de FATURA / PARCELAS ---
 async function apiGetCurrentBill() {
-  const r = await fetch("/api/billing/current");
-  if (!r.ok) throw new Error("Falha ao carregar fatura");
-  return await r.json();
+  return await fetchJSONConditional(
+    "/api/billing/current",
+    "Falha ao carregar fatura"
+  );
 }
 
 async function apiPayCurrentBill(paymentDate) {
@@ -147,9 +206,10 @@ async function apiPayCurrentBill(paymentDate) {
 }
 
 async function apiGetFutureInstallments() {
-  const r = await fetch("/api/installments/future");
-  if (!r.ok) throw new Error("Falha ao carregar parcelas futuras");
-  return await r.json();
+  return await fetchJSONConditional(
+    "/api/installments/future",
+    "Falha ao carregar parcelas futuras"
+  );
 }
 
 async function reloadBillingAndInstallments() {
@@ -170,54 +230,61 @@ async function reloadBillingAndInstallments() {
   }
 }
 
+async function reloadSummary() {
+  try {
+    summaryInfo = await apiGetSummary();
+  } catch (e) {
+    console.error(e);
+    summaryInfo = null;
+  }
+}
+
+async function reloadInsights() {
+  try {
+    insightsInfo = await apiGetInsights();
+  } catch (e) {
+    console.error(e);
+    insightsInfo = null;
+  }
+}
+
+async function reloadTransactionsFirstPage() {
+  const page = await apiLoadTransactions();
+  transactions = [...(page.items || [])]; // cópia: a página fica no cache condicional
+  transactionsCursor = page.next_cursor || null;
+}
+
+async function loadMoreTransactions() {
+  if (!transactionsCursor) return;
+  try {
+    const page = await apiLoadTransactions(transactionsCursor);
+    transactions = transactions.concat(page.items || []);
+    transactionsCursor = page.next_cursor || null;
+    renderTransactions();
+  } catch (e) {
+    console.error(e);
+    showToast(e.message || "Erro ao carregar transações", "error");
+  }
+}
+
 // --- CÁLCULOS E RENDER ---
 function calculateSummary() {
-  const totalIncome = transactions
-    .filter((t) => t.tipo === "income")
-    .reduce((s, t) => s + Number(t.valor || 0), 0);
-
-  // gastos que realmente saem do saldo (débito, boleto, pagamento de fatura etc.)
-  const totalExpensesDebitOrFatura = transactions
-    .filter(
-      (t) =>
-        t.tipo === "expense" &&
-        (t.meio_pagamento === "debit" ||
-          t.categoria === "Pagamento de Fatura" ||
-          !t.meio_pagamento)
-    )
-    .reduce((s, t) => s + Number(t.valor || 0), 0);
-
-  // Fatura: preferimos o valor vindo da API; se falhar, usamos fallback antigo
-  let creditCardBill = 0;
+  // os totais vêm agregados do servidor (/api/summary)
+  const s = summaryInfo || {};
+  const totalIncome = Number(s.total_income || 0);
+  const totalExpenses = Number(s.total_expenses || 0);
 
+  // Fatura: preferimos o valor da API de fatura; se falhar, o do resumo
+  let creditCardBill = Number(s.credit_card_bill || 0);
   if (billingInfo && typeof billingInfo.total === "number") {
     creditCardBill = billingInfo.total;
-  } else {
-    const totalCreditExpenses = transactions
-      .filter(
-        (t) =>
-          t.tipo === "expense" &&
-          t.meio_pagamento === "credit" &&
-          t.categoria !== "Pagamento de Fatura"
-      )
-      .reduce((s, t) => s + Number(t.valor || 0), 0);
-
-    const totalInvoicePayments = transactions
-      .filter(
-        (t) => t.tipo === "expense" && t.categoria === "Pagamento de Fatura"
-      )
-      .reduce((s, t) => s + Number(t.valor || 0), 0);
-
-    creditCardBill = Math.max(0, totalCreditExpenses - totalInvoicePayments);
   }
 
-  const balance = totalIncome - totalExpensesDebitOrFatura;
-
   return {
     totalIncome,
-    totalExpenses: totalExpensesDebitOrFatura,
+    totalExpenses,
     creditCardBill,
-    balance,
+    balance: totalIncome - totalExpenses,
   };
 }
 
@@ -264,6 +331,12 @@ function renderTransactions() {
     return db - da; // mais recente primeiro
   });
 
+  const loadMoreHtml = transactionsCursor
+    ? `<button type="button" class="btn btn-secondary" onclick="loadMoreTransactions()">
+         Carregar mais
+       </button>`
+    : "";
+
   list.innerHTML = sorted
     .map((t) => {
       const desc = (t.descricao || t.categoria || "").trim();
@@ -331,48 +404,27 @@ function renderTransactions() {
           </div>
         </div>`;
     })
-    .join("");
+    .join("") + loadMoreHtml;
 }
 
 function renderSubscriptions() {
   const list = document.getElementById("subscriptionsList");
   if (!list) return;
 
-  const subs = transactions.filter(
-    (t) =>
-      t.tipo === "expense" &&
-      t.categoria === "Assinaturas" &&
-      !!t.recorrente
-  );
+  // última ocorrência de cada assinatura, já separada no servidor
+  const subs = summaryInfo ? summaryInfo.subscriptions : null;
+  const debit = subs ? subs.debit || [] : [];
+  const credit = subs ? subs.credit || [] : [];
 
-  if (!subs.length) {
+  if (!debit.length && !credit.length) {
     list.innerHTML =
       '<div class="empty-state">Nenhuma assinatura ativa</div>';
     return;
   }
 
-  const latest = {};
-  subs.forEach((s) => {
-    const key = s.descricao || s.categoria;
-    if (
-      !latest[key] ||
-      new Date(s.created_at || s.data) >
-        new Date(latest[key].created_at || latest[key].data)
-    ) {
-      latest[key] = s;
-    }
-  });
-
-  const debit = Object.values(latest).filter(
-    (s) => s.meio_pagamento === "debit" || !s.meio_pagamento
-  );
-  const credit = Object.values(latest).filter(
-    (s) => s.meio_pagamento === "credit"
-  );
-
   let html = "";
   if (debit.length) {
-    const total = debit.reduce((sum, s) => sum + Number(s.valor || 0), 0);
+    const total = Number(subs.debit_total || 0);
     html += `
       <div class="subscription-section">
         <div class="subscription-header">
@@ -383,7 +435,7 @@ function renderSubscriptions() {
       </div>`;
   }
   if (credit.length) {
-    const total = credit.reduce((sum, s) => sum + Number(s.valor || 0), 0);
+    const total = Number(subs.credit_total || 0);
     html += `
       <div class="subscription-section">
         <div class="subscription-header">
@@ -418,13 +470,13 @@ function renderSuggestions() {
   const list = document.getElementById("suggestionsList");
   if (!list) return;
 
-  if (!transactions.length) {
+  if (!summaryInfo || !summaryInfo.transaction_count) {
     list.innerHTML =
       '<div class="empty-state">Adicione transações para receber sugestões personalizadas</div>';
     return;
   }
-  const s = calculateSummary();
-  const suggestions = generateSuggestions(s);
+  // já vêm em ordem de impacto do servidor (/api/insights)
+  const suggestions = (insightsInfo && insightsInfo.suggestions) || [];
   list.innerHTML = suggestions
     .map(
       (su) => `
@@ -445,74 +497,6 @@ function renderSuggestions() {
     .join("");
 }
 
-function generateSuggestions(summary) {
-  const res = [];
-  const expenses = transactions.filter((t) => t.tipo === "expense");
-  if (!expenses.length) {
-    return [
-      {
-        type: "info",
-        label: "Dica",
-        text: "Comece registrando seus gastos para receber sugestões personalizadas",
-      },
-    ];
-  }
-
-  const byCat = {};
-  expenses.forEach((e) => {
-    byCat[e.categoria] = (byCat[e.categoria] || 0) + Number(e.valor || 0);
-  });
-  const top = Object.keys(byCat).reduce((a, b) =>
-    byCat[a] > byCat[b] ? a : b
-  );
-  if (byCat[top] > summary.totalIncome * 0.3) {
-    res.push({
-      type: "warning",
-      label: "Atenção",
-      text: `Seus gastos com ${top} representam mais de 30% da sua renda. Considere reduzir nesta categoria.`,
-    });
-  }
-  if (summary.totalExpenses > summary.totalIncome * 0.8) {
-    res.push({
-      type: "warning",
-      label: "Alerta",
-      text: "Você está gastando mais de 80% da sua renda. Tente economizar mais para criar uma reserva de emergência.",
-    });
-  } else if (summary.balance > summary.totalIncome * 0.3) {
-    res.push({
-      type: "success",
-      label: "Parabéns",
-      text: "Você está economizando mais de 30% da sua renda! Continue monitorando seus gastos!",
-    });
-  }
-  const subs = expenses.filter(
-    (e) => e.categoria === "Assinaturas" && e.recorrente
-  );
-  if (subs.length > 5) {
-    res.push({
-      type: "info",
-      label: "Dica",
-      text: `Você tem ${subs.length} assinaturas ativas. Revise quais realmente usa e considere cancelar as não essenciais.`,
-    });
-  }
-  if (summary.creditCardBill > summary.totalIncome * 0.5) {
-    res.push({
-      type: "warning",
-      label: "Atenção",
-      text: "Sua fatura do cartão está alta. Pague o quanto antes para evitar juros e priorize débito.",
-    });
-  }
-  return res.length
-    ? res
-    : [
-        {
-          type: "success",
-          label: "Tudo certo",
-          text: "Suas finanças estão equilibradas. Continue!",
-        },
-      ];
-}
-
 // --- PARCELAS FUTURAS ---
 function renderFutureInstallments() {
   const container = document.getElementById("futureInstallmentsList");
@@ -702,7 +686,11 @@ async function deleteTransaction(id) {
   try {
     await apiDeleteTransaction(id);
     transactions = transactions.filter((t) => t.id !== id);
-    await reloadBillingAndInstallments();
+    await Promise.all([
+      reloadSummary(),
+      reloadInsights(),
+      reloadBillingAndInstallments(),
+    ]);
     updateUI();
     showToast("Transação excluída com sucesso");
   } catch (e) {
@@ -722,15 +710,20 @@ function updateUI() {
 // --- INIT ---
 document.addEventListener("DOMContentLoaded", async () => {
   try {
-    // carrega do DB
-    transactions = await apiLoadTransactions();
+    // carrega do DB só a primeira página; os totais vêm do /api/summary
+    await reloadTransactionsFirstPage();
   } catch (e) {
     console.error(e);
     showToast("Não foi possível carregar transações", "error");
     transactions = [];
+    transactionsCursor = null;
   }
 
-  await reloadBillingAndInstallments();
+  await Promise.all([
+    reloadSummary(),
+    reloadInsights(),
+    reloadBillingAndInstallments(),
+  ]);
   updateUI();
 
   // data padrão hoje
@@ -799,8 +792,12 @@ document.addEventListener("DOMContentLoaded", async () => {
         const paymentResult = await apiPayCurrentBill(date || undefined);
 
         // recarrega tudo
-        transactions = await apiLoadTransactions();
-        await reloadBillingAndInstallments();
+        await reloadTransactionsFirstPage();
+        await Promise.all([
+          reloadSummary(),
+          reloadInsights(),
+          reloadBillingAndInstallments(),
+        ]);
         updateUI();
 
         showToast(
@@ -929,7 +926,11 @@ document.addEventListener("DOMContentLoaded", async () => {
       const saved = await apiCreateTransaction(payload);
       // adiciona no topo
       transactions.unshift(saved);
-      await reloadBillingAndInstallments();
+      await Promise.all([
+        reloadSummary(),
+        reloadInsights(),
+        reloadBillingAndInstallments(),
+      ]);
       updateUI();
 
       form.reset();
@@ -953,6 +954,7 @@ document.addEventListener("DOMContentLoaded", async () => {
 
 // global para o botão de excluir
 window.deleteTransaction = deleteTransaction;
+window.loadMoreTransactions = loadMoreTransactions;
 
 // ==========================
 // CAIXINHAS (Saving Boxes)
@@ -987,15 +989,17 @@ function normalizeSavingBox(raw) {
     total_out: pickNumber(raw, ["total_out", "totalOut"]),
     created_at: raw.created_at || raw.createdAt || null,
     movements: raw.movements || raw.movement_list || [],
+    movements_next_cursor: raw.movements_next_cursor || null,
   };
 }
 
 // ---- API de Caixinhas ----
 
 async function apiListSavingBoxes() {
-  const r = await fetch("/api/saving-boxes");
-  if (!r.ok) throw new Error("Falha ao carregar caixinhas");
-  const data = await r.json();
+  const data = await fetchJSONConditional(
+    "/api/saving-boxes",
+    "Falha ao carregar caixinhas"
+  );
   return (data || []).map(normalizeSavingBox);
 }
 
@@ -1014,12 +1018,23 @@ async function apiCreateSavingBox(payload) {
 }
 
 async function apiGetSavingBox(boxId) {
-  const r = await fetch(`/api/saving-boxes/${boxId}`);
-  if (!r.ok) throw new Error("Falha ao carregar detalhes da caixinha");
-  const data = await r.json();
+  const data = await fetchJSONConditional(
+    `/api/saving-boxes/${boxId}`,
+    "Falha ao carregar detalhes da caixinha"
+  );
   return normalizeSavingBox(data);
 }
 
+async function apiGetSavingBoxMovements(boxId, cursor) {
+  const params = new URLSearchParams();
+  if (cursor) params.set("cursor", cursor);
+  const data = await fetchJSONConditional(
+    `/api/saving-boxes/${boxId}/movements?${params.toString()}`,
+    "Falha ao carregar movimentos da caixinha"
+  );
+  return data || { items: [], next_cursor: null };
+}
+
 async function apiDepositSavingBox(boxId, payload) {
   const r = await fetch(`/api/saving-boxes/${boxId}/deposit`, {
     method: "POST",
@@ -1030,9 +1045,8 @@ async function apiDepositSavingBox(boxId, payload) {
     const err = await r.json().catch(() => ({ error: "Erro ao registrar depósito" }));
     throw new Error(err.error || "Erro ao registrar depósito");
   }
-  const data = await r.json();
-  // API devolve {"box": ..., "transaction": ...}
-  return normalizeSavingBox(data.box || data);
+  // API devolve só o delta: {"box": ..., "movement": ..., "transaction": ...}
+  return r.json();
 }
 
 async function apiWithdrawSavingBox(boxId, payload) {
@@ -1045,10 +1059,48 @@ async function apiWithdrawSavingBox(boxId, payload) {
     const err = await r.json().catch(() => ({ error: "Erro ao registrar resgate" }));
     throw new Error(err.error || "Erro ao registrar resgate");
   }
-  const data = await r.json();
-  return normalizeSavingBox(data.box || data);
+  return r.json();
 }
 
+// Aplica a resposta de depósito/resgate na caixinha aberta, sem recarregar
+// o histórico: novo saldo + movimento novo no topo da lista.
+function applySavingBoxMovement(data) {
+  const updated = normalizeSavingBox(data.box);
+  const previous =
+    currentSavingBox && currentSavingBox.id === updated.id ? currentSavingBox : null;
+
+  updated.movements = previous ? [...previous.movements] : [];
+  updated.movements_next_cursor = previous ? previous.movements_next_cursor : null;
+  if (data.movement) updated.movements.unshift(data.movement);
+
+  currentSavingBox = updated;
+  const idx = savingBoxes.findIndex((b) => b.id === updated.id);
+  if (idx >= 0) savingBoxes[idx] = updated;
+
+  renderSavingBoxesList();
+  renderSavingBoxDetails(updated);
+}
+
+async function loadMoreSavingBoxMovements() {
+  const box = currentSavingBox;
+  if (!box || !box.movements_next_cursor) return;
+
+  try {
+    const page = await apiGetSavingBoxMovements(box.id, box.movements_next_cursor);
+    if (currentSavingBox !== box) return; // usuário trocou de caixinha
+
+    const known = new Set(box.movements.map((m) => m.id));
+    box.movements.push(...(page.items || []).filter((m) => !known.has(m.id)));
+    box.movements_next_cursor = page.next_cursor || null;
+    renderSavingBoxMovements(box);
+  } catch (err) {
+    console.error(err);
+    showToast("Erro ao carregar movimentos", "error");
+  }
+}
+
+window.loadMoreSavingBoxMovements = loadMoreSavingBoxMovements;
+
 // ---- UI: Detalhes & Movimentos ----
 
 function renderSavingBoxesList() {
@@ -1211,6 +1263,12 @@ function renderSavingBoxMovements(box) {
     return db - da;
   });
 
+  const loadMoreHtml = box.movements_next_cursor
+    ? `<button type="button" class="btn btn-secondary" onclick="loadMoreSavingBoxMovements()">
+         Carregar mais
+       </button>`
+    : "";
+
   listEl.innerHTML = sorted
     .map((m) => {
       const isDeposit = m.type === "deposit" || m.type === "in";
@@ -1251,7 +1309,7 @@ function renderSavingBoxMovements(box) {
         </div>
       `;
     })
-    .join("");
+    .join("") + loadMoreHtml;
 }
 
 function renderSavingBoxDetails(box) {
@@ -1341,14 +1399,8 @@ function wireSavingBoxDetailForms() {
       };
 
       try {
-        const updated = await apiDepositSavingBox(currentSavingBox.id, payload);
-        currentSavingBox = updated;
-
-        const idx = savingBoxes.findIndex((b) => b.id === updated.id);
-        if (idx >= 0) savingBoxes[idx] = updated;
-
-        renderSavingBoxesList();
-        renderSavingBoxDetails(updated);
+        const data = await apiDepositSavingBox(currentSavingBox.id, payload);
+        applySavingBoxMovement(data);
 
         addForm.reset();
         if (dateInput) dateInput.valueAsDate = new Date();
@@ -1390,14 +1442,8 @@ function wireSavingBoxDetailForms() {
       };
 
       try {
-        const updated = await apiWithdrawSavingBox(currentSavingBox.id, payload);
-        currentSavingBox = updated;
-
-        const idx = savingBoxes.findIndex((b) => b.id === updated.id);
-        if (idx >= 0) savingBoxes[idx] = updated;
-
-        renderSavingBoxesList();
-        renderSavingBoxDetails(updated);
+        const data = await apiWithdrawSavingBox(currentSavingBox.id, payload);
+        applySavingBoxMovement(data);
 
         withdrawForm.reset();
         if (dateInput) dateInput.valueAsDate = new Date();
@@ -0,0 +1,288 @@
+# app/subscriptions.py
+"""
+Motor de assinaturas recorrentes.
+
+Cada Subscription guarda a cadência (semanal/mensal/anual, a cada N) e o
+índice da próxima ocorrência. As cobranças viram Transactions normais
+(categoria, meio de pagamento e logo da assinatura, recorrente=True):
+
+- `generate_due` gera, em lote, todas as ocorrências vencidas até hoje.
+  Roda no job "subscriptions.generate", que o worker.py enfileira uma vez
+  por dia (ou `flask --app run generate-subscriptions`, via cron). As
+  leituras (GET) nunca escrevem.
+- Cada assinatura é "reservada" com UPDATE ... WHERE next_occurrence = <lido>,
+  e o índice único (subscription_id, data) em transaction impede cobrança
+  duplicada se o job e uma requisição rodarem ao mesmo tempo.
+- `project` expande as assinaturas ativas para os próximos meses direto do
+  índice (user_id, active), sem varrer o histórico de transações.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import insert, update
+
+from . import db, rollup
+from .cache import cache
+from .money import from_cents
+from .models import Subscription, Transaction
+from .versioning import bump_data_version
+
+CADENCES = ("weekly", "monthly", "yearly")
+
+# assinaturas processadas por commit no job
+GENERATE_BATCH_SIZE = 500
+
+# cobranças geradas de uma vez por assinatura (ex.: banco parado há anos)
+MAX_OCCURRENCES_PER_RUN = 400
+
+
+def _add_months(base_date: date, months: int) -> date:
+    # import tardio: api importa este módulo
+    from .api import add_months
+
+    return add_months(base_date, months)
+
+
+def occurrence_date(anchor: date, cadence: str, interval: int, k: int) -> date:
+    """Data da k-ésima ocorrência (k=0 é a própria âncora)."""
+    if cadence == "weekly":
+        return anchor + timedelta(weeks=interval * k)
+    if cadence == "yearly":
+        return _add_months(anchor, 12 * interval * k)
+    return _add_months(anchor, interval * k)
+
+
+def first_occurrence_after(anchor: date, cadence: str, interval: int,
+                           after: date, k: int = 1) -> int:
+    """Primeiro índice (a partir de `k`) cuja data cai depois de `after`."""
+    while occurrence_date(anchor, cadence, interval, k) <= after:
+        k += 1
+    return k
+
+
+def occurrence_index(sub, d: date):
+    """Índice da ocorrência da assinatura que cai em `d` (None se não cai)."""
+    k = 0
+    current = sub.anchor_date
+    while current < d:
+        k += 1
+        current = occurrence_date(sub.anchor_date, sub.cadence, sub.interval, k)
+    return k if current == d else None
+
+
+def monthly_equivalent_cents(sub) -> int:
+    """Quanto a assinatura custa por mês, em média (centavos)."""
+    if sub.cadence == "weekly":
+        return round(sub.amount_cents * 52 / (12 * sub.interval))
+    if sub.cadence == "yearly":
+        return round(sub.amount_cents / (12 * sub.interval))
+    return round(sub.amount_cents / sub.interval)
+
+
+def new_subscription(user_id, name, amount_cents, anchor_date, cadence="monthly",
+                     interval=1, categoria="Assinaturas", meio_pagamento=None,
+                     logo=None, end_date=None, first_occurrence=0):
+    """
+    Monta (sem adicionar na sessão) uma assinatura ancorada em `anchor_date`.
+    first_occurrence=1 quando a cobrança da âncora já existe como transação.
+    """
+    if cadence not in CADENCES:
+        raise ValueError(f"Cadência inválida. Use: {', '.join(CADENCES)}.")
+    if interval < 1:
+        raise ValueError("O intervalo deve ser pelo menos 1.")
+
+    return Subscription(
+        user_id=user_id,
+        name=name,
+        categoria=categoria,
+        amount_cents=amount_cents,
+        meio_pagamento=meio_pagamento,
+        logo=logo,
+        cadence=cadence,
+        interval=interval,
+        anchor_date=anchor_date,
+        next_occurrence=first_occurrence,
+        next_due_date=occurrence_date(anchor_date, cadence, interval, first_occurrence),
+        end_date=end_date,
+        active=True,
+    )
+
+
+def _due_occurrences(sub, today: date):
+    """
+    Datas vencidas até `today` (respeitando end_date) e o índice da próxima
+    ocorrência depois delas.
+    """
+    dates = []
+    k = sub.next_occurrence
+    d = sub.next_due_date
+    while d <= today and (sub.end_date is None or d <= sub.end_date):
+        dates.append(d)
+        k += 1
+        if len(dates) >= MAX_OCCURRENCES_PER_RUN:
+            break
+        d = occurrence_date(sub.anchor_date, sub.cadence, sub.interval, k)
+    return k, dates
+
+
+def _generate(subs, today: date) -> dict:
+    """
+    Gera as cobranças vencidas das assinaturas (sem commit).
+    Retorna {user_id: quantidade de transações criadas}.
+    """
+    rows = []
+    for sub in subs:
+        next_k, dates = _due_occurrences(sub, today)
+        next_due = occurrence_date(sub.anchor_date, sub.cadence, sub.interval, next_k)
+        still_active = sub.end_date is None or next_due <= sub.end_date
+
+        # reserva a assinatura: se outro processo já avançou, pula
+        claimed = db.session.execute(
+            update(Subscription)
+            .where(
+                Subscription.id == sub.id,
+                Subscription.next_occurrence == sub.next_occurrence,
+            )
+            .values(
+                next_occurrence=next_k,
+                next_due_date=next_due,
+                active=still_active,
+            ),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        if not claimed:
+            continue
+
+        rows.extend(
+            {
+                "user_id": sub.user_id,
+                "tipo": "expense",
+                "valor_cents": sub.amount_cents,
+                "categoria": sub.categoria,
+                "descricao": sub.name,
+                "data": d,
+                "meio_pagamento": sub.meio_pagamento,
+                "recorrente": True,
+                "logo": sub.logo,
+                "settled": False,
+                "is_installment": False,
+                "subscription_id": sub.id,
+            }
+            for d in dates
+        )
+
+    if not rows:
+        return {}
+
+    # cobranças já lançadas à mão (ligadas à assinatura) não são geradas de novo
+    existing = set(
+        db.session.query(Transaction.subscription_id, Transaction.data)
+        .filter(
+            Transaction.subscription_id.in_({row["subscription_id"] for row in rows}),
+            Transaction.data >= min(row["data"] for row in rows),
+            Transaction.data <= today,
+        )
+        .all()
+    )
+    rows = [row for row in rows if (row["subscription_id"], row["data"]) not in existing]
+    if not rows:
+        return {}
+
+    db.session.execute(insert(Transaction), rows)
+
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(row["user_id"], []).append(row)
+    for user_id, user_rows in by_user.items():
+        rollup.record_transactions(user_id, user_rows)
+        bump_data_version(user_id)
+
+    return {user_id: len(user_rows) for user_id, user_rows in by_user.items()}
+
+
+def _due_query(today: date, user_id=None):
+    query = Subscription.query.filter(
+        Subscription.active.is_(True),
+        Subscription.next_due_date <= today,
+    )
+    if user_id is not None:
+        query = query.filter(Subscription.user_id == user_id)
+    return query
+
+
+def generate_due(today: date | None = None, user_id=None,
+                 batch_size: int = GENERATE_BATCH_SIZE) -> int:
+    """
+    Gera todas as cobranças vencidas (de um usuário ou de todos), com um
+    commit por lote de assinaturas. Retorna quantas transações foram criadas.
+    """
+    today = today or date.today()
+    created = 0
+
+    while True:
+        subs = _due_query(today, user_id).order_by(Subscription.id).limit(batch_size).all()
+        if not subs:
+            break
+
+        counts = _generate(subs, today)
+        db.session.commit()
+        for uid in counts:
+            cache.invalidate_user(uid)
+        created += sum(counts.values())
+
+    return created
+
+
+def active_subscriptions(user_id):
+    return (
+        Subscription.query
+        .filter(Subscription.user_id == user_id, Subscription.active.is_(True))
+        .order_by(Subscription.name)
+        .all()
+    )
+
+
+def upcoming_dates(sub, start: date, end: date):
+    """Datas das próximas cobranças (ainda não geradas) entre start e end."""
+    k = sub.next_occurrence
+    d = sub.next_due_date
+    while d <= end and (sub.end_date is None or d <= sub.end_date):
+        if d >= start:
+            yield d
+        k += 1
+        d = occurrence_date(sub.anchor_date, sub.cadence, sub.interval, k)
+
+
+def project(user_id, start: date, months: int) -> list:
+    """
+    Gasto previsto com assinaturas por mês, de `start` (dia 1) até
+    `months` meses à frente, a partir das próximas ocorrências.
+    """
+    end = _add_months(start, months) - timedelta(days=1)
+    by_month = {}
+    for i in range(months):
+        first = _add_months(start, i)
+        by_month[(first.year, first.month)] = {"total": 0, "items": []}
+
+    for sub in active_subscriptions(user_id):
+        for d in upcoming_dates(sub, start, end):
+            month = by_month[(d.year, d.month)]
+            month["total"] += sub.amount_cents
+            month["items"].append(
+                {
+                    "subscription_id": sub.id,
+                    "name": sub.name,
+                    "data": d.isoformat(),
+                    "valor": from_cents(sub.amount_cents),
+                    "meio_pagamento": sub.meio_pagamento,
+                }
+            )
+
+    return [
+        {
+            "year": year,
+            "month": month,
+            "total": from_cents(values["total"]),
+            "items": sorted(values["items"], key=lambda item: item["data"]),
+        }
+        for (year, month), values in sorted(by_month.items())
+    ]
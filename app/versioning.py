@@ -0,0 +1,62 @@
+# app/versioning.py
+"""
+Versão dos dados de cada usuário, usada para ETag / Last-Modified.
+
+`bump_data_version(user_id)` deve ser chamado pelas rotas de escrita ANTES do
+commit (entra na mesma transação). `get_data_version(user_id)` é uma leitura
+por chave primária na tabela user_data_versions, nunca nas tabelas de dados.
+"""
+from datetime import datetime
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .cache import cache
+from .models import UserDataVersion
+
+
+def bump_data_version(user_id):
+    """Incrementa a versão dos dados do usuário (sem commit)."""
+    # a versão fixada pelo conditional_get deixou de valer neste request
+    cache.unpin_version(user_id)
+    now = datetime.utcnow()
+    stmt = (
+        update(UserDataVersion)
+        .where(UserDataVersion.user_id == user_id)
+        .values(version=UserDataVersion.version + 1, updated_at=now)
+    )
+    options = {"synchronize_session": False}
+
+    if db.session.execute(stmt, execution_options=options).rowcount:
+        return
+
+    # Primeira escrita do usuário: cria a linha. Se outra requisição criar
+    # antes (corrida), o SAVEPOINT desfaz só o INSERT e repetimos o UPDATE.
+    try:
+        with db.session.begin_nested():
+            db.session.add(UserDataVersion(user_id=user_id, version=1, updated_at=now))
+    except IntegrityError:
+        db.session.execute(stmt, execution_options=options)
+
+
+def bump_all_data_versions():
+    """Incrementa a versão de todos os usuários (sem commit), ex.: rebuild geral."""
+    db.session.execute(
+        update(UserDataVersion).values(
+            version=UserDataVersion.version + 1, updated_at=datetime.utcnow()
+        ),
+        execution_options={"synchronize_session": False},
+    )
+
+
+def get_data_version(user_id):
+    """Retorna (version, updated_at) do usuário; (0, None) se nunca escreveu."""
+    row = (
+        db.session.query(UserDataVersion.version, UserDataVersion.updated_at)
+        .filter(UserDataVersion.user_id == user_id)
+        .first()
+    )
+    if row is None:
+        return 0, None
+    return row.version, row.updated_at
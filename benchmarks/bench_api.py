@@ -0,0 +1,407 @@
+"""
+Benchmark de carga da API: popula um banco com usuários sintéticos e mede
+cada endpoint de leitura (latência p50/p95/p99, queries por requisição e
+vazão).
+
+Dois modos:
+  - client (padrão): Flask test client, no mesmo processo. Sem rede, mede o
+    custo da aplicação + banco. Usa um SQLite temporário se --database-url
+    não for informado.
+  - http: requisições reais contra um servidor já rodando (ex.: gunicorn)
+    em --base-url, logando com --username/--password. Para popular o banco
+    desse servidor, rode antes com --seed-only apontando --database-url para
+    o mesmo banco e --first-user-id para o id desse usuário.
+
+As queries por requisição vêm do header Server-Timing (instrumentação do
+app). No modo client ela é ligada automaticamente; no modo http o servidor
+precisa rodar com SOLVIX_INSTRUMENTATION=1.
+
+Uso:
+  python benchmarks/bench_api.py
+  python benchmarks/bench_api.py --users 5 --transactions 20000 --plans 200 --boxes 10
+  python benchmarks/bench_api.py --no-cache --concurrency 4 --json > run.json
+  python benchmarks/bench_api.py --seed-only --database-url postgresql://... --first-user-id 1
+  python benchmarks/bench_api.py --mode http --base-url http://127.0.0.1:8000 \\
+      --username joao --password segredo --json
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CATEGORIES = [
+    "Alimentação", "Mercado", "Transporte", "Moradia", "Saúde",
+    "Lazer", "Educação", "Compras", "Serviços", "Outros",
+]
+SUBSCRIPTIONS = ["Netflix", "Spotify", "Academia", "iCloud", "Internet"]
+
+# nome -> caminho (o usuário entra pelo id da sessão)
+ENDPOINTS = {
+    "transactions_page": "/api/transactions?limit=50",
+    "transactions_filtered": "/api/transactions?limit=50&categoria=Mercado",
+    "billing_current": "/api/billing/current",
+    "installments_future": "/api/installments/future",
+    "summary": "/api/summary",
+    "saving_boxes": "/api/saving-boxes",
+}
+
+_SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+# -------------------------------------------------------------------
+# Dados sintéticos
+# -------------------------------------------------------------------
+
+
+def _random_date(rng, today, months_back):
+    days = rng.randint(0, months_back * 30)
+    return date.fromordinal(today.toordinal() - days)
+
+
+def transaction_payloads(rng, count, plans, today, months_back):
+    """Payloads no formato do POST /api/transactions."""
+    payloads = []
+    for i in range(count):
+        roll = rng.random()
+        when = _random_date(rng, today, months_back).isoformat()
+        if roll < 0.15:
+            payloads.append({
+                "tipo": "income",
+                "valor": round(rng.uniform(500, 8000), 2),
+                "categoria": "Salário",
+                "data": when,
+            })
+        elif roll < 0.20:
+            name = rng.choice(SUBSCRIPTIONS)
+            payloads.append({
+                "tipo": "expense",
+                "valor": round(rng.uniform(15, 120), 2),
+                "categoria": "Assinaturas",
+                "descricao": name,
+                "data": when,
+                "meio_pagamento": rng.choice(["credit", "debit"]),
+                "recorrente": True,
+            })
+        else:
+            payloads.append({
+                "tipo": "expense",
+                "valor": round(rng.uniform(5, 600), 2),
+                "categoria": rng.choice(CATEGORIES),
+                "descricao": f"Compra {i}",
+                "data": when,
+                "meio_pagamento": rng.choice(["credit", "credit", "debit"]),
+            })
+
+    for i in range(plans):
+        count_parcelas = rng.choice([2, 3, 6, 10, 12, 18, 24])
+        payloads.append({
+            "tipo": "expense",
+            "valor": round(rng.uniform(300, 6000), 2),
+            "categoria": rng.choice(CATEGORIES),
+            "descricao": f"Parcelado {i}",
+            "data": _random_date(rng, today, min(months_back, 12)).isoformat(),
+            "meio_pagamento": "credit",
+            "is_installment": True,
+            "installment_count": count_parcelas,
+            "installment_mode": rng.choice(["total", "parcela"]),
+        })
+
+    return payloads
+
+
+def seed(app, users, transactions, plans, boxes, movements, first_user_id, seed_value, months_back):
+    """Popula o banco do app. Retorna contagens e o tempo gasto."""
+    from sqlalchemy import insert
+
+    from app import db
+    from app.api import _insert_transaction_chunk, validate_transaction_payload, IMPORT_CHUNK_SIZE
+    from app.models import SavingBox, SavingMovement
+
+    rng = random.Random(seed_value)
+    today = date.today()
+    started = time.perf_counter()
+    counts = {"transactions": 0, "installment_plans": 0, "saving_boxes": 0, "saving_movements": 0}
+
+    with app.app_context():
+        for user_id in range(first_user_id, first_user_id + users):
+            values = [
+                (n, validate_transaction_payload(p))
+                for n, p in enumerate(transaction_payloads(rng, transactions, plans, today, months_back))
+            ]
+            for start in range(0, len(values), IMPORT_CHUNK_SIZE):
+                _insert_transaction_chunk(user_id, values[start:start + IMPORT_CHUNK_SIZE])
+            counts["transactions"] += transactions + plans
+            counts["installment_plans"] += plans
+
+            if boxes:
+                box_ids = db.session.execute(
+                    insert(SavingBox).returning(SavingBox.id, sort_by_parameter_order=True),
+                    [
+                        {
+                            "user_id": user_id,
+                            "name": f"Caixinha {b}",
+                            "target_amount_cents": rng.randint(1000_00, 20000_00),
+                        }
+                        for b in range(boxes)
+                    ],
+                ).scalars().all()
+
+                rows = []
+                for box_id in box_ids:
+                    for _ in range(movements):
+                        rows.append({
+                            "box_id": box_id,
+                            "type": "deposit" if rng.random() < 0.8 else "withdraw",
+                            "amount_cents": rng.randint(10_00, 500_00),
+                            "date": _random_date(rng, today, months_back),
+                        })
+                if rows:
+                    db.session.execute(insert(SavingMovement), rows)
+                SavingBox.reconcile_balances(box_ids)
+                counts["saving_boxes"] += len(box_ids)
+                counts["saving_movements"] += len(rows)
+
+            db.session.commit()
+
+    counts["seconds"] = round(time.perf_counter() - started, 3)
+    return counts
+
+
+# -------------------------------------------------------------------
+# Clientes
+# -------------------------------------------------------------------
+
+
+class FlaskClient:
+    def __init__(self, app, user_id):
+        self._client = app.test_client()
+        with self._client.session_transaction() as s:
+            s["user_id"] = user_id
+
+    def get(self, path):
+        resp = self._client.get(path)
+        resp.close()
+        return resp.status_code, resp.headers.get("Server-Timing")
+
+
+class HttpClient:
+    def __init__(self, base_url, username, password):
+        self.base_url = base_url.rstrip("/")
+        self._opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+        body = urllib.parse.urlencode({"username": username, "password": password}).encode()
+        self._opener.open(self.base_url + "/login", data=body).read()
+
+    def get(self, path):
+        try:
+            with self._opener.open(self.base_url + path) as resp:
+                resp.read()
+                return resp.status, resp.headers.get("Server-Timing")
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get("Server-Timing")
+
+
+# -------------------------------------------------------------------
+# Medição
+# -------------------------------------------------------------------
+
+
+def percentile(sorted_values, pct):
+    """Percentil por posição mais próxima (lista já ordenada)."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run_endpoint(make_client, path, requests_count, warmup, concurrency):
+    clients = [make_client() for _ in range(concurrency)]
+    for _ in range(warmup):
+        clients[0].get(path)
+
+    latencies, queries, sql_ms = [], [], []
+    errors = 0
+    lock = threading.Lock()
+    per_worker = [requests_count // concurrency + (1 if i < requests_count % concurrency else 0)
+                  for i in range(concurrency)]
+
+    def worker(client, n):
+        nonlocal errors
+        for _ in range(n):
+            t0 = time.perf_counter()
+            status, timing = client.get(path)
+            elapsed = (time.perf_counter() - t0) * 1000
+            match = _SERVER_TIMING_DB.search(timing or "")
+            with lock:
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors += 1
+                if match:
+                    sql_ms.append(float(match.group(1)))
+                    queries.append(int(match.group(2)))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, clients, per_worker))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "path": path,
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "max_ms": round(latencies[-1], 3),
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+        "sql_ms_per_request": round(sum(sql_ms) / len(sql_ms), 3) if sql_ms else None,
+        "throughput_rps": round(len(latencies) / wall, 1),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--mode", choices=["client", "http"], default="client")
+    parser.add_argument("--database-url", help="banco a popular/usar (padrão: SQLite temporário)")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="modo http")
+    parser.add_argument("--username", help="modo http: usuário para login")
+    parser.add_argument("--password", help="modo http: senha")
+    parser.add_argument("--users", type=int, default=1, help="usuários sintéticos")
+    parser.add_argument("--transactions", type=int, default=5000, help="transações por usuário")
+    parser.add_argument("--plans", type=int, default=50, help="planos de parcelas por usuário")
+    parser.add_argument("--boxes", type=int, default=5, help="caixinhas por usuário")
+    parser.add_argument("--movements", type=int, default=50, help="movimentos por caixinha")
+    parser.add_argument("--months", type=int, default=24, help="histórico em meses")
+    parser.add_argument("--first-user-id", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42, help="semente do gerador")
+    parser.add_argument("--no-seed", action="store_true", help="usa o banco como está")
+    parser.add_argument("--seed-only", action="store_true", help="só popula o banco")
+    parser.add_argument("--requests", type=int, default=200, help="requisições por endpoint")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), action="append")
+    parser.add_argument("--no-cache", action="store_true", help="desliga o cache de resultados")
+    parser.add_argument("--json", action="store_true", help="saída em JSON")
+    args = parser.parse_args()
+
+    needs_local_app = args.mode == "client" or not args.no_seed
+    if args.mode == "http" and not args.seed_only and not (args.username and args.password):
+        parser.error("--mode http exige --username e --password")
+    if args.mode == "http" and not args.database_url:
+        # sem banco informado não dá para popular o banco do servidor
+        args.no_seed = True
+        needs_local_app = False
+
+    app = None
+    seeded = None
+    if needs_local_app:
+        if not args.database_url:
+            fd, path = tempfile.mkstemp(prefix="solvix-bench-", suffix=".db")
+            os.close(fd)
+            os.remove(path)
+            args.database_url = "sqlite:///" + path
+        os.environ["DATABASE_URL"] = args.database_url
+        os.environ.setdefault("SOLVIX_INSTRUMENTATION", "1")
+        if args.no_cache:
+            os.environ["SOLVIX_CACHE_URL"] = "none://"
+
+        from app import create_app
+
+        app = create_app()
+        if not args.no_seed:
+            seeded = seed(
+                app, args.users, args.transactions, args.plans, args.boxes,
+                args.movements, args.first_user_id, args.seed, args.months,
+            )
+            if not args.json:
+                print(f"banco populado em {seeded['seconds']} s: {seeded}", file=sys.stderr)
+
+    if args.seed_only:
+        if args.json:
+            print(json.dumps({"seed": seeded}, indent=2))
+        return
+
+    if args.mode == "client":
+        user_ids = list(range(args.first_user_id, args.first_user_id + args.users))
+        counter = iter(range(10**9))
+
+        def make_client():
+            return FlaskClient(app, user_ids[next(counter) % len(user_ids)])
+    else:
+        def make_client():
+            return HttpClient(args.base_url, args.username, args.password)
+
+    names = args.endpoint or list(ENDPOINTS)
+    results = {}
+    for name in names:
+        results[name] = run_endpoint(
+            make_client, ENDPOINTS[name], args.requests, args.warmup, args.concurrency
+        )
+
+    report = {
+        "config": {
+            "mode": args.mode,
+            "database": (args.database_url or "").split("://")[0] or None,
+            "users": args.users,
+            "transactions_per_user": args.transactions,
+            "plans_per_user": args.plans,
+            "boxes_per_user": args.boxes,
+            "movements_per_box": args.movements,
+            "requests_per_endpoint": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "cache": not args.no_cache,
+            "seed": args.seed,
+        },
+        "environment": {
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "seed": seeded,
+        "endpoints": results,
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'endpoint':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'req/s':>10}{'erros':>7}")
+    for name, r in results.items():
+        q = r["queries_per_request"]
+        print(
+            f"{name:<24}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+            f"{(q if q is not None else '-'):>9}{r['throughput_rps']:>10}{r['errors']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Micro-benchmark do hash de senhas: logins/segundo por núcleo em cada custo.
+
+Cada login = uma verificação de senha (o mesmo trabalho do check_password),
+medida em uma única thread. Multiplique pelo número de workers do gunicorn
+para estimar a vazão máxima de logins da instância.
+
+Uso:
+  python benchmarks/bench_password_hashing.py
+  python benchmarks/bench_password_hashing.py --scheme pbkdf2_sha256 --costs 100000,300000,600000
+  python benchmarks/bench_password_hashing.py --json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.auth_utils import make_password_hash, verify_password_hash  # noqa: E402
+
+DEFAULT_COSTS = {
+    "scrypt": [12, 13, 14, 15, 16],
+    "pbkdf2_sha256": [100_000, 300_000, 600_000, 1_000_000],
+    "sha256": [0],
+}
+
+
+def bench(scheme: str, cost: int, min_seconds: float):
+    password = "correct horse battery staple"
+    if scheme == "sha256":
+        import hashlib
+
+        stored = hashlib.sha256(password.encode("utf-8")).hexdigest()
+    else:
+        stored = make_password_hash(password, scheme=scheme, cost=cost)
+
+    runs = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds or runs < 3:
+        assert verify_password_hash(stored, password)
+        runs += 1
+        elapsed = time.perf_counter() - start
+
+    per_login_ms = elapsed / runs * 1000
+    return {
+        "scheme": scheme,
+        "cost": cost,
+        "runs": runs,
+        "ms_per_login": round(per_login_ms, 3),
+        "logins_per_second_per_core": round(runs / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--scheme", choices=sorted(DEFAULT_COSTS), action="append")
+    parser.add_argument("--costs", help="lista separada por vírgula (vale para cada --scheme)")
+    parser.add_argument("--seconds", type=float, default=1.0, help="tempo mínimo por custo")
+    parser.add_argument("--json", action="store_true", help="saída em JSON")
+    args = parser.parse_args()
+
+    schemes = args.scheme or ["scrypt", "pbkdf2_sha256", "sha256"]
+    results = []
+    for scheme in schemes:
+        costs = (
+            [int(c) for c in args.costs.split(",")]
+            if args.costs
+            else DEFAULT_COSTS[scheme]
+        )
+        for cost in costs:
+            results.append(bench(scheme, cost, args.seconds))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'esquema':<15}{'custo':>10}{'ms/login':>12}{'logins/s/núcleo':>18}")
+    for r in results:
+        print(
+            f"{r['scheme']:<15}{r['cost']:>10}{r['ms_per_login']:>12}"
+            f"{r['logins_per_second_per_core']:>18}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Worker da fila de jobs em background (tabela jobs, ver app/jobs.py).
+
+    python worker.py              # fica rodando, buscando jobs a cada 1 s
+    python worker.py --once       # processa o que estiver pronto e sai
+
+Na Render: crie um "Background Worker" com o start command acima e o
+mesmo DATABASE_URL do web service.
+"""
+import argparse
+
+from app import create_app
+from app import jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker da fila de jobs do Solvix")
+    parser.add_argument("--once", action="store_true", help="processa os jobs prontos e sai")
+    parser.add_argument("--poll", type=float, default=1.0, help="intervalo entre buscas (s)")
+    parser.add_argument("--max-jobs", type=int, default=None, help="sai depois de N jobs")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        worker_id = jobs.default_worker_id()
+        print(f"worker {worker_id} iniciado (handlers: {', '.join(sorted(jobs.HANDLERS))})")
+        try:
+            processed = jobs.work(
+                worker_id,
+                poll_interval=args.poll,
+                once=args.once,
+                max_jobs=args.max_jobs,
+            )
+        except KeyboardInterrupt:
+            print("worker interrompido")
+            return
+        print(f"{processed} job(s) processado(s)")
+
+
+if __name__ == "__main__":
+    main()